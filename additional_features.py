@@ -1,18 +1,22 @@
 # additional_features.py
 import streamlit as st
 import json
-import os
-from io import StringIO, BytesIO # Import BytesIO for in-memory binary file operations
-from schema_utils import compare_schemas # Import compare_schemas for raw diff download
-from analysis_enhancements import get_risk_score, get_regression_test_suggestions # NEW: Import new analysis functions
+import hashlib
+from schema_utils import get_schema_diff, parse_schema_file, natural_sort_key # Memoized diff shared by every output consumer
+from schema_model import Schema
+from features import run_pending_ai_analyses # Runs the queued Gemini calls concurrently into placeholders
+from risk_rules import format_risk_score_markdown
+from history_store import get_history_store, HISTORY_PAGE_SIZE, TREND_GRANULARITIES
+from lineage import SchemaLineage
+from diff_viewer import get_diff_row_index, render_diff_page_html, build_diff_html_export, DIFF_VIEWER_PAGE_SIZES
+from exports import (
+    analysis_fingerprint, deferred_export, build_markdown_export, build_json_export, build_excel_report, EXCEL_MIME
+)
 
 # New imports for multi-format export
 import pandas as pd # Already used, but explicitly mentioning for Excel
-import re # For regex operations in text cleaning
 
 
-# Define a directory to store historical drift reports (must match features.py)
-HISTORY_DIR = "schema_drift_history"
 
 
 # --- Helper function to break long "words" (strings without spaces) - No longer needed if PDF is removed, but kept for safety
@@ -33,6 +37,118 @@ HISTORY_DIR = "schema_drift_history"
 #     return ' '.join(result_words)
 
 
+def get_current_schema_diff():
+    """
+    Returns the diff of the currently parsed schemas.
+    Uses the diff stored by generate_drift_report; falls back to the memoized
+    get_schema_diff, so a rerun never repeats the full comparison.
+    """
+    if st.session_state.get("schema_diff_details"):
+        return st.session_state.schema_diff_details
+    return get_schema_diff(
+        st.session_state.get("parsed_old_schema", Schema()),
+        st.session_state.get("parsed_new_schema", Schema())
+    )
+
+
+def render_trends_tab():
+    """Renders change counts over time from the history store's daily rollups (overall and per table)."""
+    st.markdown("<h3><i class='fas fa-chart-line'></i> Schema Drift Trends</h3>", unsafe_allow_html=True)
+    st.info("How much has the schema changed over time? Counts are summed over every saved analysis in each period.")
+
+    history_store = get_history_store()
+    col_granularity, col_table = st.columns(2)
+    with col_granularity:
+        granularity = st.selectbox("Group by:", options=list(TREND_GRANULARITIES), index=2, key="trends_granularity")
+
+    overall = history_store.metrics_timeseries(granularity)
+    if not overall:
+        st.info("No historical reports found yet. Generate a report in the 'Current Report' tab to start tracking trends.")
+        return
+
+    overall_df = pd.DataFrame(overall).set_index("period")
+    st.markdown("#### Column changes")
+    st.bar_chart(overall_df[["added_column_count", "deleted_column_count", "modified_column_count", "renamed_column_count"]])
+    st.markdown("#### Table changes")
+    st.bar_chart(overall_df[["added_table_count", "deleted_table_count", "modified_table_count"]])
+    with st.expander("Trend data"):
+        st.dataframe(overall_df, use_container_width=True)
+
+    with col_table:
+        changed_tables = history_store.most_changed_tables()
+        table_labels = {f"{table_name} ({changes} changes)": table_name for table_name, changes in changed_tables}
+        selected_table_label = st.selectbox(
+            "Per-table trend (most changed tables first):",
+            options=["—"] + list(table_labels),
+            key="trends_table"
+        )
+    if selected_table_label in table_labels:
+        table_name = table_labels[selected_table_label]
+        table_df = pd.DataFrame(history_store.table_timeseries(table_name, granularity)).set_index("period")
+        st.markdown(f"#### Changes to `{table_name}`")
+        st.bar_chart(table_df[["added_columns", "deleted_columns", "modified_columns", "renamed_columns"]])
+        with st.expander(f"Trend data for {table_name}"):
+            st.dataframe(table_df, use_container_width=True)
+
+
+def update_schema_lineage(uploaded_files):
+    """
+    Brings the session's SchemaLineage up to date with the uploaded versions (natural name order).
+    When the upload list only grew at the end, just the new versions are parsed and diffed;
+    any other change (removal, reordering) rebuilds the lineage from scratch.
+    """
+    uploaded_files = sorted(uploaded_files, key=lambda f: natural_sort_key(f.name))
+    sources = [(f.name, f.size) for f in uploaded_files]
+    lineage = st.session_state.get("schema_lineage")
+    known_sources = st.session_state.get("lineage_sources", [])
+    if lineage is None or sources[:len(known_sources)] != known_sources:
+        lineage, known_sources = SchemaLineage(), []
+
+    for uploaded_file, source in zip(uploaded_files[len(known_sources):], sources[len(known_sources):]):
+        uploaded_file.seek(0)
+        lineage.add_version(uploaded_file.name, parse_schema_file(uploaded_file))
+        known_sources.append(source)
+
+    st.session_state.schema_lineage = lineage
+    st.session_state.lineage_sources = known_sources
+    return lineage
+
+
+def render_lineage_tab():
+    """Renders the column history (added, renamed, type/constraint changes, dropped) across many schema versions."""
+    st.markdown("<h3><i class='fas fa-dna'></i> Column Lineage</h3>", unsafe_allow_html=True)
+    st.info("Upload every version of a schema (e.g. schema_v1.sql ... schema_v12.sql) to trace a column across all of them, following renames. Files are ordered by name, with version numbers sorted numerically.")
+
+    uploaded_files = st.file_uploader(
+        "Schema versions (SQL DDL or JSON):", type=["sql", "ddl", "json", "txt"],
+        accept_multiple_files=True, key="lineage_files"
+    )
+    if not uploaded_files:
+        return
+    try:
+        lineage = update_schema_lineage(uploaded_files)
+    except Exception as e:
+        st.error(f"Error parsing schema versions: {e}")
+        return
+
+    st.caption(f"{len(lineage)} versions: {' → '.join(lineage.labels)}")
+    col_pick, col_changed = st.columns([2, 1])
+    with col_pick:
+        column_name = st.selectbox("Column (any name it has had):", options=lineage.known_columns(), key="lineage_column")
+    with col_changed:
+        changed_columns = lineage.changed_columns()
+        with st.expander(f"Most changed columns ({len(changed_columns)})"):
+            st.dataframe(pd.DataFrame(changed_columns[:50], columns=["Column", "Events"]), use_container_width=True, hide_index=True)
+
+    if not column_name:
+        return
+    for history in lineage.column_history(column_name):
+        status = f"now `{history['current_name']}`" if history["current_name"] else "dropped"
+        st.markdown(f"**`{column_name}`** — {status}, {len(history['events'])} events")
+        events_df = pd.DataFrame(history["events"]).drop(columns=["version_index"])
+        st.dataframe(events_df, use_container_width=True, hide_index=True)
+
+
 def render_output_section():
     """Renders the AI-generated schema drift report and download options."""
     # --- Custom CSS for Interactive Diff Viewer and Metric Cards ---
@@ -184,11 +300,14 @@ def render_output_section():
 
     st.markdown("<h2>AI-Generated Schema Drift Report</h2>", unsafe_allow_html=True)
 
-    # Create tabs for current report, historical reports, and the new Interactive Diff Viewer
-    tab_current, tab_history, tab_diff_viewer = st.tabs(["📊 Current Report", "📜 History/Audit Log", "🔍 Interactive Diff Viewer"])
+    # Create tabs for current report, historical reports, trends, and the new Interactive Diff Viewer
+    tab_current, tab_history, tab_trends, tab_lineage, tab_diff_viewer = st.tabs(
+        ["📊 Current Report", "📜 History/Audit Log", "📈 Trends", "🧬 Column Lineage", "🔍 Interactive Diff Viewer"]
+    )
 
     with tab_current:
-        if st.session_state.schema_diff_report:
+        ai_pending = bool(st.session_state.get("pending_ai_analysis"))
+        if st.session_state.schema_diff_report or ai_pending:
             # --- Drift Summary Section - Custom Metric Boxes ---
             st.markdown("<h3><i class='fas fa-chart-bar'></i> Drift Summary Overview</h3>", unsafe_allow_html=True)
             st.info("Here's a quick overview of the structural changes detected between your schema versions. Understanding these key metrics helps you grasp the scope of schema evolution at a glance. ✨")
@@ -273,42 +392,63 @@ def render_output_section():
 
             # --- AI-Generated Report ---
             st.markdown("<h3><i class='fas fa-robot'></i> Detailed AI Analysis</h3>", unsafe_allow_html=True)
-            st.markdown(st.session_state.schema_diff_report)
+            report_placeholder = st.empty()
             st.markdown("<p style='text-align: right; font-size: 0.8em; color: var(--text-medium);'>Powered by Google Gemini API. Interpret results as AI-generated suggestions.</p>", unsafe_allow_html=True)
 
             # --- New: Impact-Aware Risk Scoring ---
             st.markdown("---")
             st.markdown("<h3><i class='fas fa-exclamation-triangle'></i> Impact-Aware Risk Score</h3>", unsafe_allow_html=True)
-            # Ensure schema_diff_details is available for risk scoring
-            schema_diff_details = st.session_state.get("schema_diff_details", compare_schemas(
-                st.session_state.get("parsed_old_schema", {}),
-                st.session_state.get("parsed_new_schema", {})
-            ))
-            risk_score_output = get_risk_score(schema_diff_details)
-            st.markdown(risk_score_output)
+            rule_risk = st.session_state.get("rule_risk_score")
+            if rule_risk:
+                # Rule-based and deterministic, so it is shown before any AI call returns
+                st.markdown(format_risk_score_markdown(rule_risk))
+                if len(rule_risk["factors"]) > 10:
+                    with st.expander(f"All {len(rule_risk['factors'])} risk factors"):
+                        st.dataframe(rule_risk["factors"], use_container_width=True)
+            risk_placeholder = st.empty() # Optional AI narrative on top of the rule-based score
 
 
             # --- New: Automated Regression Test Suggestions ---
             st.markdown("---")
             st.markdown("<h3><i class='fas fa-vial'></i> Automated Regression Test Suggestions</h3>", unsafe_allow_html=True)
-            test_suggestions_output = get_regression_test_suggestions(
-                schema_diff_details,
-                st.session_state.get("parsed_old_schema", {}),
-                st.session_state.get("parsed_new_schema", {})
-            )
-            st.markdown(test_suggestions_output)
+            tests_placeholder = st.empty()
+
+            if ai_pending:
+                # Fresh analysis: all three Gemini calls run at once, each panel fills in as its call finishes
+                run_pending_ai_analyses({
+                    "report": report_placeholder,
+                    "risk_score": risk_placeholder,
+                    "test_suggestions": tests_placeholder,
+                })
+            else:
+                # Plain rerun (e.g. a download click): show the stored results, no Gemini calls
+                report_placeholder.markdown(st.session_state.schema_diff_report)
+                risk_placeholder.markdown(st.session_state.get("risk_score_output", ""))
+                tests_placeholder.markdown(st.session_state.get("test_suggestions_output", ""))
+
+            # Diff computed once per analysis and shared by every section below
+            schema_diff_details = get_current_schema_diff()
 
 
             st.markdown("---")
             st.markdown("<h3><i class='fas fa-download'></i> Download Report</h3>", unsafe_allow_html=True)
             
+            # Every export is built only when its button is clicked (Streamlit calls `data` on a worker
+            # thread), then cached per analysis fingerprint, so reruns do no export work at all
+            parsed_old_schema = st.session_state.get("parsed_old_schema")
+            parsed_new_schema = st.session_state.get("parsed_new_schema")
+            diff_fingerprint = analysis_fingerprint(parsed_old_schema, parsed_new_schema)
+
             # Download buttons row for better layout
             dl_col1, dl_col2, dl_col3 = st.columns(3) # Reduced to 3 columns
 
             with dl_col1: # Markdown (already existing)
                 st.download_button(
                     label="⬇️ Download Markdown",
-                    data=st.session_state.schema_diff_report.encode('utf-8'),
+                    data=deferred_export(
+                        "markdown", analysis_fingerprint(parsed_old_schema, parsed_new_schema, st.session_state.schema_diff_report),
+                        build_markdown_export, st.session_state.schema_diff_report
+                    ),
                     file_name="schema_drift_report.md",
                     mime="text/markdown",
                     use_container_width=True,
@@ -317,21 +457,12 @@ def render_output_section():
 
             with dl_col2: # JSON (already existing)
                 try:
-                    # Re-calculate schema_diff details for raw download to ensure it's fresh
-                    current_schema_diff_for_download = compare_schemas(
-                        st.session_state.get("parsed_old_schema", {}),
-                        st.session_state.get("parsed_new_schema", {})
-                    )
-                    raw_diff_json_content = {
-                        "old_schema_parsed": st.session_state.get("parsed_old_schema", {}),
-                        "new_schema_parsed": st.session_state.get("parsed_new_schema", {}),
-                        "schema_diff_details": current_schema_diff_for_download
-                    }
-                    json_string = json.dumps(raw_diff_json_content, indent=2).encode('utf-8')
-                    
                     st.download_button(
                         label="⬇️ Download JSON",
-                        data=json_string,
+                        data=deferred_export(
+                            "json", diff_fingerprint,
+                            build_json_export, parsed_old_schema, parsed_new_schema, schema_diff_details
+                        ),
                         file_name="schema_diff_raw.json",
                         mime="application/json",
                         use_container_width=True,
@@ -342,84 +473,16 @@ def render_output_section():
                     st.info("Ensure schemas were parsed successfully to download raw diff.")
 
             with dl_col3: # Moved Excel to the third column now
-                def generate_excel_report(summary_metrics, schema_diff_details):
-                    output = BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        # Sheet 1: Summary Metrics
-                        summary_df = pd.DataFrame(summary_metrics.items(), columns=['Metric', 'Value'])
-                        summary_df.to_excel(writer, sheet_name='Summary Metrics', index=False)
-
-                        # Sheet 2: Detailed Changes (Flattened)
-                        all_changes = []
-                        
-                        # Added Tables
-                        for table_name in schema_diff_details.get("added_tables", []):
-                            all_changes.append({"Change Type": "Added Table", "Table": table_name, "Column": "", "Old Property": "", "New Property": ""})
-                        
-                        # Deleted Tables
-                        for table_name in schema_diff_details.get("deleted_tables", []):
-                            all_changes.append({"Change Type": "Deleted Table", "Table": table_name, "Column": "", "Old Property": "", "New Property": ""})
-                        
-                        # Modified Tables details
-                        for table_name, t_diff in schema_diff_details.get("modified_tables", {}).items():
-                            for col_name in t_diff.get("added_columns", []):
-                                # Get actual type from new schema, if available
-                                new_col_info = st.session_state.get("parsed_new_schema", {}).get(table_name, {}).get(col_name, {})
-                                all_changes.append({
-                                    "Change Type": "Added Column",
-                                    "Table": table_name,
-                                    "Column": col_name,
-                                    "Old Property": "N/A",
-                                    "New Property": f"Type: {new_col_info.get('type', 'UNKNOWN')}"
-                                })
-                            
-                            for col_name in t_diff.get("deleted_columns", []):
-                                # Get actual type from old schema, if available
-                                old_col_info = st.session_state.get("parsed_old_schema", {}).get(table_name, {}).get(col_name, {})
-                                all_changes.append({
-                                    "Change Type": "Deleted Column",
-                                    "Table": table_name,
-                                    "Column": col_name,
-                                    "Old Property": f"Type: {old_col_info.get('type', 'UNKNOWN')}",
-                                    "New Property": "N/A"
-                                })
-
-                            for old_name, rename_info in t_diff.get("renamed_columns", {}).items():
-                                all_changes.append({
-                                    "Change Type": "Renamed Column",
-                                    "Table": table_name,
-                                    "Column": f"{old_name} -> {rename_info['new_name']}",
-                                    "Old Property": f"Type: {rename_info['old_type']}",
-                                    "New Property": f"Type: {rename_info['new_type']}"
-                                })
-
-                            for col_name, modified_props in t_diff.get("modified_columns", {}).items():
-                                for prop_key, prop_values in modified_props.items():
-                                    all_changes.append({
-                                        "Change Type": "Modified Property",
-                                        "Table": table_name,
-                                        "Column": col_name,
-                                        "Old Property": f"{prop_key}: {prop_values['old_value']}",
-                                        "New Property": f"{prop_key}: {prop_values['new_value']}"
-                                    })
-                        
-                        changes_df = pd.DataFrame(all_changes)
-                        if not changes_df.empty: # Only write if there are changes
-                            changes_df.to_excel(writer, sheet_name='Detailed Changes', index=False)
-
-                    processed_data = output.getvalue()
-                    return processed_data
-
                 if st.session_state.schema_diff_report:
-                    excel_bytes = generate_excel_report(
-                        st.session_state.diff_summary_metrics,
-                        compare_schemas(st.session_state.parsed_old_schema, st.session_state.parsed_new_schema)
-                    )
                     st.download_button(
                         label="⬇️ Download Excel",
-                        data=excel_bytes,
+                        data=deferred_export(
+                            "xlsx", diff_fingerprint,
+                            build_excel_report, st.session_state.diff_summary_metrics,
+                            schema_diff_details, parsed_old_schema, parsed_new_schema
+                        ),
                         file_name="schema_drift_report.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        mime=EXCEL_MIME,
                         use_container_width=True,
                         key="download_report_excel_btn"
                     )
@@ -434,326 +497,233 @@ def render_output_section():
         st.markdown("<h3><i class='fas fa-history'></i> Historical Drift Reports</h3>", unsafe_allow_html=True)
         st.info("Explore past schema drift analyses. Select a report from the dropdown to view its details.")
 
-        # Check if history directory exists and list files
-        if os.path.exists(HISTORY_DIR):
-            history_files = sorted([f for f in os.listdir(HISTORY_DIR) if f.endswith('.json')], reverse=True)
-            
-            if history_files:
-                # Create user-friendly labels for dropdown
-                report_options = {f"Report from {f.replace('drift_report_', '').replace('.json', '').replace('_', ' at ').replace('-', '/')}" : f for f in history_files}
-                
-                selected_report_label = st.selectbox(
-                    "Select a historical report:",
-                    options=list(report_options.keys()),
-                    key="history_report_selector"
-                )
+        # Runs are listed a page at a time from the indexed history store; only the selected
+        # run's payloads are loaded and decompressed
+        history_store = get_history_store()
+        total_runs = history_store.count_runs()
+
+        if total_runs:
+            page_count = (total_runs + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+            page = st.number_input(
+                f"Page (of {page_count}, {total_runs} reports in total):",
+                min_value=1, max_value=page_count, value=1, step=1,
+                key="history_page"
+            )
+            runs_page = history_store.list_runs(limit=HISTORY_PAGE_SIZE, offset=(page - 1) * HISTORY_PAGE_SIZE)
+
+            # Create user-friendly labels for dropdown
+            report_options = {
+                f"Report from {run['created_at'].replace('T', ' at ').replace('-', '/')}"
+                + (f" — risk {run['risk_score']}/10" if run["risk_score"] is not None else "")
+                + f" (#{run['id']})": run["id"]
+                for run in runs_page
+            }
+
+            selected_report_label = st.selectbox(
+                "Select a historical report:",
+                options=list(report_options.keys()),
+                key="history_report_selector"
+            )
+
+            if selected_report_label:
+                selected_run_id = report_options[selected_report_label]
+                selected_filename = f"run_{selected_run_id}" # Keeps widget keys unique per report
 
-                if selected_report_label:
-                    selected_filename = report_options[selected_report_label]
-                    selected_filepath = os.path.join(HISTORY_DIR, selected_filename)
-
-                    try:
-                        with open(selected_filepath, "r", encoding="utf-8") as f:
-                            historical_data = json.load(f)
-                        
-                        st.markdown("---")
-                        st.markdown(f"<h4>Viewing Report from: {historical_data.get('timestamp', 'N/A')}</h4>", unsafe_allow_html=True)
-                        
-                        # Display Raw Schemas
-                        st.subheader("Raw Schema Inputs")
-                        col_old_raw, col_new_raw = st.columns(2)
-                        with col_old_raw:
-                            st.text_area("Old Schema (Raw)", historical_data.get("old_schema_raw", "N/A"), height=200, key=f"hist_old_raw_{selected_filename}")
-                        with col_new_raw:
-                            st.text_area("New Schema (Raw)", historical_data.get("new_schema_raw", "N/A"), height=200, key=f"hist_new_raw_{selected_filename}")
-
-                        # Display Parsed Schemas (optional, in an expander)
-                        with st.expander("Parsed Schemas (JSON)"):
-                            col_old_parsed, col_new_parsed = st.columns(2)
-                            with col_old_parsed:
-                                st.json(historical_data.get("parsed_old_schema", {}))
-                            with col_new_parsed:
-                                st.json(historical_data.get("parsed_new_schema", {}))
-                        
-                        # Display Summary Metrics
-                        st.subheader("Summary Metrics")
-                        hist_metrics = historical_data.get("summary_metrics", {})
-                        
-                        # Re-use the custom metric card HTML generation for consistency
-                        # Re-initialize the helper function as it's within a function scope
-                        def get_metric_card_html_hist(label, value, icon, card_type="info", delta=None):
-                            delta_html = ""
-                            if delta is not None:
-                                delta_class = ""
-                                if delta > 0:
-                                    delta_class = "delta-positive"
-                                elif delta < 0:
-                                    delta_class = "delta-negative"
-                                else: # delta == 0
-                                    delta_class = "delta-neutral" 
-
-                                display_delta_value = str(abs(delta)) # Always display absolute value for delta
-                                if delta > 0:
-                                    display_delta_value = f"+{display_delta_value}" 
-                                elif delta < 0:
-                                    display_delta_value = f"-{display_delta_value}"
-                                
-                                # Ensure 0 value is displayed as "0" to avoid "-0"
-                                if delta == 0:
-                                    display_delta_value = "0"
-
-                                delta_html = f'<div class="custom-metric-delta {delta_class}">{display_delta_value}</div>'
-
-                            return f"""
-                                <div class="custom-metric-card custom-metric-card-{card_type}">
-                                    <div class="custom-metric-content">
-                                        <div class="custom-metric-value">{value}</div>
-                                        <div class="custom-metric-label"><i class="{icon}"></i> {label}</div>
-                                    </div>
-                                    {delta_html}
+                try:
+                    historical_data = history_store.load_run(selected_run_id)
+
+                    st.markdown("---")
+                    st.markdown(f"<h4>Viewing Report from: {historical_data.get('timestamp', 'N/A')}</h4>", unsafe_allow_html=True)
+
+                    # Display Raw Schemas
+                    st.subheader("Raw Schema Inputs")
+                    col_old_raw, col_new_raw = st.columns(2)
+                    with col_old_raw:
+                        st.text_area("Old Schema (Raw)", historical_data.get("old_schema_raw", "N/A"), height=200, key=f"hist_old_raw_{selected_filename}")
+                    with col_new_raw:
+                        st.text_area("New Schema (Raw)", historical_data.get("new_schema_raw", "N/A"), height=200, key=f"hist_new_raw_{selected_filename}")
+
+                    # Display Parsed Schemas (optional, in an expander)
+                    with st.expander("Parsed Schemas (JSON)"):
+                        col_old_parsed, col_new_parsed = st.columns(2)
+                        with col_old_parsed:
+                            st.json(historical_data.get("parsed_old_schema", {}))
+                        with col_new_parsed:
+                            st.json(historical_data.get("parsed_new_schema", {}))
+                    
+                    # Display Summary Metrics
+                    st.subheader("Summary Metrics")
+                    hist_metrics = historical_data.get("summary_metrics", {})
+                    
+                    # Re-use the custom metric card HTML generation for consistency
+                    # Re-initialize the helper function as it's within a function scope
+                    def get_metric_card_html_hist(label, value, icon, card_type="info", delta=None):
+                        delta_html = ""
+                        if delta is not None:
+                            delta_class = ""
+                            if delta > 0:
+                                delta_class = "delta-positive"
+                            elif delta < 0:
+                                delta_class = "delta-negative"
+                            else: # delta == 0
+                                delta_class = "delta-neutral" 
+
+                            display_delta_value = str(abs(delta)) # Always display absolute value for delta
+                            if delta > 0:
+                                display_delta_value = f"+{display_delta_value}" 
+                            elif delta < 0:
+                                display_delta_value = f"-{display_delta_value}"
+                            
+                            # Ensure 0 value is displayed as "0" to avoid "-0"
+                            if delta == 0:
+                                display_delta_value = "0"
+
+                            delta_html = f'<div class="custom-metric-delta {delta_class}">{display_delta_value}</div>'
+
+                        return f"""
+                            <div class="custom-metric-card custom-metric-card-{card_type}">
+                                <div class="custom-metric-content">
+                                    <div class="custom-metric-value">{value}</div>
+                                    <div class="custom-metric-label"><i class="{icon}"></i> {label}</div>
                                 </div>
-                            """
-
-                        st.markdown('<div class="metrics-grid-container">', unsafe_allow_html=True)
-                        
-                        # Row 1: Overall Table Counts
-                        colh1, colh2, colh3 = st.columns(3)
-                        with colh1:
-                            st.markdown(get_metric_card_html_hist("OLD TABLES", hist_metrics.get("total_tables_old", 0), "fas fa-database", card_type="info"), unsafe_allow_html=True)
-                        with colh2:
-                            st.markdown(get_metric_card_html_hist("NEW TABLES", hist_metrics.get("total_tables_new", 0), "fas fa-leaf", card_type="info"), unsafe_allow_html=True)
-                        with colh3:
-                            st.markdown(get_metric_card_html_hist("MODIFIED TABLES", hist_metrics.get("modified_table_count", 0), "fas fa-sync-alt", card_type="modified"), unsafe_allow_html=True)
-
-                        # Row 2: Table Changes (Added/Deleted)
-                        colh4, colh5, colh6 = st.columns(3)
-                        with colh4:
-                            st.markdown(get_metric_card_html_hist("TABLES ADDED", hist_metrics.get("added_table_count", 0), "fas fa-plus-square", 
-                                                    card_type="added", delta=hist_metrics.get("added_table_count", 0)), unsafe_allow_html=True)
-                        with colh5:
-                            st.markdown(get_metric_card_html_hist("TABLES DELETED", hist_metrics.get("deleted_table_count", 0), "fas fa-minus-square", 
-                                                    card_type="deleted", delta=-hist_metrics.get("deleted_table_count", 0)), unsafe_allow_html=True)
-                        with colh6:
-                            st.markdown(get_metric_card_html_hist("COLUMNS ADDED", hist_metrics.get("added_column_count", 0), "fas fa-plus-circle", 
-                                                    card_type="added", delta=hist_metrics.get("added_column_count", 0)), unsafe_allow_html=True)
-                        
-                        # Row 3: Remaining Column Changes (including new Renamed Columns)
-                        colh7, colh8, colh9 = st.columns(3)
-                        with colh7:
-                            st.markdown(get_metric_card_html_hist("COLUMNS DELETED", hist_metrics.get("deleted_column_count", 0), "fas fa-times-circle", 
-                                                    card_type="deleted", delta=-hist_metrics.get("deleted_column_count", 0)), unsafe_allow_html=True)
-                        with colh8:
-                            st.markdown(get_metric_card_html_hist("COLUMNS MODIFIED", hist_metrics.get("modified_column_count", 0), "fas fa-pencil-alt", card_type="modified"), unsafe_allow_html=True)
-                        with colh9:
-                            st.markdown(get_metric_card_html_hist("COLUMNS RENAMED", hist_metrics.get("renamed_column_count", 0), "fas fa-exchange-alt", 
-                                                    card_type="modified", delta=hist_metrics.get("renamed_column_count", 0)), unsafe_allow_html=True)
-
-                        st.markdown('</div>', unsafe_allow_html=True)
-
-
-                        # Display AI Report
-                        st.subheader("AI-Generated Report")
-                        st.markdown(historical_data.get("ai_report_markdown", "No AI report found for this entry."))
-
-                        # Option to download the historical report (as Markdown or original JSON)
-                        st.markdown("---")
-                        st.subheader("Download Historical Report")
-                        col_hist_dl_md, col_hist_dl_json = st.columns(2)
-                        with col_hist_dl_md:
-                            st.download_button(
-                                label="⬇️ Download Markdown",
-                                data=historical_data.get("ai_report_markdown", "").encode('utf-8'),
-                                file_name=f"historical_report_{historical_data.get('timestamp', 'N/A')}.md",
-                                mime="text/markdown",
-                                use_container_width=True
-                            )
-                        with col_hist_dl_json:
-                            st.download_button(
-                                label="⬇️ Download Full JSON",
-                                data=json.dumps(historical_data, indent=2).encode('utf-8'),
-                                file_name=f"historical_data_{historical_data.get('timestamp', 'N/A')}.json",
-                                mime="application/json",
-                                use_container_width=True
-                            )
-
-
-                    except Exception as e:
-                        st.error(f"Error loading historical report: {e}")
-                        st.info("The selected file might be corrupted or in an invalid format.")
-            else:
-                st.info("No historical reports found yet. Generate a report in the 'Current Report' tab to save it.")
+                                {delta_html}
+                            </div>
+                        """
+
+                    st.markdown('<div class="metrics-grid-container">', unsafe_allow_html=True)
+                    
+                    # Row 1: Overall Table Counts
+                    colh1, colh2, colh3 = st.columns(3)
+                    with colh1:
+                        st.markdown(get_metric_card_html_hist("OLD TABLES", hist_metrics.get("total_tables_old", 0), "fas fa-database", card_type="info"), unsafe_allow_html=True)
+                    with colh2:
+                        st.markdown(get_metric_card_html_hist("NEW TABLES", hist_metrics.get("total_tables_new", 0), "fas fa-leaf", card_type="info"), unsafe_allow_html=True)
+                    with colh3:
+                        st.markdown(get_metric_card_html_hist("MODIFIED TABLES", hist_metrics.get("modified_table_count", 0), "fas fa-sync-alt", card_type="modified"), unsafe_allow_html=True)
+
+                    # Row 2: Table Changes (Added/Deleted)
+                    colh4, colh5, colh6 = st.columns(3)
+                    with colh4:
+                        st.markdown(get_metric_card_html_hist("TABLES ADDED", hist_metrics.get("added_table_count", 0), "fas fa-plus-square", 
+                                                card_type="added", delta=hist_metrics.get("added_table_count", 0)), unsafe_allow_html=True)
+                    with colh5:
+                        st.markdown(get_metric_card_html_hist("TABLES DELETED", hist_metrics.get("deleted_table_count", 0), "fas fa-minus-square", 
+                                                card_type="deleted", delta=-hist_metrics.get("deleted_table_count", 0)), unsafe_allow_html=True)
+                    with colh6:
+                        st.markdown(get_metric_card_html_hist("COLUMNS ADDED", hist_metrics.get("added_column_count", 0), "fas fa-plus-circle", 
+                                                card_type="added", delta=hist_metrics.get("added_column_count", 0)), unsafe_allow_html=True)
+                    
+                    # Row 3: Remaining Column Changes (including new Renamed Columns)
+                    colh7, colh8, colh9 = st.columns(3)
+                    with colh7:
+                        st.markdown(get_metric_card_html_hist("COLUMNS DELETED", hist_metrics.get("deleted_column_count", 0), "fas fa-times-circle", 
+                                                card_type="deleted", delta=-hist_metrics.get("deleted_column_count", 0)), unsafe_allow_html=True)
+                    with colh8:
+                        st.markdown(get_metric_card_html_hist("COLUMNS MODIFIED", hist_metrics.get("modified_column_count", 0), "fas fa-pencil-alt", card_type="modified"), unsafe_allow_html=True)
+                    with colh9:
+                        st.markdown(get_metric_card_html_hist("COLUMNS RENAMED", hist_metrics.get("renamed_column_count", 0), "fas fa-exchange-alt", 
+                                                card_type="modified", delta=hist_metrics.get("renamed_column_count", 0)), unsafe_allow_html=True)
+
+                    st.markdown('</div>', unsafe_allow_html=True)
+
+
+                    # Display AI Report
+                    st.subheader("AI-Generated Report")
+                    # Empty while the run's AI calls are still in progress (the report is attached when they finish)
+                    historical_report = historical_data.get("ai_report_markdown") or ""
+                    st.markdown(historical_report or "No AI report found for this entry.")
+                    # The report is attached after the run is saved, so the exports are keyed by its content too
+                    history_fingerprint = f"{selected_run_id}:{hashlib.blake2b(historical_report.encode('utf-8'), digest_size=8).hexdigest()}"
+
+                    # Option to download the historical report (as Markdown or original JSON)
+                    st.markdown("---")
+                    st.subheader("Download Historical Report")
+                    col_hist_dl_md, col_hist_dl_json = st.columns(2)
+                    with col_hist_dl_md:
+                        st.download_button(
+                            label="⬇️ Download Markdown",
+                            data=deferred_export(
+                                "history_markdown", history_fingerprint, build_markdown_export, historical_report
+                            ),
+                            file_name=f"historical_report_{historical_data.get('timestamp', 'N/A')}.md",
+                            mime="text/markdown",
+                            use_container_width=True
+                        )
+                    with col_hist_dl_json:
+                        st.download_button(
+                            label="⬇️ Download Full JSON",
+                            data=deferred_export(
+                                "history_json", history_fingerprint, lambda: json.dumps(historical_data, indent=2).encode('utf-8')
+                            ),
+                            file_name=f"historical_data_{historical_data.get('timestamp', 'N/A')}.json",
+                            mime="application/json",
+                            use_container_width=True
+                        )
+
+
+                except Exception as e:
+                    st.error(f"Error loading historical report: {e}")
+                    st.info("The selected entry might be corrupted or in an invalid format.")
         else:
-            st.info(f"The history directory '{HISTORY_DIR}' does not exist yet. Generate a report to create it.")
+            st.info("No historical reports found yet. Generate a report in the 'Current Report' tab to save it.")
+
+    with tab_trends:
+        render_trends_tab()
+
+    with tab_lineage:
+        render_lineage_tab()
 
     with tab_diff_viewer:
         st.markdown("<h3><i class='fas fa-code-compare'></i> Interactive Schema Diff Viewer</h3>", unsafe_allow_html=True)
-        st.info("Visually inspect schema changes with color-coded highlighting for added, deleted, modified, and renamed elements. Expand sections to see details.")
+        st.info("Visually inspect schema changes with color-coded highlighting for added, deleted, modified, and renamed elements. Filter by table or change type, or search, and page through the results.")
 
         if st.session_state.schema_diff_report:
-            # Re-fetch schema_diff_details to ensure it's up-to-date
-            schema_diff_details = st.session_state.get("schema_diff_details", compare_schemas(
-                st.session_state.get("parsed_old_schema", {}),
-                st.session_state.get("parsed_new_schema", {})
-            ))
-
-            # Helper function to render a table row for diff
-            def render_diff_row(label, old_val, new_val, diff_type, old_type="", new_type=""):
-                # Determine cell classes based on diff_type and add icons
-                old_cell_class = "diff-cell"
-                new_cell_class = "diff-cell"
-                label_class = "diff-label"
-                icon_html = ""
-                tooltip_text = ""
-
-                if diff_type == "added":
-                    new_cell_class += " diff-added"
-                    label_class += " diff-added-label"
-                    icon_html = '<i class="fas fa-plus diff-icon"></i>'
-                    tooltip_text = "This element was added."
-                elif diff_type == "deleted":
-                    old_cell_class += " diff-deleted"
-                    label_class += " diff-deleted-label"
-                    icon_html = '<i class="fas fa-minus diff-icon"></i>'
-                    tooltip_text = "This element was deleted."
-                elif diff_type == "modified":
-                    old_cell_class += " diff-modified"
-                    new_cell_class += " diff-modified"
-                    label_class += " diff-modified-label"
-                    icon_html = '<i class="fas fa-edit diff-icon"></i>'
-                    tooltip_text = "Properties of this element were modified."
-                elif diff_type == "renamed":
-                    old_cell_class += " diff-renamed"
-                    new_cell_class += " diff-renamed"
-                    label_class += " diff-renamed-label"
-                    icon_html = '<i class="fas fa-exchange-alt diff-icon"></i>'
-                    tooltip_text = "This element was likely renamed."
-
-
-                # Construct content for cells
-                old_content = old_val if old_val else "N/A"
-                new_content = new_val if new_val else "N/A"
-
-                if diff_type == "renamed":
-                    # For renamed, old_val is old name, new_val is new name
-                    # old_type and new_type come separately
-                    return f"""
-                        <tr>
-                            <td class="{label_class}" title="{tooltip_text}">{icon_html} {label}</td>
-                            <td class="{old_cell_class}">{old_val} ({old_type})</td>
-                            <td class="{new_cell_class}">{new_val} ({new_type})</td>
-                        </tr>
-                    """
-                elif diff_type == "modified":
-                     return f"""
-                        <tr>
-                            <td class="{label_class}" title="{tooltip_text}">{icon_html} {label}</td>
-                            <td class="{old_cell_class}">{old_val}</td>
-                            <td class="{new_cell_class}">{new_val}</td>
-                        </tr>
-                    """
-                else: # added, deleted, or unmodified
-                    return f"""
-                        <tr>
-                            <td class="{label_class}" title="{tooltip_text}">{icon_html} {label}</td>
-                            <td class="{old_cell_class}">{old_content}</td>
-                            <td class="{new_cell_class}">{new_content}</td>
-                        </tr>
-                    """
-
-            diff_html = ""
-
-            # --- Table Diff Section ---
-            # Use st.expander for collapsibility
-            with st.expander("Table-Level Changes", expanded=True):
-                diff_html_tables = ""
-                diff_html_tables += "<table class='diff-table'>"
-                diff_html_tables += """
-                    <thead>
-                        <tr>
-                            <th>Change Type</th>
-                            <th>Table Name (Old)</th>
-                            <th>Table Name (New)</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-                """
-                for table_name in schema_diff_details["added_tables"]:
-                    diff_html_tables += render_diff_row("Added", "", table_name, "added")
-                for table_name in schema_diff_details["deleted_tables"]:
-                    diff_html_tables += render_diff_row("Deleted", table_name, "", "deleted")
-                
-                # Placeholder for Modified Tables (will be detailed below)
-                if schema_diff_details["modified_tables"]:
-                    for table_name in schema_diff_details["modified_tables"]:
-                        diff_html_tables += render_diff_row("Modified", table_name, table_name, "modified")
-                diff_html_tables += "</tbody></table>"
-                
-                if not schema_diff_details["added_tables"] and \
-                   not schema_diff_details["deleted_tables"] and \
-                   not schema_diff_details["modified_tables"]:
-                    diff_html_tables = "<p class='placeholder-text'>No table-level changes detected.</p>"
-
-                st.markdown(f"<div class='diff-viewer-container'>{diff_html_tables}</div>", unsafe_allow_html=True)
-            
-            # --- Detailed Column Diff for Modified Tables ---
-            if schema_diff_details["modified_tables"]:
-                with st.expander("Detailed Column Changes in Modified Tables", expanded=True):
-                    for table_name, table_diff in schema_diff_details["modified_tables"].items():
-                        st.markdown(f"<h5>Table: <code>{table_name}</code></h5>", unsafe_allow_html=True)
-                        diff_html_columns = "<table class='diff-table'>"
-                        diff_html_columns += """
-                            <thead>
-                                <tr>
-                                    <th>Column Change</th>
-                                    <th>Old Value/Property</th>
-                                    <th>New Value/Property</th>
-                                </tr>
-                            </thead>
-                            <tbody>
-                        """
-                        # Added Columns
-                        for col_name in table_diff["added_columns"]:
-                            new_col_props = st.session_state.parsed_new_schema[table_name][col_name]
-                            diff_html_columns += render_diff_row(f"Added: {col_name}", "", f"Type: {new_col_props['type']}", "added")
-                        
-                        # Deleted Columns
-                        for col_name in table_diff["deleted_columns"]:
-                            old_col_props = st.session_state.parsed_old_schema[table_name][col_name]
-                            diff_html_columns += render_diff_row(f"Deleted: {col_name}", f"Type: {old_col_props['type']}", "", "deleted")
-
-                        # Renamed Columns
-                        for old_name, rename_info in table_diff["renamed_columns"].items():
-                            diff_html_columns += render_diff_row(
-                                "Renamed",
-                                old_name,
-                                rename_info["new_name"],
-                                "renamed",
-                                old_type=rename_info["old_type"],
-                                new_type=rename_info["new_type"]
-                            )
-                        
-                        # Modified Columns
-                        for col_name, mod_props in table_diff["modified_columns"].items():
-                            for prop_key, prop_values in mod_props.items():
-                                diff_html_columns += render_diff_row(
-                                    f"Modified: {col_name} ({prop_key})",
-                                    str(prop_values["old_value"]),
-                                    str(prop_values["new_value"]),
-                                    "modified"
-                                )
-                        diff_html_columns += "</tbody></table>"
-                        st.markdown(diff_html_columns, unsafe_allow_html=True)
-                        st.markdown("<br>", unsafe_allow_html=True) # Add space between tables
+            # Flat row index built once per analysis; every rerun renders a single page of it
+            row_index = get_diff_row_index(
+                get_current_schema_diff(), st.session_state.parsed_old_schema, st.session_state.parsed_new_schema
+            )
 
+            if not len(row_index):
+                st.info("No table or column changes detected.")
             else:
-                st.info("No detailed column changes in modified tables detected.")
+                col_tables, col_types, col_search = st.columns([2, 2, 2])
+                with col_tables:
+                    selected_tables = st.multiselect("Tables:", options=row_index.tables, key="diff_viewer_tables", placeholder="All tables")
+                with col_types:
+                    selected_change_types = st.multiselect("Change types:", options=row_index.change_types, key="diff_viewer_change_types", placeholder="All changes")
+                with col_search:
+                    search_query = st.text_input("Search:", key="diff_viewer_search", placeholder="table, column or type")
+
+                positions = row_index.filter(selected_tables, selected_change_types, search_query)
+                col_page, col_page_size = st.columns([3, 1])
+                with col_page_size:
+                    page_size = st.selectbox("Rows per page:", options=DIFF_VIEWER_PAGE_SIZES, key="diff_viewer_page_size")
+                page_count = max(1, -(-len(positions) // page_size))
+                if st.session_state.get("diff_viewer_page", 1) > page_count:
+                    st.session_state.diff_viewer_page = page_count # Filters may have shrunk the result below the current page
+                with col_page:
+                    page = st.number_input(f"Page (of {page_count}):", min_value=1, max_value=page_count, step=1, key="diff_viewer_page")
+
+                st.caption(f"Showing {min(len(positions), (page - 1) * page_size + 1)}–{min(len(positions), page * page_size)} "
+                           f"of {len(positions)} matching changes ({len(row_index)} in total)")
+                if positions:
+                    st.markdown(
+                        f"<div class='diff-viewer-container'>{render_diff_page_html(row_index.page(positions, page, page_size))}</div>",
+                        unsafe_allow_html=True
+                    )
+                else:
+                    st.info("No changes match the current filters.")
 
             st.markdown("---") # Separator below diff viewer
 
-            # Download Diff View Content (as HTML for now)
+            # Full diff as a standalone HTML page, built when clicked
             st.download_button(
                 label="⬇️ Download Diff View (HTML)",
-                data=f"<div class='diff-viewer-container'>Generated interactive diff will appear here.</div>".encode('utf-8'), # Placeholder data for download
+                data=deferred_export(
+                    "html", analysis_fingerprint(st.session_state.parsed_old_schema, st.session_state.parsed_new_schema),
+                    build_diff_html_export, get_current_schema_diff(), st.session_state.parsed_old_schema,
+                    st.session_state.parsed_new_schema, st.session_state.get("diff_summary_metrics")
+                ),
                 file_name="schema_diff_view.html",
                 mime="text/html",
                 use_container_width=True,
@@ -1,7 +1,12 @@
 # ai_logic.py
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv, find_dotenv
+from cache_utils import CACHE_DIR, DiskCache, make_cache_key
 
 # Find and load .env variables
 dotenv_path = find_dotenv()
@@ -11,84 +16,332 @@ if dotenv_path:
 # Retrieve the API key
 GOOGLE_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Basic validation for API Key
-if not GOOGLE_API_KEY or GOOGLE_API_KEY == "YOUR_ACTUAL_GEMINI_API_KEY_HERE":
-    raise RuntimeError(
-        "GEMINI_API_KEY not found or invalid. "
-        "Please replace 'YOUR_ACTUAL_GEMINI_API_KEY_HERE' "
-        "with your actual Google Gemini API key in your .env file."
-    )
+# The key is validated on the first AI call rather than at import, so the rest of the app
+# (parsing, diffing, history) works without one
+MISSING_API_KEY_MESSAGE = (
+    "❌ GEMINI_API_KEY not found or invalid. "
+    "Please replace 'YOUR_ACTUAL_GEMINI_API_KEY_HERE' "
+    "with your actual Google Gemini API key in your .env file."
+)
+
+def has_valid_api_key():
+    return bool(GOOGLE_API_KEY) and GOOGLE_API_KEY != "YOUR_ACTUAL_GEMINI_API_KEY_HERE"
+
+# --- Gemini Response Cache ---
+# Identical prompts sent to the same model are answered from disk instead of the API.
+# Streamlit reruns the whole script on every widget click, so without this each click
+# on an unchanged diff would repeat every Gemini round-trip.
+RESPONSE_CACHE_TTL_SECONDS = 7 * 24 * 3600 # Responses older than a week are regenerated
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024 # Least recently used responses are evicted past this size
+response_cache = DiskCache(
+    os.path.join(CACHE_DIR, "gemini_responses.sqlite3"),
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    default_ttl=RESPONSE_CACHE_TTL_SECONDS
+)
+
+# Upper bound for one Gemini call; concurrent calls share the same deadline
+GEMINI_CALL_TIMEOUT_SECONDS = 120
+# Calls in flight at once per batch: large diffs split into dozens of prompts, and sending them
+# all together only earns 429 (rate limit) answers
+GEMINI_MAX_CONCURRENT_CALLS = 4
+# Waits before retrying a rate-limited or temporarily failing call (within the batch deadline)
+GEMINI_RETRY_DELAYS_SECONDS = (2, 5, 10)
+# Errors worth retrying: rate limits and transient server-side failures
+RETRYABLE_GEMINI_ERRORS = (
+    google_exceptions.TooManyRequests, # Includes ResourceExhausted (quota / 429)
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+# Errors meaning the resolved model is gone or no longer accessible to this key: the cached
+# model name is dropped and the model resolved again, once per call
+MODEL_UNAVAILABLE_ERRORS = (
+    google_exceptions.NotFound,
+    google_exceptions.PermissionDenied,
+)
+
+API_CALL_FAILED_HINT = (
+    "Possible issues: incorrect API key, rate limit exceeded, or model access problems. "
+    "Please ensure your GEMINI_API_KEY is correct and you have access to the selected model(s)."
+)
+NO_RESPONSE_TEXT_MESSAGE = "❌ Gemini API Error: No valid response text found. The AI might not have generated content for this query."
+
+
+class GeminiCallError(Exception):
+    """A Gemini call that produced no answer; str(error) is the message to show the user."""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+def _api_call_failed_message(error) -> str:
+    return f"❌ Gemini API Call Failed: {error}\n\n{API_CALL_FAILED_HINT}"
 
 # --- Gemini Model Initialization ---
-model = None # Initialize model as None
+# Resolved lazily on the first AI call, once per process. The chosen model name is also kept in
+# the disk cache, so later cold starts skip the list_models round-trip entirely.
+MODEL_PREFERENCE = (
+    "models/gemini-1.5-flash", # More free-tier friendly
+    "models/gemini-pro", # Older stable, often good free tier
+    "models/gemini-1.5-pro", # More limited quota
+)
+MODEL_NAME_CACHE_TTL_SECONDS = 24 * 3600 # Re-check the available models once a day
+MODEL_RETRY_SECONDS = 60 # After a failed resolution, AI calls fail fast for this long
+
+_model = None
+_model_error = None
+_model_failed_at = 0.0
+_model_lock = threading.Lock()
+
+def _model_name_cache_key():
+    # Keyed by the API key's hash: different keys can have access to different models
+    return make_cache_key("gemini_model_name", GOOGLE_API_KEY)
 
 def get_available_gemini_model():
     """
-    Checks for available Gemini models that support generateContent method,
-    prioritizing 'gemini-1.5-flash', then 'gemini-pro', then 'gemini-1.5-pro',
-    then any other suitable model.
+    Lists the available Gemini models once and returns a GenerativeModel for the first
+    entry of MODEL_PREFERENCE that supports generateContent, or else for any model that does.
     """
     genai.configure(api_key=GOOGLE_API_KEY) # Configure here just before listing models
 
-    # 1. Prioritize gemini-1.5-flash (more free-tier friendly)
-    for m in genai.list_models():
-        if m.name == 'models/gemini-1.5-flash' and 'generateContent' in m.supported_generation_methods:
-            print(f"Prioritizing available model: {m.name}") # For debugging purposes
-            return genai.GenerativeModel(m.name)
-
-    # 2. Fallback to gemini-pro (older stable, often good free tier)
-    for m in genai.list_models():
-        if m.name == 'models/gemini-pro' and 'generateContent' in m.supported_generation_methods:
-            print(f"Falling back to available model: {m.name}") # For debugging purposes
-            return genai.GenerativeModel(m.name)
-
-    # 3. Fallback to gemini-1.5-pro (your previously chosen, but more limited model)
-    for m in genai.list_models():
-        if m.name == 'models/gemini-1.5-pro' and 'generateContent' in m.supported_generation_methods:
-            print(f"Falling back to available model: {m.name}") # For debugging purposes
-            return genai.GenerativeModel(m.name)
-            
-    # 4. Final fallback to any other model supporting generateContent
-    for m in genai.list_models():
-        if 'generateContent' in m.supported_generation_methods:
-            print(f"Using general suitable model: {m.name}") # For debugging purposes
-            return genai.GenerativeModel(m.name)
-            
+    suitable_models = [
+        m.name for m in genai.list_models() if "generateContent" in m.supported_generation_methods
+    ]
+    for preferred_name in MODEL_PREFERENCE:
+        if preferred_name in suitable_models:
+            print(f"Using preferred available model: {preferred_name}") # For debugging purposes
+            return genai.GenerativeModel(preferred_name)
+    if suitable_models:
+        print(f"Using general suitable model: {suitable_models[0]}") # For debugging purposes
+        return genai.GenerativeModel(suitable_models[0])
+
     raise Exception(
         "No Gemini model found that supports 'generateContent'. "
         "Please ensure your API key is correct and valid, or check Google AI Studio for available models."
     )
 
-try:
-    model = get_available_gemini_model()
-except Exception as e:
-    # This exception will be propagated to Streamlit's main_app.py
-    # if `ask_gemini` is called and `model` is None.
-    print(f"FATAL ERROR in ai_logic.py: Could not initialize Gemini model. "
-          f"Ensure API key is valid and models are accessible: {e}")
-    model = None # Explicitly set model to None on failure
+def get_model():
+    """
+    Returns the Gemini model, resolving it on first use (thread-safe, at most once at a time).
+    The model name is read from the disk cache when fresh, otherwise listed from the API and cached.
+    Returns None if the key is missing or resolution failed; see get_model_error().
+    """
+    global _model, _model_error, _model_failed_at
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is not None:
+            return _model
+        if not has_valid_api_key():
+            _model_error = MISSING_API_KEY_MESSAGE
+            return None
+        if _model_error and time.monotonic() - _model_failed_at < MODEL_RETRY_SECONDS:
+            return None
+
+        name_cache_key = _model_name_cache_key()
+        try:
+            model_name = response_cache.get(name_cache_key)
+            if model_name:
+                genai.configure(api_key=GOOGLE_API_KEY)
+                _model = genai.GenerativeModel(model_name)
+            else:
+                _model = get_available_gemini_model()
+                response_cache.set(name_cache_key, _model.model_name, ttl=MODEL_NAME_CACHE_TTL_SECONDS)
+            _model_error = None
+        except Exception as e:
+            print(f"ERROR in ai_logic.py: Could not initialize Gemini model. "
+                  f"Ensure API key is valid and models are accessible: {e}") # For debugging purposes
+            _model_error = f"❌ Gemini AI service is not available. Please check your API key and model access. ({e})"
+            _model_failed_at = time.monotonic()
+        return _model
 
-def ask_gemini(prompt: str) -> str:
+def evict_model(model, error):
     """
-    Sends a prompt to the configured Gemini model and returns the text response.
-    Returns Markdown-formatted text.
+    Forgets a model the API reports as not found or not permitted (e.g. retired since its name
+    was cached): the next get_model() lists the available models again instead of reusing the
+    cached name. A model another call has already evicted or replaced is left alone.
     """
-    if model is None:
-        return "❌ Gemini AI service is not available. Please check your API key and model access."
-    
-    if not prompt.strip():
-        return "Please provide a valid input for explanation."
+    global _model
+    with _model_lock:
+        if _model is not model:
+            return
+        print(f"Model {model.model_name} is unavailable ({error}); resolving the model again.") # For debugging purposes
+        _model = None
+        response_cache.delete(_model_name_cache_key())
+
+def get_model_error() -> str:
+    """Returns why the model is unavailable (the message shown instead of an AI response)."""
+    return _model_error or "❌ Gemini AI service is not available. Please check your API key and model access."
+
+def generate_text(prompt: str, timeout: float = None) -> str:
+    """
+    Sends a prompt to the configured Gemini model and returns the Markdown text response,
+    or raises GeminiCallError. Successful responses are cached on disk, keyed by a hash of
+    the model name and prompt. `timeout` (seconds) bounds the API request itself.
+    If the model turns out to be unavailable, it is resolved again and the call repeated once.
+    """
+    for attempt in range(2):
+        model = get_model()
+        if model is None:
+            raise GeminiCallError(get_model_error())
+
+        if not prompt.strip():
+            return "Please provide a valid input for explanation."
+
+        cache_key = make_cache_key(model.model_name, prompt)
+        cached_text = response_cache.get(cache_key)
+        if cached_text is not None:
+            return cached_text
 
+        try:
+            request_options = {"timeout": timeout} if timeout else None
+            response = model.generate_content(prompt, request_options=request_options)
+            break
+        except MODEL_UNAVAILABLE_ERRORS as e:
+            if attempt > 0:
+                raise GeminiCallError(_api_call_failed_message(e)) from e
+            evict_model(model, e)
+        except Exception as e:
+            raise GeminiCallError(_api_call_failed_message(e), retryable=isinstance(e, RETRYABLE_GEMINI_ERRORS)) from e
+    if response and response.candidates and len(response.candidates) > 0 and \
+       response.candidates[0].content and response.candidates[0].content.parts and \
+       len(response.candidates[0].content.parts) > 0:
+        response_text = response.candidates[0].content.parts[0].text
+        response_cache.set(cache_key, response_text) # Only real answers are cached, never error messages
+        return response_text
+    raise GeminiCallError(NO_RESPONSE_TEXT_MESSAGE)
+
+def ask_gemini(prompt: str, timeout: float = None) -> str:
+    """
+    Sends a prompt to the configured Gemini model and returns the text response.
+    Returns Markdown-formatted text; failures are returned as an error message instead.
+    """
     try:
-        response = model.generate_content(prompt)
-        if response and response.candidates and len(response.candidates) > 0 and \
-           response.candidates[0].content and response.candidates[0].content.parts and \
-           len(response.candidates[0].content.parts) > 0:
-            return response.candidates[0].content.parts[0].text
-        else:
-            return "❌ Gemini API Error: No valid response text found. The AI might not have generated content for this query."
-    except Exception as e:
-        return f"❌ Gemini API Call Failed: {e}\n\n" \
-               "Possible issues: incorrect API key, rate limit exceeded, or model access problems. " \
-               "Please ensure your GEMINI_API_KEY is correct and you have access to the selected model(s)."
+        return generate_text(prompt, timeout)
+    except GeminiCallError as e:
+        return str(e)
+
+def generate_text_with_retry(prompt: str, deadline: float) -> str:
+    """
+    generate_text() retried after GEMINI_RETRY_DELAYS_SECONDS on rate limits and transient
+    errors, as long as the retry can still start before `deadline` (time.monotonic()).
+    Raises the last GeminiCallError when the call cannot succeed.
+    """
+    for delay in GEMINI_RETRY_DELAYS_SECONDS + (None,):
+        try:
+            return generate_text(prompt, timeout=max(1, deadline - time.monotonic()))
+        except GeminiCallError as e:
+            if not e.retryable or delay is None or time.monotonic() + delay >= deadline:
+                raise
+            print(f"Gemini call failed, retrying in {delay}s: {e.__cause__ or e}") # For debugging purposes
+            time.sleep(delay)
+
+def ask_gemini_stream(prompt: str, timeout: float = None):
+    """
+    Streaming variant of generate_text: a generator over the response text as Gemini produces it,
+    so the first section can be shown long before the whole answer is ready.
+    The complete text is cached like generate_text's; a cached answer is yielded in one piece.
+    Failures raise GeminiCallError, possibly after some text was already yielded, so an error
+    message is never mistaken for part of the answer. An unavailable model is resolved again
+    once, as in generate_text, if nothing was yielded yet.
+    """
+    for attempt in range(2):
+        model = get_model()
+        if model is None:
+            raise GeminiCallError(get_model_error())
+
+        if not prompt.strip():
+            yield "Please provide a valid input for explanation."
+            return
+
+        cache_key = make_cache_key(model.model_name, prompt)
+        cached_text = response_cache.get(cache_key)
+        if cached_text is not None:
+            yield cached_text
+            return
+
+        response_parts = []
+        try:
+            request_options = {"timeout": timeout} if timeout else None
+            for chunk in model.generate_content(prompt, stream=True, request_options=request_options):
+                try:
+                    chunk_text = chunk.text
+                except ValueError:
+                    continue # Chunks without text parts (e.g. only safety metadata) carry nothing to show
+                if chunk_text:
+                    response_parts.append(chunk_text)
+                    yield chunk_text
+            break
+        except MODEL_UNAVAILABLE_ERRORS as e:
+            if attempt > 0 or response_parts:
+                raise GeminiCallError(_api_call_failed_message(e)) from e
+            evict_model(model, e)
+        except Exception as e:
+            raise GeminiCallError(_api_call_failed_message(e), retryable=isinstance(e, RETRYABLE_GEMINI_ERRORS)) from e
+
+    if not response_parts:
+        raise GeminiCallError(NO_RESPONSE_TEXT_MESSAGE)
+    response_cache.set(cache_key, "".join(response_parts)) # Only complete answers are cached
+
+class GeminiCallBatch:
+    """
+    A set of independent prompts ({name: prompt}) sent to Gemini on a thread pool of at most
+    GEMINI_MAX_CONCURRENT_CALLS workers. The calls start as soon as the batch is created, so the
+    caller can do other work (e.g. stream another response) and collect results as they finish.
+    Rate-limited calls are retried with backoff; every call shares one deadline of `timeout`
+    seconds from creation.
+
+    Results are (name, response_text) pairs. A call that still fails yields (name, None) and
+    its error message is kept in `failures` ({name: message}), so callers never mistake an
+    error for an answer.
+    """
+
+    def __init__(self, prompts: dict, timeout: float = GEMINI_CALL_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.failures = {}
+        self._deadline = time.monotonic() + timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, min(GEMINI_MAX_CONCURRENT_CALLS, len(prompts))), thread_name_prefix="gemini"
+        )
+        self._futures = {
+            self._executor.submit(generate_text_with_retry, prompt, self._deadline): name for name, prompt in prompts.items()
+        }
+        self._pending = set(self._futures)
+
+    def _result(self, future):
+        name = self._futures[future]
+        try:
+            return name, future.result()
+        except Exception as e:
+            self.failures[name] = str(e)
+            return name, None
+
+    def completed(self):
+        """Yields (name, response_text) for calls that have finished since the last check, without waiting."""
+        for future in [f for f in self._pending if f.done()]:
+            self._pending.discard(future)
+            yield self._result(future)
+
+    def results(self):
+        """
+        Yields (name, response_text) for every remaining call in completion order, waiting as needed.
+        Calls still running or queued at the deadline are cancelled and recorded as timed out.
+        """
+        while self._pending:
+            done, self._pending = wait(
+                self._pending, timeout=max(0, self._deadline - time.monotonic()), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                for future in self._pending:
+                    future.cancel()
+                    name = self._futures[future]
+                    self.failures[name] = f"❌ Gemini API call timed out after {self.timeout} seconds. Please try again."
+                    yield name, None
+                self._pending = set()
+                return
+            for future in done:
+                yield self._result(future)
 
+    def close(self):
+        """Cancels calls that have not started yet and releases the pool without waiting for running ones."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
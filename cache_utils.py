@@ -0,0 +1,141 @@
+# cache_utils.py
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+
+# Directory for local, disposable caches (safe to delete at any time)
+CACHE_DIR = ".schema_drift_cache"
+
+
+def make_cache_key(*parts) -> str:
+    """
+    Builds a stable content-addressed key (SHA-256 hex digest) from the given parts.
+    Parts are joined with a separator that cannot appear in normal text, so
+    ("ab", "c") and ("a", "bc") never collide.
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        hasher.update(str(part).encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+
+class DiskCache:
+    """
+    Small persistent key/value cache backed by a single SQLite file.
+
+    Entries expire after a TTL and the file is kept under `max_bytes` by evicting
+    the least recently used entries. Values are pickled, so anything picklable
+    can be stored. All failures are swallowed: a broken cache behaves like an
+    empty one and never breaks the caller.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, default_ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # Opened lazily so importing a module that defines a cache never touches the disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries(expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries(accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, key, default=None):
+        """Returns the cached value for `key`, or `default` if missing or expired."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                now = time.time()
+                row = conn.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return default
+                if row[1] < now:
+                    conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                    conn.commit()
+                    return default
+                conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+                return pickle.loads(row[0])
+        except Exception as e:
+            print(f"Cache read failed ({self.path}): {e}")  # For debugging purposes
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Stores `value` under `key`, then purges expired entries and enforces the size bound."""
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(payload) > self.max_bytes:
+                return  # Never let a single entry flush the whole cache
+            now = time.time()
+            expires_at = now + (ttl if ttl is not None else self.default_ttl)
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, size, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), expires_at, now)
+                )
+                conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (now,))
+                self._evict(conn)
+                conn.commit()
+        except Exception as e:
+            print(f"Cache write failed ({self.path}): {e}")  # For debugging purposes
+
+    def delete(self, key):
+        """Removes one entry, if present."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                conn.commit()
+        except Exception as e:
+            print(f"Cache delete failed ({self.path}): {e}")  # For debugging purposes
+
+    def _evict(self, conn):
+        """Drops least recently used entries until the cache is back under 90% of `max_bytes`."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        for key, size in conn.execute(
+            "SELECT key, size FROM cache_entries ORDER BY accessed_at ASC"
+        ).fetchall():
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            total -= size
+            if total <= target:
+                break
+
+    def clear(self):
+        """Removes every entry from the cache."""
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute("DELETE FROM cache_entries")
+                conn.commit()
+        except Exception as e:
+            print(f"Cache clear failed ({self.path}): {e}")  # For debugging purposes
@@ -0,0 +1,170 @@
+# cli.py
+"""
+Command-line entry point for running the schema drift analyzer in pipelines.
+
+    python cli.py diff old.sql new.sql
+    python cli.py batch migrations/ --fail-above 6 --output drift.json
+    python cli.py lineage migrations/ users.email orders.total_amount
+
+Output is JSON. The AI steps (Gemini report) only run with --ai.
+"""
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from schema_utils import parse_schema_file, compare_schemas, summarize_diff, list_schema_versions
+from risk_rules import score_schema_diff
+from lineage import SchemaLineage
+
+# Exit code when a diff scores above --fail-above
+EXIT_RISK_GATE_FAILED = 2
+
+
+# --- Diffing ---
+def _diff_pair(pair):
+    """Worker: diffs one (old_schema, new_schema) pair and scores it. Runs in a pool process."""
+    old_schema, new_schema = pair
+    schema_diff = compare_schemas(old_schema, new_schema)
+    return {
+        "summary": summarize_diff(old_schema, new_schema, schema_diff),
+        "risk": score_schema_diff(schema_diff),
+        "diff": schema_diff,
+    }
+
+def _run(function, items, workers):
+    """Maps `function` over `items` in order, on a process pool unless a single worker is requested."""
+    if workers == 1 or len(items) < 2:
+        return [function(item) for item in items]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, items))
+
+def diff_versions(paths, workers=None):
+    """
+    Parses every version once, then diffs consecutive versions (v1->v2, v2->v3, ...) on a
+    worker pool. Returns (results, schemas): one dict per pair {old, new, summary, risk, diff}
+    and the parsed schemas in version order.
+    """
+    schemas = _run(parse_schema_file, list(paths), workers)
+    pairs = list(zip(schemas, schemas[1:]))
+    results = [
+        {"old": old_path, "new": new_path, **result}
+        for (old_path, new_path), result in zip(zip(paths, paths[1:]), _run(_diff_pair, pairs, workers))
+    ]
+    return results, schemas
+
+
+def add_ai_reports(results, schemas):
+    """
+    Adds the Gemini drift report ("ai_report") to each result, plus "ai_report_errors"
+    ({part number: message}) for parts that could not be generated.
+    Imported lazily: only --ai needs the API.
+    """
+    from ai_logic import GeminiCallBatch
+    from prompt_builder import build_drift_report_prompts, stitch_responses
+
+    for result, (old_schema, new_schema) in zip(results, zip(schemas, schemas[1:])):
+        prompts = build_drift_report_prompts(result["diff"], old_schema, new_schema)
+        parts = [None] * len(prompts)
+        batch = GeminiCallBatch(dict(enumerate(prompts)))
+        try:
+            for index, response_text in batch.results():
+                parts[index] = response_text
+        finally:
+            batch.close()
+        result["ai_report"] = stitch_responses(parts, pending_note="")
+        if batch.failures:
+            result["ai_report_errors"] = {index + 1: message for index, message in sorted(batch.failures.items())}
+
+
+def column_lineage(paths, columns, workers=None):
+    """Parses every version once (on a pool), builds the lineage and returns {column: history} for the requested columns."""
+    lineage = SchemaLineage()
+    for path, schema in zip(paths, _run(parse_schema_file, list(paths), workers)):
+        lineage.add_version(os.path.basename(path), schema)
+    return {column: lineage.column_history(column) for column in columns}
+
+
+# --- Command Line ---
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Intelligent Schema Drift & Impact Analyzer: compare schema versions and emit JSON diffs."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = subparsers.add_parser("diff", help="Compare two schema files (SQL DDL or JSON).")
+    diff_parser.add_argument("old", help="Old (v1) schema file")
+    diff_parser.add_argument("new", help="New (v2) schema file")
+
+    batch_parser = subparsers.add_parser(
+        "batch", help="Compare consecutive versions of every schema file in a directory (v1->v2->v3...)."
+    )
+    batch_parser.add_argument("directory", help="Directory of versioned schema files, ordered by name (natural sort)")
+    batch_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count; 1 = no pool)")
+
+    lineage_parser = subparsers.add_parser(
+        "lineage", help="Show the history of columns (added, renamed, type changes, ...) across every version in a directory."
+    )
+    lineage_parser.add_argument("directory", help="Directory of versioned schema files, ordered by name (natural sort)")
+    lineage_parser.add_argument("columns", nargs="+", metavar="TABLE.COLUMN", help="Columns to trace, by any name they ever had")
+    lineage_parser.add_argument("--workers", type=int, default=None, help="Worker processes for parsing (default: CPU count; 1 = no pool)")
+    lineage_parser.add_argument("--output", "-o", default=None, help="Write the JSON here instead of stdout")
+    lineage_parser.add_argument("--indent", type=int, default=2, help="JSON indentation (0 for compact)")
+
+    for sub in (diff_parser, batch_parser):
+        sub.add_argument("--ai", action="store_true", help="Also generate the Gemini drift report (needs GEMINI_API_KEY)")
+        sub.add_argument("--fail-above", type=int, default=None, metavar="SCORE",
+                         help=f"Exit with code {EXIT_RISK_GATE_FAILED} if any diff's rule-based risk score is above SCORE (1-10)")
+        sub.add_argument("--output", "-o", default=None, help="Write the JSON here instead of stdout")
+        sub.add_argument("--indent", type=int, default=2, help="JSON indentation (0 for compact)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "diff":
+        paths = [args.old, args.new]
+        workers = 1 # A single pair gains nothing from a pool
+    else:
+        if not os.path.isdir(args.directory):
+            print(f"Error: not a directory: {args.directory}", file=sys.stderr)
+            return 1
+        paths = list_schema_versions(args.directory)
+        if len(paths) < 2:
+            print(f"Error: need at least two schema files in {args.directory}, found {len(paths)}", file=sys.stderr)
+            return 1
+        workers = args.workers
+
+    for path in paths:
+        if not os.path.isfile(path):
+            print(f"Error: schema file not found: {path}", file=sys.stderr)
+            return 1
+
+    if args.command == "lineage":
+        output = {"versions": paths, "columns": column_lineage(paths, args.columns, workers=workers)}
+        results = []
+    else:
+        results, schemas = diff_versions(paths, workers=workers)
+        if args.ai:
+            add_ai_reports(results, schemas)
+        output = results[0] if args.command == "diff" else {"versions": paths, "pairs": results}
+    output_json = json.dumps(output, indent=args.indent or None)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output_json + "\n")
+    else:
+        print(output_json)
+
+    if getattr(args, "fail_above", None) is not None:
+        failing = [r for r in results if r["risk"]["score"] > args.fail_above]
+        for r in failing:
+            print(f"Risk gate failed: {r['old']} -> {r['new']} scored {r['risk']['score']}/10 "
+                  f"({r['risk']['level']}), above {args.fail_above}", file=sys.stderr)
+        if failing:
+            return EXIT_RISK_GATE_FAILED
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
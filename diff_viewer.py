@@ -0,0 +1,198 @@
+# diff_viewer.py
+import html
+import itertools
+import threading
+from io import BytesIO
+from datetime import datetime
+from collections import OrderedDict
+from exports import iter_diff_rows, analysis_fingerprint
+
+DIFF_VIEWER_PAGE_SIZES = (50, 100, 250)
+DIFF_INDEX_CACHE_MAX_ENTRIES = 4 # Row indexes kept per process (one per analysed schema pair)
+HTML_EXPORT_BATCH_ROWS = 500 # Rows rendered per write
+
+# Change Type (as produced by iter_diff_rows) -> diff style used by the viewer CSS classes
+CHANGE_TYPE_STYLES = {
+    "Added Table": "added",
+    "Deleted Table": "deleted",
+    "Added Column": "added",
+    "Deleted Column": "deleted",
+    "Renamed Column": "renamed",
+    "Modified Property": "modified",
+}
+
+# Font Awesome icon and tooltip per diff style
+_STYLE_ICONS = {
+    "added": ("fas fa-plus", "This element was added."),
+    "deleted": ("fas fa-minus", "This element was deleted."),
+    "modified": ("fas fa-edit", "Properties of this element were modified."),
+    "renamed": ("fas fa-exchange-alt", "This element was likely renamed."),
+}
+
+_diff_index_cache = OrderedDict() # {analysis_fingerprint: DiffRowIndex}, kept in LRU order
+_diff_index_cache_lock = threading.Lock()
+
+
+class DiffRowIndex:
+    """
+    Flat, precomputed index of every change in a diff: one (Change Type, Table, Column, Old, New)
+    row per change, plus a per-table position index and lower-cased search keys. Built once per
+    analysis; a page of the viewer is then a slice of the (cached) filter result, so its cost
+    does not grow with the size of the diff.
+    """
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self._search_keys = ["\x1f".join(row).lower() for row in self.rows]
+        self.by_table = {} # {table: [row position, ...]} in diff order
+        for position, row in enumerate(self.rows):
+            self.by_table.setdefault(row[1], []).append(position)
+        self.tables = sorted(self.by_table)
+        self.change_types = [change_type for change_type in CHANGE_TYPE_STYLES if any(row[0] == change_type for row in self.rows)]
+        self._last_filter = (None, None) # (filter key, positions): paging through one filter never re-scans
+
+    def __len__(self):
+        return len(self.rows)
+
+    def filter(self, tables=(), change_types=(), query=""):
+        """Returns the row positions matching every given filter (all rows when none are given)."""
+        filter_key = (tuple(tables), tuple(change_types), query.strip().lower())
+        if self._last_filter[0] == filter_key:
+            return self._last_filter[1]
+
+        tables, change_types, query = filter_key
+        if tables:
+            positions = sorted(position for table in tables for position in self.by_table.get(table, []))
+        else:
+            positions = range(len(self.rows))
+        if change_types:
+            positions = [position for position in positions if self.rows[position][0] in change_types]
+        if query:
+            positions = [position for position in positions if query in self._search_keys[position]]
+        positions = list(positions)
+
+        self._last_filter = (filter_key, positions)
+        return positions
+
+    def page(self, positions, page_number, page_size):
+        """Returns the rows of one 1-based page of a filter result."""
+        start = (page_number - 1) * page_size
+        return [self.rows[position] for position in positions[start:start + page_size]]
+
+
+def get_diff_row_index(schema_diff, old_schema, new_schema):
+    """Returns the DiffRowIndex of an analysis, building it only the first time the schema pair is seen."""
+    fingerprint = analysis_fingerprint(old_schema, new_schema)
+    with _diff_index_cache_lock:
+        if fingerprint in _diff_index_cache:
+            _diff_index_cache.move_to_end(fingerprint)
+            return _diff_index_cache[fingerprint]
+
+    row_index = DiffRowIndex(iter_diff_rows(schema_diff, old_schema, new_schema))
+    with _diff_index_cache_lock:
+        _diff_index_cache[fingerprint] = row_index
+        _diff_index_cache.move_to_end(fingerprint)
+        while len(_diff_index_cache) > DIFF_INDEX_CACHE_MAX_ENTRIES:
+            _diff_index_cache.popitem(last=False) # Evict the least recently used index
+    return row_index
+
+
+# --- HTML Rendering ---
+DIFF_TABLE_HEADER = """
+    <table class='diff-table'>
+        <thead>
+            <tr>
+                <th>Change Type</th>
+                <th>Table</th>
+                <th>Column</th>
+                <th>Old Value/Property</th>
+                <th>New Value/Property</th>
+            </tr>
+        </thead>
+        <tbody>
+"""
+DIFF_TABLE_FOOTER = "</tbody></table>"
+
+def render_diff_row_html(row):
+    """Renders one index row as a color-coded <tr>; old/new cells are highlighted by the change's style."""
+    change_type, table_name, col_name, old_value, new_value = (html.escape(str(value)) for value in row)
+    diff_type = CHANGE_TYPE_STYLES.get(row[0], "modified")
+    icon, tooltip_text = _STYLE_ICONS[diff_type]
+    old_cell_class = "diff-cell" + (f" diff-{diff_type}" if diff_type != "added" else "")
+    new_cell_class = "diff-cell" + (f" diff-{diff_type}" if diff_type != "deleted" else "")
+    return (
+        f'<tr><td class="diff-label diff-{diff_type}-label" title="{tooltip_text}"><i class="{icon} diff-icon"></i> {change_type}</td>'
+        f'<td class="diff-cell">{table_name}</td><td class="diff-cell">{col_name}</td>'
+        f'<td class="{old_cell_class}">{old_value or "N/A"}</td><td class="{new_cell_class}">{new_value or "N/A"}</td></tr>'
+    )
+
+def render_diff_page_html(rows):
+    """Renders a page of rows as one diff table."""
+    return DIFF_TABLE_HEADER + "".join(render_diff_row_html(row) for row in rows) + DIFF_TABLE_FOOTER
+
+
+# --- HTML Export ---
+# Standalone page: the viewer's diff classes with a fixed light palette, no external CSS, fonts or icons
+HTML_EXPORT_CSS = """
+body { font-family: -apple-system, 'Segoe UI', Roboto, sans-serif; margin: 2rem; color: #1f2937; }
+h1 { font-size: 1.5rem; } h2 { font-size: 1.15rem; margin-top: 2rem; }
+details { margin: 0.5rem 0; } summary { cursor: pointer; font-weight: 600; padding: 0.3rem 0; }
+.diff-table { width: 100%; border-collapse: collapse; font-family: 'Fira Code', Consolas, monospace; font-size: 0.9em; margin-bottom: 1rem; }
+.diff-table th, .diff-table td { padding: 0.4rem 0.8rem; border: 1px solid #d1d5db; vertical-align: top; text-align: left; }
+.diff-table th { background: #f3f4f6; }
+.diff-icon { display: none; }
+.diff-added { background: rgba(76, 175, 80, 0.15); color: #166534; }
+.diff-deleted { background: rgba(239, 68, 68, 0.15); color: #991b1b; text-decoration: line-through; }
+.diff-modified { background: rgba(251, 191, 36, 0.2); color: #92400e; }
+.diff-renamed { background: rgba(138, 43, 226, 0.12); color: #6b21a8; }
+.diff-added-label { color: #166534; font-weight: 600; } .diff-deleted-label { color: #991b1b; font-weight: 600; }
+.diff-modified-label { color: #92400e; font-weight: 600; } .diff-renamed-label { color: #6b21a8; font-weight: 600; }
+"""
+
+def _batched(rows, size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+def iter_diff_html(schema_diff, old_schema, new_schema, summary_metrics=None):
+    """
+    Yields a self-contained HTML page of the full diff, piece by piece: a summary table, the
+    table-level changes, then one collapsible section per modified table. Rows come straight
+    from iter_diff_rows() in batches, without an intermediate list or DataFrame.
+    """
+    yield (f"<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>Schema Diff</title>"
+           f"<style>{HTML_EXPORT_CSS}</style></head><body>\n"
+           f"<h1>Schema Drift Diff</h1><p>Generated {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>\n")
+    if summary_metrics:
+        yield "<h2>Summary</h2><table class='diff-table'><tbody>"
+        yield "".join(f"<tr><th>{html.escape(str(metric))}</th><td>{html.escape(str(value))}</td></tr>" for metric, value in summary_metrics.items())
+        yield "</tbody></table>\n"
+
+    rows = iter_diff_rows(schema_diff, old_schema, new_schema)
+    # Table-level rows come first; column-level rows follow grouped by table, in diff order
+    for is_table_level, section_rows in itertools.groupby(rows, key=lambda row: row[0].endswith("Table")):
+        if is_table_level:
+            yield "<h2>Table-Level Changes</h2>" + DIFF_TABLE_HEADER
+            for batch in _batched(section_rows, HTML_EXPORT_BATCH_ROWS):
+                yield "".join(render_diff_row_html(row) for row in batch)
+            yield DIFF_TABLE_FOOTER + "\n"
+            continue
+        yield "<h2>Column Changes in Modified Tables</h2>\n"
+        for table_name, table_rows in itertools.groupby(section_rows, key=lambda row: row[1]):
+            yield f"<details open><summary>{html.escape(table_name)}</summary>" + DIFF_TABLE_HEADER
+            for batch in _batched(table_rows, HTML_EXPORT_BATCH_ROWS):
+                yield "".join(render_diff_row_html(row) for row in batch)
+            yield DIFF_TABLE_FOOTER + "</details>\n"
+    yield "</body></html>\n"
+
+def build_diff_html_export(schema_diff, old_schema, new_schema, summary_metrics=None):
+    """
+    Encodes iter_diff_html() chunk by chunk into one buffer and returns the page as UTF-8 bytes
+    for st.download_button. The page is never held as a str; getvalue() hands over the buffer
+    without copying it. Streamlit converts any download payload to bytes before serving it, so
+    spooling to a temp file would only add disk I/O on top of the same in-memory copy.
+    """
+    buffer = BytesIO()
+    for chunk in iter_diff_html(schema_diff, old_schema, new_schema, summary_metrics):
+        buffer.write(chunk.encode("utf-8"))
+    return buffer.getvalue()
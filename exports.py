@@ -0,0 +1,140 @@
+# exports.py
+import json
+import hashlib
+import itertools
+import threading
+from functools import partial
+from io import BytesIO
+from collections import OrderedDict
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from schema_model import as_schema
+
+EXCEL_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXCEL_SUMMARY_COLUMNS = ("Metric", "Value")
+EXCEL_CHANGE_COLUMNS = ("Change Type", "Table", "Column", "Old Property", "New Property")
+EXPORT_CACHE_MAX_ENTRIES = 8 # Exports kept per process; each holds the full file bytes
+
+_export_cache = OrderedDict() # {(format, analysis_fingerprint): bytes}, kept in LRU order
+_export_cache_lock = threading.Lock()
+
+
+# --- Diff Rows ---
+def get_column_type(schema, table_name, col_name):
+    """Returns a column's type from a parsed schema, or 'UNKNOWN' if the table/column is missing."""
+    table = schema.get(table_name)
+    column = table.get(col_name) if table is not None else None
+    return column.type if column is not None else "UNKNOWN"
+
+def iter_diff_rows(schema_diff, old_schema, new_schema):
+    """
+    Yields one (Change Type, Table, Column, Old Property, New Property) tuple per change in a
+    compare_schemas() result, in the same order as the Excel 'Detailed Changes' sheet.
+    Nothing is collected: exporters consume the rows as they are produced.
+    """
+    for table_name in schema_diff.get("added_tables", []):
+        yield ("Added Table", table_name, "", "", "")
+    for table_name in schema_diff.get("deleted_tables", []):
+        yield ("Deleted Table", table_name, "", "", "")
+
+    for table_name, t_diff in schema_diff.get("modified_tables", {}).items():
+        for col_name in t_diff.get("added_columns", []):
+            yield ("Added Column", table_name, col_name, "N/A", f"Type: {get_column_type(new_schema, table_name, col_name)}")
+        for col_name in t_diff.get("deleted_columns", []):
+            yield ("Deleted Column", table_name, col_name, f"Type: {get_column_type(old_schema, table_name, col_name)}", "N/A")
+        for old_name, rename_info in t_diff.get("renamed_columns", {}).items():
+            yield ("Renamed Column", table_name, f"{old_name} -> {rename_info['new_name']}",
+                   f"Type: {rename_info['old_type']}", f"Type: {rename_info['new_type']}")
+        for col_name, modified_props in t_diff.get("modified_columns", {}).items():
+            for prop_key, prop_values in modified_props.items():
+                yield ("Modified Property", table_name, col_name,
+                       f"{prop_key}: {prop_values['old_value']}", f"{prop_key}: {prop_values['new_value']}")
+
+
+# --- Excel ---
+def _header_row(sheet, titles):
+    """Bold header cells, as pandas' to_excel wrote them."""
+    cells = []
+    for title in titles:
+        cell = WriteOnlyCell(sheet, value=title)
+        cell.font = Font(bold=True)
+        cells.append(cell)
+    return cells
+
+def build_excel_report(summary_metrics, schema_diff, old_schema, new_schema):
+    """
+    Builds the Excel report (Summary Metrics + Detailed Changes sheets) and returns its bytes.
+    Uses openpyxl's write-only workbook, so rows stream from iter_diff_rows() straight into the
+    sheet without a list, DataFrame or in-memory cell grid in between.
+    """
+    workbook = Workbook(write_only=True)
+
+    summary_sheet = workbook.create_sheet("Summary Metrics")
+    summary_sheet.append(_header_row(summary_sheet, EXCEL_SUMMARY_COLUMNS))
+    for metric, value in summary_metrics.items():
+        summary_sheet.append((metric, value))
+
+    rows = iter_diff_rows(schema_diff, as_schema(old_schema), as_schema(new_schema))
+    first_row = next(rows, None)
+    if first_row is not None: # Only write the sheet if there are changes
+        changes_sheet = workbook.create_sheet("Detailed Changes")
+        changes_sheet.append(_header_row(changes_sheet, EXCEL_CHANGE_COLUMNS))
+        for row in itertools.chain([first_row], rows):
+            changes_sheet.append(row)
+
+    output = BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+# --- Markdown / JSON ---
+def build_markdown_export(report_markdown):
+    return (report_markdown or "").encode("utf-8")
+
+def build_json_export(old_schema, new_schema, schema_diff):
+    """The raw export: both parsed schemas and the diff, as indented JSON bytes."""
+    return json.dumps({
+        "old_schema_parsed": as_schema(old_schema).to_dict(),
+        "new_schema_parsed": as_schema(new_schema).to_dict(),
+        "schema_diff_details": schema_diff
+    }, indent=2).encode("utf-8")
+
+
+# --- Cached Exports ---
+def analysis_fingerprint(old_schema, new_schema, *texts):
+    """
+    Identifies one analysis: the (cached) fingerprints of both schemas plus any texts the export
+    embeds, such as the AI report. Cheap enough to compute on every rerun.
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(f"{as_schema(old_schema).fingerprint}\x1e{as_schema(new_schema).fingerprint}".encode("utf-8"))
+    for text in texts:
+        hasher.update(b"\x1e" + (text or "").encode("utf-8"))
+    return hasher.hexdigest()
+
+def get_cached_export(export_format, fingerprint, build):
+    """
+    Returns the bytes of an export, calling build() only the first time it is requested for
+    this analysis fingerprint; later requests (and reruns) are served from memory.
+    """
+    cache_key = (export_format, fingerprint)
+    with _export_cache_lock:
+        if cache_key in _export_cache:
+            _export_cache.move_to_end(cache_key)
+            return _export_cache[cache_key]
+
+    data = build()
+    with _export_cache_lock:
+        _export_cache[cache_key] = data
+        _export_cache.move_to_end(cache_key)
+        while len(_export_cache) > EXPORT_CACHE_MAX_ENTRIES:
+            _export_cache.popitem(last=False) # Evict the least recently used export
+    return data
+
+def deferred_export(export_format, fingerprint, build, *args):
+    """
+    Returns a zero-argument callable for st.download_button(data=...): Streamlit only calls it
+    when the button is clicked, so reruns do no export work, and the bytes are cached per fingerprint.
+    """
+    return partial(get_cached_export, export_format, fingerprint, partial(build, *args))
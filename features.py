@@ -1,115 +1,176 @@
 # features.py
 import streamlit as st
-import json
-import re
-from ai_logic import ask_gemini # Import ask_gemini
-from schema_utils import strip_sql_comments_and_normalize, parse_create_table_statement, compare_schemas # Import utility functions
+from ai_logic import ask_gemini_stream, GeminiCallBatch, GeminiCallError # Streams the report while the risk and test prompts run alongside
+from prompt_builder import build_drift_report_prompts, build_risk_score_prompt, build_regression_test_prompts, stitch_responses, PENDING_PARTS_NOTE
+from schema_utils import get_parsed_schema, parse_schema_file, get_schema_diff, summarize_diff # Import utility functions
+from schema_model import Schema
+from risk_rules import score_schema_diff
+from history_store import get_history_store
+from speculative import SpeculativeAnalyzer
 import os # New import for file operations
 from datetime import datetime # New import for timestamping
 
-# Define a directory to store historical drift reports
-HISTORY_DIR = "schema_drift_history"
+
+# Schema input modes: pasted text lives in session state, files are streamed from disk/upload
+INPUT_MODE_TEXT = "📝 Paste text"
+INPUT_MODE_FILE = "📂 Upload file / server path"
+SCHEMA_FILE_TYPES = ["sql", "ddl", "json", "txt"]
 
 def render_input_section():
     """Renders the input text areas for old and new schemas and the compare button."""
     st.markdown("<h2>Input Schema Versions</h2>", unsafe_allow_html=True)
     st.markdown("<p>Paste your old (v1) and new (v2) table schema definitions below. Supported formats: SQL <code>CREATE TABLE</code> statements or simple JSON schema arrays.</p>", unsafe_allow_html=True)
 
+    # Large dumps can be read straight from a file instead of being pasted into the text areas
+    input_mode = st.radio(
+        "Schema source:",
+        options=[INPUT_MODE_TEXT, INPUT_MODE_FILE],
+        horizontal=True,
+        key="schema_input_mode"
+    )
+    st.checkbox(
+        "⚡ Parallel diff for very large schemas (uses a process pool; results are identical)",
+        key="parallel_diff"
+    )
+    st.checkbox(
+        "🧠 Add an AI narrative to the rule-based risk score",
+        key="ai_risk_narrative"
+    )
+
     col_old_schema, col_new_schema = st.columns(2, gap="large")
 
     with col_old_schema:
         st.markdown("<h3><i class='fas fa-code-branch'></i> Old Schema (Version 1)</h3>", unsafe_allow_html=True)
-        st.session_state.old_schema_input = st.text_area(
-            "Paste Old Schema SQL or JSON here:",
-            value=st.session_state.old_schema_input,
-            height=400,
-            key="old_schema_input_area"
-        )
+        if input_mode == INPUT_MODE_TEXT:
+            st.session_state.old_schema_input = st.text_area(
+                "Paste Old Schema SQL or JSON here:",
+                value=st.session_state.old_schema_input,
+                height=400,
+                key="old_schema_input_area",
+                on_change=schedule_speculative_analysis
+            )
+        else:
+            st.file_uploader("Upload Old Schema file (SQL dump or JSON):", type=SCHEMA_FILE_TYPES, key="old_schema_file")
+            st.text_input("...or read it from a path on the server:", key="old_schema_path", placeholder="/dumps/warehouse_v1.sql")
 
     with col_new_schema:
         st.markdown("<h3><i class='fas fa-code-pull-request'></i> New Schema (Version 2)</h3>", unsafe_allow_html=True)
-        st.session_state.new_schema_input = st.text_area(
-            "Paste New Schema SQL or JSON here:",
-            value=st.session_state.new_schema_input,
-            height=400,
-            key="new_schema_input_area"
-        )
+        if input_mode == INPUT_MODE_TEXT:
+            st.session_state.new_schema_input = st.text_area(
+                "Paste New Schema SQL or JSON here:",
+                value=st.session_state.new_schema_input,
+                height=400,
+                key="new_schema_input_area",
+                on_change=schedule_speculative_analysis
+            )
+        else:
+            st.file_uploader("Upload New Schema file (SQL dump or JSON):", type=SCHEMA_FILE_TYPES, key="new_schema_file")
+            st.text_input("...or read it from a path on the server:", key="new_schema_path", placeholder="/dumps/warehouse_v2.sql")
 
     # The button directly calls generate_drift_report
     if st.button("🚀 Compare Schemas & Analyze Drift", type="primary", use_container_width=True, key="analyze_drift_btn"):
         generate_drift_report()
 
 
+def get_speculative_analyzer():
+    """Returns this session's background analyzer, creating it on first use."""
+    if st.session_state.get("speculative_analyzer") is None:
+        st.session_state.speculative_analyzer = SpeculativeAnalyzer()
+    return st.session_state.speculative_analyzer
+
+def schedule_speculative_analysis():
+    """
+    Text area on_change callback: starts parsing and diffing the edited inputs in the background,
+    so a later click on Compare only has to collect the result.
+    """
+    old_schema_text = st.session_state.get("old_schema_input_area", "")
+    new_schema_text = st.session_state.get("new_schema_input_area", "")
+    if old_schema_text.strip() and new_schema_text.strip():
+        get_speculative_analyzer().schedule(old_schema_text, new_schema_text)
+
+
+def get_schema_source(side):
+    """
+    Returns the schema source for 'old' or 'new' according to the selected input mode:
+    the pasted text, an uploaded file object, or a server-side file path.
+    Returns None if nothing usable was provided.
+    """
+    if st.session_state.get("schema_input_mode", INPUT_MODE_TEXT) == INPUT_MODE_TEXT:
+        schema_text = st.session_state.get(f"{side}_schema_input", "")
+        return schema_text if schema_text.strip() else None
+
+    uploaded_file = st.session_state.get(f"{side}_schema_file")
+    if uploaded_file is not None:
+        return uploaded_file
+    schema_path = st.session_state.get(f"{side}_schema_path", "").strip()
+    if schema_path:
+        if not os.path.isfile(schema_path):
+            st.error(f"❌ Schema file not found on the server: `{schema_path}`")
+            return None
+        return schema_path
+    return None
+
+def parse_schema_source(source):
+    """Parses pasted text in memory (cached by content hash); uploaded files and server paths are streamed."""
+    if isinstance(source, str) and st.session_state.get("schema_input_mode", INPUT_MODE_TEXT) == INPUT_MODE_TEXT:
+        return get_parsed_schema(source)
+    return parse_schema_file(source)
+
+def describe_schema_source(source):
+    """Returns what the history log keeps for a source: the raw text, or a reference to the file."""
+    if isinstance(source, str) and st.session_state.get("schema_input_mode", INPUT_MODE_TEXT) == INPUT_MODE_TEXT:
+        return source
+    return f"-- Loaded from file: {getattr(source, 'name', source)}"
+
+
 def generate_drift_report():
     """
     Parses schemas, compares them, and generates an AI report on schema drift.
-    Updates st.session_state.schema_diff_report and st.session_state.diff_summary_metrics.
-    Also saves the analysis to a historical log.
+    Updates st.session_state.diff_summary_metrics, saves the deterministic analysis to the
+    historical log right away and queues the AI prompts in st.session_state.pending_ai_analysis;
+    the output section runs them and attaches the AI report to the saved run (see run_pending_ai_analyses).
     """
-    old_schema_raw = st.session_state.old_schema_input
-    new_schema_raw = st.session_state.new_schema_input
+    old_schema_source = get_schema_source("old")
+    new_schema_source = get_schema_source("new")
 
     # Ensure inputs are not empty before proceeding
-    if not old_schema_raw.strip() or not new_schema_raw.strip():
-        st.error("⚠️ Please provide both Old and New schema definitions in the text areas above to perform a comparison.")
+    if old_schema_source is None or new_schema_source is None:
+        st.error("⚠️ Please provide both Old and New schema definitions above (pasted text, an uploaded file or a server path) to perform a comparison.")
         st.session_state.schema_diff_report = ""
         st.session_state.diff_summary_metrics = {} # Clear metrics on error
         return # Exit the function early if inputs are missing
 
     # Clear previous report and metrics to give immediate feedback on new attempt
     st.session_state.schema_diff_report = ""
+    st.session_state.risk_score_output = ""
+    st.session_state.rule_risk_score = {}
+    st.session_state.test_suggestions_output = ""
+    st.session_state.pending_ai_analysis = None
     st.session_state.diff_summary_metrics = {}
+    st.session_state.schema_diff_details = {}
+
+    # Pasted inputs were usually parsed, diffed and scored in the background while being edited
+    speculative = None
+    if st.session_state.get("schema_input_mode", INPUT_MODE_TEXT) == INPUT_MODE_TEXT:
+        with st.spinner("Collecting the background analysis..."):
+            speculative = get_speculative_analyzer().result(old_schema_source, new_schema_source)
 
     # 1. Parse Schemas
     try:
         with st.spinner("Parsing schemas..."):
-            # Try parsing old schema as JSON first (after stripping comments)
-            cleaned_old_input = strip_sql_comments_and_normalize(old_schema_raw)
-            try:
-                parsed_json_old = json.loads(cleaned_old_input)
-                temp_old_schema = {}
-                for table_obj in parsed_json_old:
-                    table_name = table_obj.get('table_name', 'untitled_table').lower()
-                    columns_data = {}
-                    for col_obj in table_obj.get('columns', []):
-                        col_name_lower = col_obj.get('name', 'untitled_col').lower()
-                        columns_data[col_name_lower] = {
-                            'type': col_obj.get('type', 'UNKNOWN').lower(),
-                            'is_pk': col_obj.get('is_pk', False),
-                            'nullable': not col_obj.get('not_null', False), # Infer nullable from not_null
-                            'unique': col_obj.get('unique', False)
-                        }
-                    temp_old_schema[table_name] = columns_data
-                st.session_state.parsed_old_schema = temp_old_schema
-            except json.JSONDecodeError:
-                # If not JSON, assume SQL and parse it
-                st.session_state.parsed_old_schema = parse_create_table_statement(old_schema_raw)
-            
-            # Try parsing new schema as JSON first (after stripping comments)
-            cleaned_new_input = strip_sql_comments_and_normalize(new_schema_raw)
-            try:
-                parsed_json_new = json.loads(cleaned_new_input)
-                temp_new_schema = {}
-                for table_obj in parsed_json_new:
-                    table_name = table_obj.get('table_name', 'untitled_table').lower()
-                    columns_data = {}
-                    for col_obj in table_obj.get('columns', []):
-                        col_name_lower = col_obj.get('name', 'untitled_col').lower()
-                        columns_data[col_name_lower] = {
-                            'type': col_obj.get('type', 'UNKNOWN').lower(),
-                            'is_pk': col_obj.get('is_pk', False),
-                            'nullable': not col_obj.get('not_null', False),
-                            'unique': col_obj.get('unique', False)
-                        }
-                    temp_new_schema[table_name] = columns_data
-                st.session_state.parsed_new_schema = temp_new_schema
-            except json.JSONDecodeError:
-                st.session_state.parsed_new_schema = parse_create_table_statement(new_schema_raw)
+            # JSON schema arrays and SQL DDL are both accepted; files are streamed statement by statement
+            if speculative:
+                st.session_state.parsed_old_schema = speculative["old_schema"]
+                st.session_state.parsed_new_schema = speculative["new_schema"]
+            else:
+                st.session_state.parsed_old_schema = parse_schema_source(old_schema_source)
+                st.session_state.parsed_new_schema = parse_schema_source(new_schema_source)
 
     except Exception as e:
         st.error(f"❌ Error during schema parsing: {e}. Please ensure your input format (SQL or JSON) is valid and well-formed.")
-        st.session_state.parsed_old_schema = {}
-        st.session_state.parsed_new_schema = {}
+        st.session_state.parsed_old_schema = Schema()
+        st.session_state.parsed_new_schema = Schema()
+        st.session_state.schema_diff_details = {}
         st.session_state.diff_summary_metrics = {}
         return
 
@@ -127,7 +188,12 @@ def generate_drift_report():
 
     # 2. Compare Schemas
     with st.spinner("Comparing schemas for drift..."):
-        schema_diff = compare_schemas(st.session_state.parsed_old_schema, st.session_state.parsed_new_schema)
+        schema_diff = speculative["schema_diff"] if speculative else get_schema_diff(
+            st.session_state.parsed_old_schema,
+            st.session_state.parsed_new_schema,
+            parallel=st.session_state.get("parallel_diff", False)
+        )
+    st.session_state.schema_diff_details = schema_diff # Shared by every output consumer, never recomputed on rerun
     
     # --- Debugging Output START ---
     # st.write("--- Debugging Schema Diff ---")
@@ -137,31 +203,14 @@ def generate_drift_report():
 
 
     # Calculate summary metrics
-    total_tables_old = len(st.session_state.parsed_old_schema)
-    total_tables_new = len(st.session_state.parsed_new_schema)
-    added_table_count = len(schema_diff["added_tables"])
-    deleted_table_count = len(schema_diff["deleted_tables"])
-    modified_table_count = len(schema_diff["modified_tables"])
-
-    added_column_count = sum(len(td["added_columns"]) for td in schema_diff["modified_tables"].values())
-    deleted_column_count = sum(len(td["deleted_columns"]) for td in schema_diff["modified_tables"].values())
-    modified_column_count = sum(len(td["modified_columns"]) for td in schema_diff["modified_tables"].values())
-    
-    # Add renamed column count
-    renamed_column_count = sum(len(td["renamed_columns"]) for td in schema_diff["modified_tables"].values())
-
-
-    st.session_state.diff_summary_metrics = {
-        "total_tables_old": total_tables_old,
-        "total_tables_new": total_tables_new,
-        "added_table_count": added_table_count,
-        "deleted_table_count": deleted_table_count,
-        "modified_table_count": modified_table_count,
-        "added_column_count": added_column_count,
-        "deleted_column_count": deleted_column_count,
-        "modified_column_count": modified_column_count,
-        "renamed_column_count": renamed_column_count, # Add this to metrics
-    }
+    st.session_state.diff_summary_metrics = speculative["summary_metrics"] if speculative else summarize_diff(
+        st.session_state.parsed_old_schema,
+        st.session_state.parsed_new_schema,
+        schema_diff
+    )
+
+    # Deterministic, rule-based risk score: shown immediately, no AI call needed
+    st.session_state.rule_risk_score = speculative["rule_risk"] if speculative else score_schema_diff(schema_diff)
 
     # --- Debugging Output START ---
     # st.write("Calculated Diff Summary Metrics:", st.session_state.diff_summary_metrics)
@@ -169,93 +218,148 @@ def generate_drift_report():
     # --- Debugging Output END ---
 
 
-    # 3. Generate AI Report
-    prompt = f"""
-    You are an expert data architect tasked with analyzing schema drift.
-    I am providing you with a structured comparison between an OLD database schema and a NEW version.
-    Your task is to generate a comprehensive, human-readable report detailing the schema changes.
-    For each significant change, explain its potential impact on existing data pipelines, reports, and applications.
-    Suggest practical remediation steps or considerations for data engineers.
-
-    The schema comparison is as follows (in JSON format):
-    ```json
-    {json.dumps(schema_diff, indent=2)}
-    ```
-
-    Please format your response using **Markdown** with the following highly structured and clear sections, making it easy for new team members to understand:
-
-    1.  **Overall Executive Summary:** A high-level overview of the most critical changes. Highlight the total number of tables added, deleted, or modified, and columns added, deleted, or modified.
-
-    For each table affected by schema drift, create a dedicated section:
-    ### 📁 Table: [Table Name]
-    ---
-    Within each table section, use these sub-sections:
-
-    #### **➕ Columns Added**
-    * List each added column.
-    * For each: `Column Name: \`[name]\` (Type: \`[type]\`)`
-    * Add a brief note on its purpose or what it might contain (e.g., "This new column will capture ...").
-
-    #### **❌ Columns Deleted**
-    * List each deleted column.
-    * For each: `Column Name: \`[name]\` (Type: \`[type]\`)`
-    * Add a note on potential data loss or breaking changes (e.g., "Deletion of this column will lead to data loss for ... and might break ...").
-
-    #### **✏️ Columns Modified**
-    * List each modified column.
-    * For each modified column:
-        * `Column Name: \`[name]\``
-        * `Old Type: \`[old_type_details]\``
-        * `New Type: \`[new_type_details]\``
-        * **Impact 🔥:** Explain the specific impact of this modification (e.g., "Data type change from X to Y might break ETL jobs expecting the old format and require data migration.").
-        * **Remediation 🛠️:** Suggest specific actions to resolve the impact (e.g., "Update ETL scripts, perform data backfill/migration, review downstream application logic, and conduct thorough regression testing.").
-
-    #### **🔁 Renamed Columns**
-    * If the `schema_diff` includes a `renamed_columns` section for this table, list them here explicitly.
-    * For each renamed column: `\`[Old Name]\` ➡️ \`[New Name]\`` (Old Type: \`[old_type]\` -> New Type: \`[new_type]\`)
-    * Add a note on the impact of the rename (e.g., "Renaming requires updating all queries and applications referencing the old name.").
-    * If no renames are detected for a table by the diff, explicitly state: `No inferred renames detected for this table.`
-
-    ---
-    Finally, conclude the report with:
-
-    ### **✅ General Best Practices & Proactive Schema Governance Tips**
-    * Provide bullet points on best practices for managing schema evolution (e.g., version control, backward compatibility, communication with stakeholders).
-    * Suggest proactive measures to minimize schema drift impact (e.g., using views, robust ETL error handling).
-
-    Ensure all explanations are clear, concise, and actionable for a data engineering team.
+    # 3. Queue the AI analyses. The report, risk narrative and test suggestions are independent,
+    # so the output section sends them to Gemini at once and fills each panel as it finishes.
+    # Prompts use the compact diff encoding; large diffs give several parts per analysis.
+    old_schema = st.session_state.parsed_old_schema
+    new_schema = st.session_state.parsed_new_schema
+    prompts = {
+        "report": build_drift_report_prompts(schema_diff, old_schema, new_schema),
+        "test_suggestions": build_regression_test_prompts(schema_diff, old_schema, new_schema),
+    }
+    if st.session_state.get("ai_risk_narrative", False):
+        prompts["risk_score"] = [build_risk_score_prompt(
+            schema_diff, old_schema, new_schema, rule_risk=st.session_state.rule_risk_score
+        )]
+    # The diff and metrics are saved now, so a rerun during the AI calls cannot lose the run
+    st.session_state.pending_ai_analysis = {
+        "prompts": prompts,
+        "history_run_id": save_drift_history(describe_schema_source(old_schema_source), describe_schema_source(new_schema_source)),
+    }
+
+
+def run_pending_ai_analyses(placeholders: dict):
     """
-    
-    ai_report = "" # Initialize here to ensure it's always defined
+    Sends the prompts queued by generate_drift_report to Gemini concurrently and writes each
+    result into its placeholder ({"report" | "risk_score" | "test_suggestions": st.empty()})
+    as soon as it arrives. A single-part report is streamed chunk by chunk while everything
+    else runs on a thread pool; analyses split into several prompts are stitched in order.
+    Stores the complete results in session state and attaches the report to the saved run
+    once every call has finished. The pending entry is only cleared then: a rerun that
+    interrupts the calls starts them again, and parts already answered come from the response cache.
+    """
+    pending = st.session_state.get("pending_ai_analysis")
+    if not pending:
+        return
+
+    prompts = pending["prompts"]
+    for name in prompts:
+        placeholders[name].info("⏳ Waiting for Gemini...")
+
+    parts = {name: [None] * len(name_prompts) for name, name_prompts in prompts.items()}
+    stream_report = len(prompts["report"]) == 1
+    # Every part except a streamed report goes to the pool, keyed by (analysis, part index)
+    batch = GeminiCallBatch({
+        (name, index): prompt
+        for name, name_prompts in prompts.items()
+        for index, prompt in enumerate(name_prompts)
+        if not (stream_report and name == "report")
+    })
+
+    failures = batch.failures # A failed streamed report is recorded alongside the pool's failures
+
+    def failed_parts(name):
+        return sorted(index for (failed_name, index) in failures if failed_name == name)
+
+    def show_part(key, response_text):
+        name, index = key
+        parts[name][index] = response_text
+        failed = failed_parts(name)
+        still_running = parts[name].count(None) > len(failed)
+        panel_markdown = stitch_responses(parts[name], pending_note=PENDING_PARTS_NOTE if still_running else "")
+        for failed_index in failed: # Failures are shown next to the answers, never stitched into them
+            panel_markdown += (f"\n\n> ⚠️ Part {failed_index + 1} of {len(parts[name])} could not be generated: "
+                               f"{failures[(name, failed_index)]}")
+        placeholders[name].markdown(panel_markdown)
+
     try:
-        with st.spinner("Generating AI-powered schema drift analysis..."):
-            ai_report = ask_gemini(prompt)
-            st.session_state.schema_diff_report = ai_report
-            st.toast("Drift analysis complete! 🚀 Check the report below.")
+        if stream_report:
+            # Stream the report into its panel; Streamlit elements are only touched from this thread,
+            # so finished background calls are picked up between chunks
+            report_chunks = []
+            try:
+                for chunk_text in ask_gemini_stream(prompts["report"][0], timeout=batch.timeout):
+                    report_chunks.append(chunk_text)
+                    placeholders["report"].markdown("".join(report_chunks) + " ▌")
+                    for key, response_text in batch.completed():
+                        show_part(key, response_text)
+            except GeminiCallError as e:
+                failures[("report", 0)] = str(e)
+                show_part(("report", 0), None) # A partial answer is dropped, like a failed batch call
+            else:
+                show_part(("report", 0), "".join(report_chunks)) # Full text for the history log and the downloads
+
+        for key, response_text in batch.results():
+            show_part(key, response_text)
     except Exception as e:
         st.error(f"❌ Error generating AI report: {e}. This might be due to API key issues, rate limits, or a very complex input for the AI.")
-        st.session_state.schema_diff_report = f"Error: Could not generate AI report. {e}"
-
-    # --- New: Save analysis to historical log ---
+    finally:
+        batch.close()
+
+    results = {}
+    for name, name_parts in parts.items():
+        if not any(name_parts):
+            results[name] = None
+            continue
+        results[name] = stitch_responses(name_parts, pending_note="")
+        failed = failed_parts(name)
+        if failed: # Stored and saved without the error texts, but visibly incomplete
+            results[name] += (f"\n\n> ⚠️ Incomplete: part(s) {', '.join(str(index + 1) for index in failed)} "
+                              f"of {len(name_parts)} could not be generated.")
+    st.session_state.schema_diff_report = results["report"] or "Error: Could not generate AI report."
+    if "risk_score" in prompts:
+        st.session_state.risk_score_output = results["risk_score"] or "Error generating the risk narrative."
+    st.session_state.test_suggestions_output = results["test_suggestions"] or "Error generating test suggestions."
+    st.toast("Drift analysis complete! 🚀 Check the report below.")
+
+    if results["report"]: # A run whose report failed entirely keeps an empty report in the history
+        attach_ai_report_to_history(pending["history_run_id"], results["report"])
+    st.session_state.pending_ai_analysis = None # Never re-send the same prompts on a later rerun
+
+
+def save_drift_history(old_schema_raw, new_schema_raw):
+    """
+    Saves the current analysis (schemas, diff, metrics and the AI report so far) to the history
+    store. Returns the run id, or None if it could not be saved.
+    """
     try:
-        os.makedirs(HISTORY_DIR, exist_ok=True) # Create directory if it doesn't exist
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = os.path.join(HISTORY_DIR, f"drift_report_{timestamp}.json")
-
         historical_data = {
-            "timestamp": timestamp,
+            "timestamp": datetime.now().strftime("%Y%m%d_%H%M%S"),
             "old_schema_raw": old_schema_raw,
             "new_schema_raw": new_schema_raw,
-            "parsed_old_schema": st.session_state.parsed_old_schema, # Save parsed schemas too
-            "parsed_new_schema": st.session_state.parsed_new_schema,
-            "schema_diff": schema_diff,
+            "parsed_old_schema": st.session_state.parsed_old_schema.to_dict(), # Save parsed schemas too
+            "parsed_new_schema": st.session_state.parsed_new_schema.to_dict(),
+            # Structural hash per table, computed once at parse time
+            "old_table_fingerprints": st.session_state.parsed_old_schema.table_fingerprints(),
+            "new_table_fingerprints": st.session_state.parsed_new_schema.table_fingerprints(),
+            "schema_diff": st.session_state.schema_diff_details,
             "summary_metrics": st.session_state.diff_summary_metrics,
-            "ai_report_markdown": ai_report # Save the generated markdown report
+            "risk_score": st.session_state.get("rule_risk_score", {}),
+            "ai_report_markdown": st.session_state.schema_diff_report # Save the generated markdown report
         }
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(historical_data, f, indent=2)
-        st.success(f"Analysis saved to historical log: `{filename}`")
+        run_id = get_history_store().save_run(historical_data)
+        st.success(f"Analysis saved to historical log (run #{run_id}).")
+        return run_id
     except Exception as e:
         st.error(f"Failed to save historical analysis: {e}")
+        return None
+
 
+def attach_ai_report_to_history(run_id, report_markdown):
+    """Stores the finished AI report on a run saved by save_drift_history."""
+    if run_id is None:
+        return # The run itself could not be saved; its error is already shown
+    try:
+        get_history_store().update_run_payload(run_id, "ai_report_markdown", report_markdown)
+    except Exception as e:
+        st.error(f"Failed to save the AI report to the historical log: {e}")
@@ -0,0 +1,486 @@
+# history_store.py
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime
+from schema_model import Schema
+
+# Directory for historical drift reports (legacy per-run JSON files and the SQLite store)
+HISTORY_DIR = "schema_drift_history"
+HISTORY_DB_PATH = os.path.join(HISTORY_DIR, "history.sqlite3")
+
+# Summary metrics kept as real (queryable) columns of the runs table
+METRIC_COLUMNS = (
+    "total_tables_old", "total_tables_new",
+    "added_table_count", "deleted_table_count", "modified_table_count",
+    "added_column_count", "deleted_column_count", "modified_column_count", "renamed_column_count",
+)
+
+# Large per-run fields of a history record, stored as compressed, content-addressed blobs
+PAYLOAD_FIELDS = ("schema_diff", "risk_score", "ai_report_markdown")
+
+# Per-side schema fields of a history record: (raw input, parsed schema, table fingerprints).
+# They are stored as one schema snapshot per distinct version, shared by every run that uses it
+# (the "new" schema of one run is usually the "old" schema of the next).
+SCHEMA_FIELDS = {
+    "old": ("old_schema_raw", "parsed_old_schema", "old_table_fingerprints"),
+    "new": ("new_schema_raw", "parsed_new_schema", "new_table_fingerprints"),
+}
+
+HISTORY_PAGE_SIZE = 20 # Runs per page in the History tab
+
+# Change counts rolled up per day (overall) for the trend views
+ROLLUP_METRICS = (
+    "added_table_count", "deleted_table_count", "modified_table_count",
+    "added_column_count", "deleted_column_count", "modified_column_count", "renamed_column_count",
+)
+# Change counts rolled up per day and table
+TABLE_ROLLUP_METRICS = (
+    "table_added", "table_deleted",
+    "added_columns", "deleted_columns", "modified_columns", "renamed_columns",
+)
+
+# SQLite expressions grouping a 'YYYY-MM-DD' day column into trend buckets
+TREND_GRANULARITIES = {
+    "day": "day",
+    "week": "strftime('%Y-W%W', day)",
+    "month": "substr(day, 1, 7)",
+}
+
+
+# --- Content-Addressed Storage ---
+def _encode(value):
+    return json.dumps(value, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def _put_blob(conn, value):
+    """Stores a JSON-serialisable value once per distinct content; returns its hash."""
+    encoded = _encode(value)
+    blob_hash = hashlib.sha256(encoded).hexdigest()
+    conn.execute(
+        "INSERT OR IGNORE INTO blobs (hash, data, size) VALUES (?, ?, ?)",
+        (blob_hash, zlib.compress(encoded, 6), len(encoded))
+    )
+    return blob_hash
+
+def _release_blob(conn, blob_hash):
+    """Deletes a blob once no run payload references it (schema snapshots keep their data inline)."""
+    conn.execute(
+        "DELETE FROM blobs WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM run_payloads WHERE blob_hash = ?)",
+        (blob_hash, blob_hash)
+    )
+
+def _get_blob(conn, blob_hash):
+    row = conn.execute("SELECT data FROM blobs WHERE hash = ?", (blob_hash,)).fetchone()
+    return json.loads(zlib.decompress(row[0])) if row else None
+
+def _put_snapshot(conn, schema_raw, parsed_schema, table_fingerprints=None):
+    """
+    Stores one schema version (raw input + parsed schema) once, compressed, keyed by the
+    SHA-256 of that content. The {table: fingerprint} map computed at parse time is stored
+    alongside, so loading a version never re-hashes its tables; it is only computed here
+    when the caller has none. Returns the snapshot hash, or None if there is nothing to store.
+    """
+    if schema_raw is None and parsed_schema is None:
+        return None
+    snapshot = {"raw": schema_raw, "parsed": parsed_schema}
+    snapshot_hash = hashlib.sha256(_encode(snapshot)).hexdigest() # Fingerprints derive from the content, so they are not hashed
+    if conn.execute("SELECT 1 FROM schema_snapshots WHERE hash = ?", (snapshot_hash,)).fetchone() is None:
+        schema = Schema.from_dict(parsed_schema or {})
+        snapshot["table_fingerprints"] = table_fingerprints if table_fingerprints is not None else schema.table_fingerprints()
+        encoded = _encode(snapshot)
+        conn.execute(
+            "INSERT INTO schema_snapshots (hash, schema_fingerprint, table_count, size, data) VALUES (?, ?, ?, ?, ?)",
+            (snapshot_hash, schema.fingerprint, len(schema), len(encoded), zlib.compress(encoded, 6))
+        )
+    return snapshot_hash
+
+def _get_snapshot(conn, snapshot_hash):
+    """Returns {"raw", "parsed", "table_fingerprints"} for a snapshot, or None."""
+    row = conn.execute("SELECT data FROM schema_snapshots WHERE hash = ?", (snapshot_hash,)).fetchone()
+    if row is None:
+        return None
+    snapshot = json.loads(zlib.decompress(row[0]))
+    if snapshot.get("table_fingerprints") is None: # Snapshots stored before fingerprints were kept
+        snapshot["table_fingerprints"] = Schema.from_dict(snapshot["parsed"] or {}).table_fingerprints()
+    return snapshot
+
+
+# --- Schema Migrations ---
+# Each entry upgrades the database by one version; PRAGMA user_version records how many
+# have been applied, so opening an older store upgrades it in place.
+def _migration_1_initial(conn):
+    conn.execute("""
+        CREATE TABLE runs (
+            id INTEGER PRIMARY KEY,
+            created_at TEXT NOT NULL,
+            source_file TEXT UNIQUE,
+            risk_score INTEGER,
+            risk_level TEXT,
+            total_tables_old INTEGER NOT NULL DEFAULT 0,
+            total_tables_new INTEGER NOT NULL DEFAULT 0,
+            added_table_count INTEGER NOT NULL DEFAULT 0,
+            deleted_table_count INTEGER NOT NULL DEFAULT 0,
+            modified_table_count INTEGER NOT NULL DEFAULT 0,
+            added_column_count INTEGER NOT NULL DEFAULT 0,
+            deleted_column_count INTEGER NOT NULL DEFAULT 0,
+            modified_column_count INTEGER NOT NULL DEFAULT 0,
+            renamed_column_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX idx_runs_created_at ON runs(created_at)")
+    conn.execute("""
+        CREATE TABLE blobs (
+            hash TEXT PRIMARY KEY,
+            data BLOB NOT NULL,
+            size INTEGER NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE run_payloads (
+            run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+            field TEXT NOT NULL,
+            blob_hash TEXT NOT NULL REFERENCES blobs(hash),
+            PRIMARY KEY (run_id, field)
+        )
+    """)
+
+def _migration_2_schema_snapshots(conn):
+    """Moves the per-run schema payloads into shared, content-addressed schema snapshots."""
+    conn.execute("""
+        CREATE TABLE schema_snapshots (
+            hash TEXT PRIMARY KEY,
+            schema_fingerprint TEXT NOT NULL,
+            table_count INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX idx_snapshots_fingerprint ON schema_snapshots(schema_fingerprint)")
+    conn.execute("ALTER TABLE runs ADD COLUMN old_snapshot TEXT REFERENCES schema_snapshots(hash)")
+    conn.execute("ALTER TABLE runs ADD COLUMN new_snapshot TEXT REFERENCES schema_snapshots(hash)")
+
+    legacy_fields = [field for fields in SCHEMA_FIELDS.values() for field in fields]
+    placeholders = ", ".join("?" * len(legacy_fields))
+    for (run_id,) in conn.execute("SELECT id FROM runs").fetchall():
+        payloads = {
+            field: _get_blob(conn, blob_hash)
+            for field, blob_hash in conn.execute(
+                f"SELECT field, blob_hash FROM run_payloads WHERE run_id = ? AND field IN ({placeholders})",
+                (run_id, *legacy_fields)
+            ).fetchall()
+        }
+        for side, (raw_field, parsed_field, _) in SCHEMA_FIELDS.items():
+            conn.execute(
+                f"UPDATE runs SET {side}_snapshot = ? WHERE id = ?",
+                (_put_snapshot(conn, payloads.get(raw_field), payloads.get(parsed_field)), run_id)
+            )
+    conn.execute(f"DELETE FROM run_payloads WHERE field IN ({placeholders})", legacy_fields)
+    conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT blob_hash FROM run_payloads)")
+
+def _table_change_counts(schema_diff):
+    """Yields (table_name, counts in TABLE_ROLLUP_METRICS order) for every table a diff touches."""
+    for table_name in schema_diff.get("added_tables", []):
+        yield table_name, (1, 0, 0, 0, 0, 0)
+    for table_name in schema_diff.get("deleted_tables", []):
+        yield table_name, (0, 1, 0, 0, 0, 0)
+    for table_name, table_diff in schema_diff.get("modified_tables", {}).items():
+        yield table_name, (
+            0, 0,
+            len(table_diff.get("added_columns", [])),
+            len(table_diff.get("deleted_columns", [])),
+            len(table_diff.get("modified_columns", {})),
+            len(table_diff.get("renamed_columns", {})),
+        )
+
+def _add_to_rollups(conn, day, metrics, schema_diff):
+    """Adds one run to the daily rollups (an upsert per row), in the caller's transaction."""
+    conn.execute(
+        f"INSERT INTO daily_metrics (day, run_count, {', '.join(ROLLUP_METRICS)}) "
+        f"VALUES (?, 1, {', '.join('?' * len(ROLLUP_METRICS))}) "
+        "ON CONFLICT(day) DO UPDATE SET run_count = run_count + 1, "
+        + ", ".join(f"{metric} = {metric} + excluded.{metric}" for metric in ROLLUP_METRICS),
+        (day, *(int(metrics.get(metric, 0) or 0) for metric in ROLLUP_METRICS))
+    )
+    conn.executemany(
+        f"INSERT INTO table_daily_metrics (day, table_name, run_count, {', '.join(TABLE_ROLLUP_METRICS)}) "
+        f"VALUES (?, ?, 1, {', '.join('?' * len(TABLE_ROLLUP_METRICS))}) "
+        "ON CONFLICT(day, table_name) DO UPDATE SET run_count = run_count + 1, "
+        + ", ".join(f"{metric} = {metric} + excluded.{metric}" for metric in TABLE_ROLLUP_METRICS),
+        [(day, table_name, *counts) for table_name, counts in _table_change_counts(schema_diff or {})]
+    )
+
+def _migration_3_metric_rollups(conn):
+    """Adds the daily rollup tables behind the trend views and backfills them from existing runs."""
+    conn.execute(f"""
+        CREATE TABLE daily_metrics (
+            day TEXT PRIMARY KEY,
+            run_count INTEGER NOT NULL,
+            {', '.join(f'{metric} INTEGER NOT NULL' for metric in ROLLUP_METRICS)}
+        )
+    """)
+    conn.execute(f"""
+        CREATE TABLE table_daily_metrics (
+            day TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            run_count INTEGER NOT NULL,
+            {', '.join(f'{metric} INTEGER NOT NULL' for metric in TABLE_ROLLUP_METRICS)},
+            PRIMARY KEY (day, table_name)
+        )
+    """)
+    conn.execute("CREATE INDEX idx_table_daily_metrics_table ON table_daily_metrics(table_name, day)")
+
+    for row in conn.execute(
+        f"SELECT runs.created_at, {', '.join('runs.' + metric for metric in ROLLUP_METRICS)}, run_payloads.blob_hash "
+        "FROM runs LEFT JOIN run_payloads ON run_payloads.run_id = runs.id AND run_payloads.field = 'schema_diff'"
+    ).fetchall():
+        metrics = dict(zip(ROLLUP_METRICS, row[1:-1]))
+        schema_diff = _get_blob(conn, row[-1]) if row[-1] else {}
+        _add_to_rollups(conn, row[0][:10], metrics, schema_diff)
+
+def _migration_4_drop_orphaned_blobs(conn):
+    """Deletes the blobs left behind by payload updates made before they released their previous blob."""
+    conn.execute("DELETE FROM blobs WHERE hash NOT IN (SELECT blob_hash FROM run_payloads)")
+
+MIGRATIONS = (
+    _migration_1_initial,
+    _migration_2_schema_snapshots,
+    _migration_3_metric_rollups,
+    _migration_4_drop_orphaned_blobs,
+)
+
+
+def _timestamp_to_iso(timestamp):
+    """Converts the legacy 'YYYYmmdd_HHMMSS' run timestamp to ISO 8601 (sortable, indexable)."""
+    try:
+        return datetime.strptime(timestamp, "%Y%m%d_%H%M%S").isoformat()
+    except (TypeError, ValueError):
+        return datetime.now().isoformat(timespec="seconds")
+
+
+class HistoryStore:
+    """
+    Embedded, indexed store for historical drift analyses, backed by one SQLite file.
+
+    Run metadata and summary metrics are plain columns (fast listing, filtering and
+    pagination). Large payloads (diff, report) are stored once per distinct content:
+    JSON-encoded, zlib-compressed and keyed by their SHA-256. Each schema version (raw and
+    parsed) is a shared snapshot that runs reference by hash for their old and new side.
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._migrate(conn)
+            self._conn = conn
+        return self._conn
+
+    def _migrate(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target_version in range(version + 1, len(MIGRATIONS) + 1):
+            with conn: # One transaction per migration step
+                MIGRATIONS[target_version - 1](conn)
+                conn.execute(f"PRAGMA user_version = {target_version}")
+
+    # --- Writing ---
+    def _insert_run(self, conn, record, source_file=None):
+        metrics = record.get("summary_metrics", {}) or {}
+        risk = record.get("risk_score", {}) or {}
+        created_at = _timestamp_to_iso(record.get("timestamp"))
+        cursor = conn.execute(
+            f"INSERT INTO runs (created_at, source_file, risk_score, risk_level, {', '.join(METRIC_COLUMNS)}) "
+            f"VALUES (?, ?, ?, ?, {', '.join('?' * len(METRIC_COLUMNS))})",
+            (created_at, source_file, risk.get("score"), risk.get("level"),
+             *(int(metrics.get(column, 0) or 0) for column in METRIC_COLUMNS))
+        )
+        # Trend rollups are updated in the same transaction, so they never drift from the runs
+        _add_to_rollups(conn, created_at[:10], metrics, record.get("schema_diff"))
+        run_id = cursor.lastrowid
+        for side, (raw_field, parsed_field, fingerprints_field) in SCHEMA_FIELDS.items():
+            conn.execute(
+                f"UPDATE runs SET {side}_snapshot = ? WHERE id = ?",
+                (_put_snapshot(conn, record.get(raw_field), record.get(parsed_field), record.get(fingerprints_field)), run_id)
+            )
+        for field in PAYLOAD_FIELDS:
+            if field in record:
+                conn.execute(
+                    "INSERT INTO run_payloads (run_id, field, blob_hash) VALUES (?, ?, ?)",
+                    (run_id, field, _put_blob(conn, record[field]))
+                )
+        return run_id
+
+    def save_run(self, record):
+        """
+        Saves one analysis. `record` has the legacy history-file shape: timestamp, summary_metrics,
+        the PAYLOAD_FIELDS and the SCHEMA_FIELDS of both sides. Returns the new run id.
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                return self._insert_run(conn, record)
+
+    def update_run_payload(self, run_id, field, value):
+        """
+        Replaces one payload field of a saved run, e.g. the AI report once it has been generated.
+        The previous blob is deleted in the same transaction unless another payload still uses it.
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                previous = conn.execute(
+                    "SELECT blob_hash FROM run_payloads WHERE run_id = ? AND field = ?", (run_id, field)
+                ).fetchone()
+                blob_hash = _put_blob(conn, value)
+                conn.execute(
+                    "INSERT OR REPLACE INTO run_payloads (run_id, field, blob_hash) VALUES (?, ?, ?)",
+                    (run_id, field, blob_hash)
+                )
+                if previous is not None and previous[0] != blob_hash:
+                    _release_blob(conn, previous[0])
+
+    def import_legacy_json(self, directory=HISTORY_DIR):
+        """
+        Migrates the per-run JSON files written by older versions into the store.
+        Idempotent: files already imported (by name) are skipped. The files are left in place.
+        Returns the number of runs imported.
+        """
+        if not os.path.isdir(directory):
+            return 0
+        imported = 0
+        with self._lock:
+            conn = self._connect()
+            known_files = {row[0] for row in conn.execute("SELECT source_file FROM runs WHERE source_file IS NOT NULL")}
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(".json") or filename in known_files:
+                    continue
+                try:
+                    with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                        record = json.load(f)
+                    with conn:
+                        self._insert_run(conn, record, source_file=filename)
+                    imported += 1
+                except Exception as e:
+                    print(f"Skipping unreadable history file {filename}: {e}") # For debugging purposes
+        return imported
+
+    # --- Reading ---
+    def count_runs(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def list_runs(self, limit=HISTORY_PAGE_SIZE, offset=0):
+        """Returns one page of run summaries (id, created_at, risk and metric columns), newest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT id, created_at, risk_score, risk_level, {', '.join(METRIC_COLUMNS)} "
+                "FROM runs ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def load_run(self, run_id, fields=PAYLOAD_FIELDS, include_schemas=True):
+        """
+        Returns a run in the legacy history-file shape, loading only the requested payload
+        fields, plus both schema snapshots unless `include_schemas` is False.
+        Returns None if the run does not exist.
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if row is None:
+                return None
+            record = {
+                "run_id": row["id"],
+                "timestamp": datetime.fromisoformat(row["created_at"]).strftime("%Y%m%d_%H%M%S"),
+                "summary_metrics": {column: row[column] for column in METRIC_COLUMNS},
+                "old_snapshot": row["old_snapshot"],
+                "new_snapshot": row["new_snapshot"],
+            }
+            for payload in conn.execute(
+                f"SELECT field, blob_hash FROM run_payloads WHERE run_id = ? AND field IN ({', '.join('?' * len(fields))})",
+                (run_id, *fields)
+            ).fetchall():
+                record[payload["field"]] = _get_blob(conn, payload["blob_hash"])
+            if include_schemas:
+                for side, (raw_field, parsed_field, fingerprints_field) in SCHEMA_FIELDS.items():
+                    snapshot = _get_snapshot(conn, row[f"{side}_snapshot"]) if row[f"{side}_snapshot"] else None
+                    if snapshot is not None:
+                        record[raw_field] = snapshot["raw"]
+                        record[parsed_field] = snapshot["parsed"]
+                        record[fingerprints_field] = snapshot["table_fingerprints"]
+        return record
+
+    # --- Trends ---
+    def metrics_timeseries(self, granularity="day", start_day=None, end_day=None):
+        """
+        Returns overall change counts per period ('day', 'week' or 'month'), oldest first:
+        [{period, run_count, <ROLLUP_METRICS>...}]. Reads the daily rollups, never the runs.
+        """
+        bucket = TREND_GRANULARITIES[granularity]
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {bucket} AS period, SUM(run_count) AS run_count, "
+                + ", ".join(f"SUM({metric}) AS {metric}" for metric in ROLLUP_METRICS)
+                + " FROM daily_metrics WHERE day >= ? AND day <= ? GROUP BY period ORDER BY period",
+                (start_day or "0000-00-00", end_day or "9999-99-99")
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def table_timeseries(self, table_name, granularity="day", start_day=None, end_day=None):
+        """Returns one table's change counts per period, oldest first: [{period, run_count, <TABLE_ROLLUP_METRICS>...}]."""
+        bucket = TREND_GRANULARITIES[granularity]
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT {bucket} AS period, SUM(run_count) AS run_count, "
+                + ", ".join(f"SUM({metric}) AS {metric}" for metric in TABLE_ROLLUP_METRICS)
+                + " FROM table_daily_metrics WHERE table_name = ? AND day >= ? AND day <= ?"
+                " GROUP BY period ORDER BY period",
+                (table_name, start_day or "0000-00-00", end_day or "9999-99-99")
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def most_changed_tables(self, limit=50):
+        """Returns [(table_name, total column/table changes)] for the tables that changed most, most first."""
+        with self._lock:
+            return [tuple(row) for row in self._connect().execute(
+                "SELECT table_name, SUM(" + " + ".join(TABLE_ROLLUP_METRICS) + ") AS changes "
+                "FROM table_daily_metrics GROUP BY table_name ORDER BY changes DESC, table_name LIMIT ?",
+                (limit,)
+            ).fetchall()]
+
+    def load_snapshot(self, snapshot_hash):
+        """Returns one schema snapshot ({raw, parsed, table_fingerprints}) by hash, or None."""
+        with self._lock:
+            return _get_snapshot(self._connect(), snapshot_hash)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_history_store():
+    """Returns the process-wide HistoryStore, importing legacy JSON history files on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                store = HistoryStore()
+                try:
+                    store.import_legacy_json(HISTORY_DIR)
+                except Exception as e:
+                    print(f"Legacy history import failed: {e}") # For debugging purposes
+                _store = store
+    return _store
@@ -0,0 +1,138 @@
+# lineage.py
+from schema_utils import get_schema_diff
+from schema_model import Schema, as_schema
+
+
+class SchemaLineage:
+    """
+    Column-level lineage across an ordered series of schema versions (v1 -> v2 -> ... -> vN).
+
+    Versions are appended one at a time: adding version N+1 costs one diff (N -> N+1, through
+    the memoized get_schema_diff) and an index update proportional to that diff, never a
+    re-scan of earlier versions. Each column gets a lineage id when it first appears; renames
+    (from the diff's renamed_columns) keep the id, so a column's history follows its rename
+    chain. Queries by any name the column has ever had are dictionary lookups.
+    """
+
+    def __init__(self):
+        self.labels = [] # Version labels, in order
+        self.diffs = [] # diffs[i] is the diff from version i to version i + 1
+        self._last_schema = Schema()
+        self._current = {} # {(table, column): lineage_id} for columns of the latest version
+        self._events = [] # [lineage_id] -> [event, ...] in version order
+        self._names = {} # {(table, column): [lineage_id, ...]} for every name a lineage has had
+
+    def __len__(self):
+        return len(self.labels)
+
+    # --- Building ---
+    def _new_lineage(self, table_name, col_name):
+        lineage_id = len(self._events)
+        self._events.append([])
+        self._current[(table_name, col_name)] = lineage_id
+        self._names.setdefault((table_name, col_name), []).append(lineage_id)
+        return lineage_id
+
+    def _record(self, lineage_id, version_index, event, table_name, col_name, **details):
+        self._events[lineage_id].append({
+            "version": self.labels[version_index],
+            "version_index": version_index,
+            "event": event,
+            "table": table_name,
+            "column": col_name,
+            **details,
+        })
+
+    def _add_columns(self, version_index, table_name, table, col_names, event):
+        for col_name in col_names:
+            lineage_id = self._new_lineage(table_name, col_name)
+            self._record(lineage_id, version_index, event, table_name, col_name, type=table[col_name].type)
+
+    def add_version(self, label, schema):
+        """Appends the next schema version and updates the lineage index with its diff from the previous one."""
+        schema = as_schema(schema)
+        self.labels.append(label)
+        version_index = len(self.labels) - 1
+
+        if version_index == 0:
+            for table_name, table in schema.items():
+                self._add_columns(version_index, table_name, table, list(table), "introduced")
+            self._last_schema = schema
+            return None
+
+        schema_diff = get_schema_diff(self._last_schema, schema)
+        self.diffs.append(schema_diff)
+
+        for table_name in schema_diff["added_tables"]:
+            table = schema[table_name]
+            self._add_columns(version_index, table_name, table, list(table), "added_with_table")
+
+        for table_name in schema_diff["deleted_tables"]:
+            for col_name in self._last_schema[table_name]:
+                lineage_id = self._current.pop((table_name, col_name), None)
+                if lineage_id is not None:
+                    self._record(lineage_id, version_index, "deleted_with_table", table_name, col_name)
+
+        for table_name, table_diff in schema_diff["modified_tables"].items():
+            table = schema[table_name]
+            for col_name in table_diff["deleted_columns"]:
+                lineage_id = self._current.pop((table_name, col_name), None)
+                if lineage_id is not None:
+                    self._record(lineage_id, version_index, "deleted", table_name, col_name)
+
+            for old_name, rename_info in table_diff["renamed_columns"].items():
+                lineage_id = self._current.pop((table_name, old_name), None)
+                if lineage_id is None:
+                    continue
+                new_name = rename_info["new_name"]
+                self._current[(table_name, new_name)] = lineage_id
+                self._names.setdefault((table_name, new_name), []).append(lineage_id)
+                self._record(lineage_id, version_index, "renamed", table_name, new_name,
+                             old_name=old_name, old_type=rename_info["old_type"], new_type=rename_info["new_type"])
+
+            self._add_columns(version_index, table_name, table, table_diff["added_columns"], "added")
+
+            for col_name, modified_props in table_diff["modified_columns"].items():
+                lineage_id = self._current.get((table_name, col_name))
+                if lineage_id is None:
+                    continue
+                for prop, values in modified_props.items():
+                    self._record(lineage_id, version_index, f"{prop}_changed", table_name, col_name,
+                                 old_value=values["old_value"], new_value=values["new_value"])
+
+        self._last_schema = schema
+        return schema_diff
+
+    # --- Queries ---
+    def column_history(self, table_name, col_name=None):
+        """
+        Returns the history of a column, by any name it has ever had (old or new side of a
+        rename), as a list of lineages: [{"current_name", "events": [...]}]. Several lineages
+        are returned when a name was reused after the original column was dropped.
+        Accepts ("users", "email") or the single string "users.email".
+        """
+        if col_name is None:
+            table_name, _, col_name = table_name.partition(".")
+        key = (table_name.strip().lower(), col_name.strip().lower())
+        histories = []
+        for lineage_id in self._names.get(key, []):
+            events = self._events[lineage_id]
+            last_event = events[-1]
+            is_live = not last_event["event"].startswith("deleted")
+            histories.append({
+                "current_name": f"{last_event['table']}.{last_event['column']}" if is_live else None,
+                "events": list(events),
+            })
+        return histories
+
+    def known_columns(self):
+        """Returns every 'table.column' name ever seen, sorted (for pickers and autocompletion)."""
+        return sorted(f"{table_name}.{col_name}" for table_name, col_name in self._names)
+
+    def changed_columns(self):
+        """Returns the lineages with more than their introduction event: [(current or last name, event count)], most changed first."""
+        changed = []
+        for events in self._events:
+            if len(events) > 1:
+                changed.append((f"{events[-1]['table']}.{events[-1]['column']}", len(events)))
+        return sorted(changed, key=lambda item: (-item[1], item[0]))
@@ -1,9 +1,9 @@
 # main.py
 import streamlit as st
-import json # Only for initial session state defaults
 from styling import apply_custom_css
-from features import render_input_section, generate_drift_report
+from features import render_input_section
 from additional_features import render_output_section
+from schema_model import Schema
 
 # --- Streamlit UI Configuration ---
 st.set_page_config(
@@ -71,11 +71,23 @@ CREATE TABLE Orders (
 if 'schema_diff_report' not in st.session_state:
     st.session_state.schema_diff_report = "" # Stores the AI-generated diff report
 if 'parsed_old_schema' not in st.session_state:
-    st.session_state.parsed_old_schema = {} # Stores the parsed old schema dict
+    st.session_state.parsed_old_schema = Schema() # Stores the parsed old schema
 if 'parsed_new_schema' not in st.session_state:
-    st.session_state.parsed_new_schema = {} # Stores the parsed new schema dict
+    st.session_state.parsed_new_schema = Schema() # Stores the parsed new schema
+if 'schema_diff_details' not in st.session_state:
+    st.session_state.schema_diff_details = {} # Stores the diff computed once per analysis
 if 'diff_summary_metrics' not in st.session_state:
     st.session_state.diff_summary_metrics = {} # Stores summary counts for metrics
+if 'rule_risk_score' not in st.session_state:
+    st.session_state.rule_risk_score = {} # Stores the rule-based risk score for the current analysis
+if 'risk_score_output' not in st.session_state:
+    st.session_state.risk_score_output = "" # Stores the optional AI risk narrative
+if 'test_suggestions_output' not in st.session_state:
+    st.session_state.test_suggestions_output = "" # Stores the AI regression test suggestions
+if 'pending_ai_analysis' not in st.session_state:
+    st.session_state.pending_ai_analysis = None # Prompts queued by the compare button, run by the output section
+if 'speculative_analyzer' not in st.session_state:
+    st.session_state.speculative_analyzer = None # Background parse/diff of the text areas, created on first edit
 
 
 # --- Main Application Flow ---
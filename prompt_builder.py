@@ -0,0 +1,329 @@
+# prompt_builder.py
+from schema_model import as_schema
+from risk_rules import score_schema_diff, format_risk_score_markdown
+
+# --- Prompt Size Budget ---
+# Diff/context text per prompt, in characters (roughly 4 characters per token).
+# Larger diffs are split into per-table prompts that run concurrently and are stitched together.
+PROMPT_CHAR_BUDGET = 40000
+
+# Explains the compact encoding to the model; sent once at the top of every diff section
+DIFF_ENCODING_LEGEND = (
+    "Encoding: `+` added, `-` deleted, `~` modified, `>` renamed. "
+    "Columns are written as `name type` followed by flags: PK primary key, NN not null, UQ unique."
+)
+
+
+# --- Compact Diff Encoding ---
+def format_column(column):
+    """Formats a Column as `name type [PK|NN] [UQ]` (PK implies NOT NULL, so NN is omitted for keys)."""
+    flags = []
+    if column.primary_key:
+        flags.append("PK")
+    elif not column.nullable:
+        flags.append("NN")
+    if column.unique:
+        flags.append("UQ")
+    return " ".join([column.name, column.type] + flags)
+
+def format_table(table):
+    """Formats a whole table definition on one line: `name(col type flags, ...)`."""
+    return f"{table.name}(" + ", ".join(format_column(column) for column in table.columns.values()) + ")"
+
+def _format_column_ref(schema, table_name, col_name):
+    """Formats a column from a schema, falling back to the bare name if it is not there."""
+    table = schema.get(table_name)
+    column = table.get(col_name) if table is not None else None
+    return format_column(column) if column is not None else col_name
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+def touched_tables(schema_diff):
+    """Returns the names of every table the diff adds, deletes or modifies, in diff order."""
+    return (
+        list(schema_diff.get("deleted_tables", []))
+        + list(schema_diff.get("modified_tables", {}))
+        + list(schema_diff.get("added_tables", []))
+    )
+
+def iter_table_diff_blocks(schema_diff, old_schema=None, new_schema=None):
+    """
+    Yields (table_name, text) with one compact, line-oriented block per changed table.
+    Deleted tables come first, then modified, then added ones (roughly decreasing risk).
+    With the parsed schemas, added/deleted tables and columns carry their types and flags.
+    """
+    old_schema = as_schema(old_schema)
+    new_schema = as_schema(new_schema)
+
+    for table_name in schema_diff.get("deleted_tables", []):
+        table = old_schema.get(table_name)
+        yield table_name, f"- table {format_table(table) if table is not None else table_name}"
+
+    for table_name, table_diff in schema_diff.get("modified_tables", {}).items():
+        lines = [f"~ table {table_name}"]
+        for col_name in table_diff.get("added_columns", []):
+            lines.append(f"  + {_format_column_ref(new_schema, table_name, col_name)}")
+        for col_name in table_diff.get("deleted_columns", []):
+            lines.append(f"  - {_format_column_ref(old_schema, table_name, col_name)}")
+        for col_name, modified_props in table_diff.get("modified_columns", {}).items():
+            changes = "; ".join(
+                f"{prop} {_format_value(values['old_value'])} -> {_format_value(values['new_value'])}"
+                for prop, values in modified_props.items()
+            )
+            lines.append(f"  ~ {col_name}: {changes}")
+        for old_name, rename_info in table_diff.get("renamed_columns", {}).items():
+            type_note = rename_info["old_type"]
+            if rename_info["new_type"] != rename_info["old_type"]:
+                type_note = f"{rename_info['old_type']} -> {rename_info['new_type']}"
+            lines.append(f"  > {old_name} -> {rename_info['new_name']} ({type_note})")
+        yield table_name, "\n".join(lines)
+
+    for table_name in schema_diff.get("added_tables", []):
+        table = new_schema.get(table_name)
+        yield table_name, f"+ table {format_table(table) if table is not None else table_name}"
+
+def summarize_diff_counts(schema_diff):
+    """One-line totals of the diff, so a prompt that only sees part of the diff still knows its scope."""
+    modified_tables = schema_diff.get("modified_tables", {}).values()
+    return (
+        f"Totals: {len(schema_diff.get('added_tables', []))} tables added, "
+        f"{len(schema_diff.get('deleted_tables', []))} deleted, "
+        f"{len(schema_diff.get('modified_tables', {}))} modified; "
+        f"{sum(len(td.get('added_columns', [])) for td in modified_tables)} columns added, "
+        f"{sum(len(td.get('deleted_columns', [])) for td in modified_tables)} deleted, "
+        f"{sum(len(td.get('modified_columns', {})) for td in modified_tables)} modified, "
+        f"{sum(len(td.get('renamed_columns', {})) for td in modified_tables)} renamed."
+    )
+
+def encode_diff_compact(schema_diff, old_schema=None, new_schema=None):
+    """Encodes the whole diff in the compact format (a fraction of the size of indented JSON)."""
+    blocks = [text for _, text in iter_table_diff_blocks(schema_diff, old_schema, new_schema)]
+    return "\n".join(blocks) if blocks else "(no changes)"
+
+def encode_table_context(schema, table_names):
+    """Compact definitions of only the given tables that exist in `schema`."""
+    schema = as_schema(schema)
+    lines = [format_table(schema[name]) for name in table_names if name in schema]
+    return "\n".join(lines) if lines else "(none)"
+
+def chunk_blocks(blocks, budget=PROMPT_CHAR_BUDGET):
+    """
+    Groups text blocks, in order, into chunks of at most `budget` characters.
+    A block larger than the budget on its own becomes a chunk by itself.
+    """
+    chunks, current, size = [], [], 0
+    for block in blocks:
+        if current and size + len(block) > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(block)
+        size += len(block) + 1
+    if current:
+        chunks.append(current)
+    return chunks
+
+PENDING_PARTS_NOTE = "_⏳ Generating the remaining sections..._"
+
+def stitch_responses(parts, pending_note=PENDING_PARTS_NOTE):
+    """Joins the responses of a split prompt in order; parts still running (None) show `pending_note` once, if given."""
+    finished = [part for part in parts if part is not None]
+    if len(finished) < len(parts) and pending_note:
+        finished.append(pending_note)
+    return "\n\n".join(finished)
+
+
+# --- Drift Report Prompts ---
+_REPORT_TABLE_SECTIONS = """
+    For each table affected by schema drift, create a dedicated section:
+    ### 📁 Table: [Table Name]
+    ---
+    Within each table section, use these sub-sections:
+
+    #### **➕ Columns Added**
+    * List each added column.
+    * For each: `Column Name: \\`[name]\\` (Type: \\`[type]\\`)`
+    * Add a brief note on its purpose or what it might contain (e.g., "This new column will capture ...").
+
+    #### **❌ Columns Deleted**
+    * List each deleted column.
+    * For each: `Column Name: \\`[name]\\` (Type: \\`[type]\\`)`
+    * Add a note on potential data loss or breaking changes (e.g., "Deletion of this column will lead to data loss for ... and might break ...").
+
+    #### **✏️ Columns Modified**
+    * List each modified column.
+    * For each modified column:
+        * `Column Name: \\`[name]\\``
+        * `Old Type: \\`[old_type_details]\\``
+        * `New Type: \\`[new_type_details]\\``
+        * **Impact 🔥:** Explain the specific impact of this modification (e.g., "Data type change from X to Y might break ETL jobs expecting the old format and require data migration.").
+        * **Remediation 🛠️:** Suggest specific actions to resolve the impact (e.g., "Update ETL scripts, perform data backfill/migration, review downstream application logic, and conduct thorough regression testing.").
+
+    #### **🔁 Renamed Columns**
+    * If the diff includes renamed (`>`) columns for this table, list them here explicitly.
+    * For each renamed column: `\\`[Old Name]\\` ➡️ \\`[New Name]\\`` (Old Type: \\`[old_type]\\` -> New Type: \\`[new_type]\\`)
+    * Add a note on the impact of the rename (e.g., "Renaming requires updating all queries and applications referencing the old name.").
+    * If no renames are detected for a table by the diff, explicitly state: `No inferred renames detected for this table.`
+"""
+
+_REPORT_GOVERNANCE_SECTION = """
+    ### **✅ General Best Practices & Proactive Schema Governance Tips**
+    * Provide bullet points on best practices for managing schema evolution (e.g., version control, backward compatibility, communication with stakeholders).
+    * Suggest proactive measures to minimize schema drift impact (e.g., using views, robust ETL error handling).
+"""
+
+_REPORT_PREAMBLE = """
+    You are an expert data architect tasked with analyzing schema drift.
+    I am providing you with a structured comparison between an OLD database schema and a NEW version.
+"""
+
+def build_drift_report_prompts(schema_diff, old_schema=None, new_schema=None, budget=PROMPT_CHAR_BUDGET):
+    """
+    Returns the prompt(s) for the detailed drift report, in the order their answers are stitched.
+    A diff within `budget` gives a single prompt for the whole report. A larger one gives an
+    overview prompt (executive summary from the totals and table list), one prompt per chunk of
+    tables (their sections only), and a closing governance prompt.
+    """
+    blocks = [text for _, text in iter_table_diff_blocks(schema_diff, old_schema, new_schema)]
+    counts = summarize_diff_counts(schema_diff)
+
+    if sum(len(block) + 1 for block in blocks) <= budget:
+        return [f"""{_REPORT_PREAMBLE}
+    Your task is to generate a comprehensive, human-readable report detailing the schema changes.
+    For each significant change, explain its potential impact on existing data pipelines, reports, and applications.
+    Suggest practical remediation steps or considerations for data engineers.
+
+    The schema comparison is as follows. {DIFF_ENCODING_LEGEND}
+    {counts}
+    ```
+{encode_diff_compact(schema_diff, old_schema, new_schema)}
+    ```
+
+    Please format your response using **Markdown** with the following highly structured and clear sections, making it easy for new team members to understand:
+
+    1.  **Overall Executive Summary:** A high-level overview of the most critical changes. Highlight the total number of tables added, deleted, or modified, and columns added, deleted, or modified.
+{_REPORT_TABLE_SECTIONS}
+    ---
+    Finally, conclude the report with:
+{_REPORT_GOVERNANCE_SECTION}
+    Ensure all explanations are clear, concise, and actionable for a data engineering team.
+    """]
+
+    table_list = ", ".join(touched_tables(schema_diff))
+    if len(table_list) > budget:
+        table_list = table_list[:budget] + ", ..."
+    prompts = [f"""{_REPORT_PREAMBLE}
+    The change set is large, so the per-table sections are written separately. Write ONLY the opening section:
+
+    ## **Overall Executive Summary**
+    A high-level overview of the most critical changes, based on these totals and affected tables.
+    {counts}
+    Affected tables: {table_list}
+
+    Use **Markdown**. Do not write per-table sections or closing remarks.
+    """]
+    for chunk in chunk_blocks(blocks, budget):
+        chunk_text = "\n".join(chunk)
+        prompts.append(f"""{_REPORT_PREAMBLE}
+    This is one part of a large change set; other tables are covered separately. {counts}
+    Write ONLY the per-table sections for the tables below (no executive summary, no closing remarks).
+    For each significant change, explain its impact on data pipelines, reports and applications, and suggest remediation.
+
+    {DIFF_ENCODING_LEGEND}
+    ```
+{chunk_text}
+    ```
+
+    Use **Markdown**.
+{_REPORT_TABLE_SECTIONS}""")
+    prompts.append(f"""{_REPORT_PREAMBLE}
+    {counts}
+    Write ONLY the closing section of the drift report, in **Markdown**:
+{_REPORT_GOVERNANCE_SECTION}""")
+    return prompts
+
+
+# --- Risk Narrative Prompt ---
+def build_risk_score_prompt(schema_diff, old_schema=None, new_schema=None, rule_risk=None, budget=PROMPT_CHAR_BUDGET):
+    """
+    Builds the prompt asking for a narrative on top of the rule-based risk score
+    (risk_rules.score_schema_diff, computed here if `rule_risk` is not given). The narrative
+    needs the whole picture, so this is never split: table blocks are included
+    most-risky-first up to `budget`, and the totals always cover the full diff.
+    """
+    if rule_risk is None:
+        rule_risk = score_schema_diff(schema_diff)
+    included, size, omitted = [], 0, 0
+    for _, block in iter_table_diff_blocks(schema_diff, old_schema, new_schema):
+        if included and size + len(block) > budget:
+            omitted += 1
+            continue
+        included.append(block)
+        size += len(block) + 1
+    diff_text = "\n".join(included) if included else "(no changes)"
+    if omitted:
+        diff_text += f"\n... {omitted} more changed tables omitted for brevity (the totals above include them)"
+
+    return f"""
+    A deterministic rule engine has scored the risk (from 1 to 10, where 1 is minimal risk and 10 is very high risk) that the following schema changes pose to existing data pipelines (ETLs), dashboards, and applications:
+
+{format_risk_score_markdown(rule_risk)}
+
+    Do not re-score the changes. Write a concise narrative that explains this score to a data engineering team:
+    which changes drive it, what is likely to break downstream, and anything the rules may under- or over-weight
+    (e.g. semantic meaning of renamed columns, foreign key impact, the overall volume and complexity of changes).
+
+    Schema Difference Report. {DIFF_ENCODING_LEGEND}
+    {summarize_diff_counts(schema_diff)}
+    ```
+{diff_text}
+    ```
+
+    Format your response as follows:
+    **Explanation:** [Concise narrative highlighting the key risk factors and what to watch for.]
+    """
+
+
+# --- Regression Test Prompts ---
+def build_regression_test_prompts(schema_diff, old_schema, new_schema, budget=PROMPT_CHAR_BUDGET):
+    """
+    Returns the prompt(s) for regression test suggestions. Only the tables the diff touches
+    are sent as context (old and new definitions); large diffs are split per chunk of tables.
+    """
+    old_schema = as_schema(old_schema)
+    new_schema = as_schema(new_schema)
+    blocks = []
+    for table_name, diff_text in iter_table_diff_blocks(schema_diff, old_schema, new_schema):
+        blocks.append(
+            f"{diff_text}\n"
+            f"  old: {encode_table_context(old_schema, [table_name])}\n"
+            f"  new: {encode_table_context(new_schema, [table_name])}"
+        )
+    chunks = chunk_blocks(blocks, budget) or [["(no changes)"]]
+    split_note = "" if len(chunks) == 1 else (
+        "\n    This is one part of a large change set; suggest tests for the tables below only, under per-table headings.\n"
+    )
+
+    return [f"""
+    Based on the following schema difference report, provide specific suggestions for regression tests that should be performed after these database schema changes are implemented.
+{split_note}
+    Focus on different areas:
+    - **Data Integrity Tests:** (e.g., ensure no data loss, referential integrity)
+    - **ETL/ELT Pipeline Tests:** (e.g., ensuring data flows correctly, transformations work)
+    - **Reporting/Dashboard Tests:** (e.g., data accuracy, dashboard rendering)
+    - **Application Tests:** (e.g., API integrations, user-facing features)
+    - **Performance Tests:** (e.g., query performance, load times)
+
+    Consider the detailed changes (added, deleted, modified, renamed tables/columns) to provide tailored suggestions.
+
+    Schema Difference Report with the old and new definitions of each changed table ("(none)" if it does not exist on that side).
+    {DIFF_ENCODING_LEGEND}
+    {summarize_diff_counts(schema_diff)}
+    ```
+{chr(10).join(chunk)}
+    ```
+
+    Format your response using **Markdown** with clear headings and bullet points for each test category.
+    """ for chunk in chunks]
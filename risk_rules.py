@@ -0,0 +1,196 @@
+# risk_rules.py
+import re
+import math
+from functools import lru_cache
+from schema_utils import type_family
+
+# --- Rule Weights ---
+# Points each kind of change contributes to the raw risk total.
+RISK_WEIGHTS = {
+    "deleted_table": 10,
+    "deleted_column": 4,
+    "incompatible_type": 6, # Type family changed (e.g. varchar -> int)
+    "narrowing_type": 5, # Same family, smaller range/length/precision (e.g. varchar(120) -> varchar(50))
+    "converted_to_string": 2, # Any type -> string: values survive, consumers expecting the old type break
+    "widening_type": 1,
+    "nullable_to_not_null": 3, # Existing NULLs make the migration fail
+    "not_null_to_nullable": 1, # Consumers may receive unexpected NULLs
+    "primary_key_changed": 4,
+    "unique_added": 2,
+    "unique_removed": 1,
+    "renamed_column": 2,
+    "renamed_column_type_changed": 2, # Extra points when a renamed column also changed type
+}
+
+# Minimum 1-10 score once a rule has fired at all: some changes are serious on their own
+RISK_FLOORS = {
+    "deleted_table": 7,
+    "incompatible_type": 6,
+    "deleted_column": 5,
+    "narrowing_type": 5,
+    "primary_key_changed": 5,
+}
+
+# Raw points at which the score reaches ~6.7/10; the curve saturates towards 10
+RISK_POINTS_SCALE = 20
+
+# (max score, level) in ascending order
+RISK_LEVELS = ((3, "Low"), (6, "Medium"), (8, "High"), (10, "Critical"))
+
+
+# --- Type Change Classification ---
+_TYPE_PARAMS_RE = re.compile(r"\(\s*(\d+)(?:\s*,\s*(\d+))?\s*\)")
+
+# Byte width per integer/float type keyword, checked in order ('bigint' before 'int')
+_INTEGER_WIDTHS = (
+    ("tinyint", 1), ("smallint", 2), ("int2", 2), ("smallserial", 2), ("mediumint", 3),
+    ("bigint", 8), ("int8", 8), ("bigserial", 8), ("int", 4), ("serial", 4),
+)
+_FLOAT_WIDTHS = (("double", 8), ("float8", 8), ("real", 4), ("float4", 4), ("float", 8))
+
+def _keyword_width(col_type, widths):
+    for needle, width in widths:
+        if needle in col_type:
+            return width
+    return None
+
+def _type_params(col_type):
+    """Returns (precision/length, scale) from e.g. 'decimal(10, 2)' or 'varchar(50)'; missing values are None."""
+    match = _TYPE_PARAMS_RE.search(col_type)
+    if not match:
+        return None, None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else 0
+
+def _compare_within_family(family, old_type, new_type):
+    """Returns 'widening', 'narrowing' or 'unchanged' for two types of the same family."""
+    if family == "integer":
+        old_width, new_width = _keyword_width(old_type, _INTEGER_WIDTHS), _keyword_width(new_type, _INTEGER_WIDTHS)
+    elif family == "float":
+        old_width, new_width = _keyword_width(old_type, _FLOAT_WIDTHS), _keyword_width(new_type, _FLOAT_WIDTHS)
+    elif family == "string":
+        # An unbounded string type (text, varchar without length) is wider than any bounded one
+        old_width = _type_params(old_type)[0] or math.inf
+        new_width = _type_params(new_type)[0] or math.inf
+    elif family == "decimal":
+        (old_precision, old_scale), (new_precision, new_scale) = _type_params(old_type), _type_params(new_type)
+        if old_precision is None or new_precision is None:
+            return "unchanged" if old_precision == new_precision else ("narrowing" if new_precision else "widening")
+        # Both the integer digits and the fractional digits must fit
+        if new_precision - new_scale < old_precision - old_scale or new_scale < old_scale:
+            return "narrowing"
+        return "widening" if (new_precision, new_scale) != (old_precision, old_scale) else "unchanged"
+    elif family == "temporal":
+        # A date cannot hold the time of day a timestamp/datetime had
+        old_width = 2 if ("timestamp" in old_type or "datetime" in old_type) else 1
+        new_width = 2 if ("timestamp" in new_type or "datetime" in new_type) else 1
+    else:
+        return "unchanged"
+
+    if old_width is None or new_width is None or old_width == new_width:
+        return "unchanged"
+    return "narrowing" if new_width < old_width else "widening"
+
+@lru_cache(maxsize=4096)
+def classify_type_change(old_type, new_type):
+    """
+    Classifies a column type change as 'unchanged', 'widening', 'narrowing',
+    'converted_to_string' or 'incompatible'. Cached: warehouses repeat the same few type pairs.
+    """
+    old_type, new_type = (old_type or "").lower(), (new_type or "").lower()
+    if old_type == new_type:
+        return "unchanged"
+    if old_type.endswith("]") != new_type.endswith("]"):
+        return "incompatible" # Scalar <-> array
+    old_family, new_family = type_family(old_type), type_family(new_type)
+    if old_family != new_family:
+        return "converted_to_string" if new_family == "string" else "incompatible"
+    return _compare_within_family(old_family, old_type, new_type)
+
+
+# --- Scoring ---
+def _factor(rule, table, column=None, detail=""):
+    return {"rule": rule, "table": table, "column": column, "points": RISK_WEIGHTS[rule], "detail": detail}
+
+def iter_risk_factors(schema_diff):
+    """Yields one factor dict {rule, table, column, points, detail} per risky change in a compare_schemas() result."""
+    for table_name in schema_diff.get("deleted_tables", []):
+        yield _factor("deleted_table", table_name, detail="Table dropped; all its data and dependents are lost")
+
+    for table_name, table_diff in schema_diff.get("modified_tables", {}).items():
+        for col_name in table_diff.get("deleted_columns", []):
+            yield _factor("deleted_column", table_name, col_name, "Column dropped")
+
+        for col_name, modified_props in table_diff.get("modified_columns", {}).items():
+            type_change = modified_props.get("type")
+            if type_change:
+                change_kind = classify_type_change(type_change["old_value"], type_change["new_value"])
+                if change_kind != "unchanged":
+                    rule = change_kind if change_kind == "converted_to_string" else f"{change_kind}_type"
+                    yield _factor(rule, table_name, col_name, f"{type_change['old_value']} -> {type_change['new_value']}")
+            pk_change = modified_props.get("primary_key")
+            pk_added = bool(pk_change and pk_change["new_value"])
+            nullable_change = modified_props.get("nullable")
+            # Adding a column to the primary key makes it NOT NULL; that is one change, scored once as the key change
+            if nullable_change and not (pk_added and nullable_change["old_value"]):
+                rule = "nullable_to_not_null" if nullable_change["old_value"] else "not_null_to_nullable"
+                yield _factor(rule, table_name, col_name, "NULL -> NOT NULL" if nullable_change["old_value"] else "NOT NULL -> NULL")
+            if pk_change:
+                yield _factor("primary_key_changed", table_name, col_name,
+                              "Added to primary key (now NOT NULL)" if pk_added and nullable_change else
+                              "Added to primary key" if pk_added else "Removed from primary key")
+            unique_change = modified_props.get("unique")
+            if unique_change:
+                rule = "unique_added" if unique_change["new_value"] else "unique_removed"
+                yield _factor(rule, table_name, col_name, "UNIQUE added" if unique_change["new_value"] else "UNIQUE removed")
+
+        for old_name, rename_info in table_diff.get("renamed_columns", {}).items():
+            yield _factor("renamed_column", table_name, old_name, f"{old_name} -> {rename_info['new_name']}")
+            if classify_type_change(rename_info["old_type"], rename_info["new_type"]) != "unchanged":
+                yield _factor("renamed_column_type_changed", table_name, old_name,
+                              f"{rename_info['old_type']} -> {rename_info['new_type']}")
+
+def risk_level(score):
+    for max_score, level in RISK_LEVELS:
+        if score <= max_score:
+            return level
+    return RISK_LEVELS[-1][1]
+
+def score_schema_diff(schema_diff):
+    """
+    Deterministic risk score for a compare_schemas() result, without any AI call.
+    Returns {score (1-10), level, total_points, breakdown {rule: points}, factors [...]},
+    with factors sorted by points (highest first).
+    """
+    factors = list(iter_risk_factors(schema_diff or {}))
+    breakdown = {}
+    for factor in factors:
+        breakdown[factor["rule"]] = breakdown.get(factor["rule"], 0) + factor["points"]
+    total_points = sum(breakdown.values())
+
+    score = 1 + 9 * (1 - math.exp(-total_points / RISK_POINTS_SCALE))
+    for rule in breakdown:
+        score = max(score, RISK_FLOORS.get(rule, 1))
+    score = min(10, max(1, round(score)))
+
+    factors.sort(key=lambda factor: -factor["points"])
+    return {
+        "score": score,
+        "level": risk_level(score),
+        "total_points": total_points,
+        "breakdown": breakdown,
+        "factors": factors,
+    }
+
+def format_risk_score_markdown(risk, max_factors=10):
+    """Formats a score_schema_diff() result as Markdown: the score line and the top contributing factors."""
+    lines = [f"**Risk Score:** {risk['score']}/10 ({risk['level']}) — {risk['total_points']} risk points"]
+    if not risk["factors"]:
+        lines.append("\nNo risky changes detected (only additions).")
+        return "\n".join(lines)
+    lines.append("\n**Top contributing factors:**")
+    for factor in risk["factors"][:max_factors]:
+        location = f"`{factor['table']}.{factor['column']}`" if factor["column"] else f"`{factor['table']}`"
+        lines.append(f"* {location}: {factor['rule'].replace('_', ' ')} (+{factor['points']}) — {factor['detail']}")
+    if len(risk["factors"]) > max_factors:
+        lines.append(f"* ...and {len(risk['factors']) - max_factors} more")
+    return "\n".join(lines)
@@ -0,0 +1,187 @@
+# schema_model.py
+import sys
+import hashlib
+from collections.abc import Mapping
+
+# Canonical column properties, in the order used by Column.props and the diff output
+COLUMN_PROPERTIES = ("type", "nullable", "primary_key", "unique")
+
+
+class Column:
+    """
+    One column of a parsed table. Uses __slots__ and interned name/type strings,
+    so wide catalogs cost a fraction of the memory of per-column dictionaries.
+    """
+
+    __slots__ = ("name", "type", "nullable", "primary_key", "unique")
+
+    def __init__(self, name, type="unknown", nullable=True, primary_key=False, unique=False):
+        self.name = sys.intern(name)
+        self.type = sys.intern(type)
+        self.nullable = nullable
+        self.primary_key = primary_key
+        self.unique = unique
+
+    @property
+    def props(self):
+        """Property values as a tuple in COLUMN_PROPERTIES order; comparing columns is a tuple equality."""
+        return (self.type, self.nullable, self.primary_key, self.unique)
+
+    def to_dict(self):
+        """Returns the column's properties as a plain dictionary (for JSON, prompts and history)."""
+        return dict(zip(COLUMN_PROPERTIES, self.props))
+
+    def __eq__(self, other):
+        if not isinstance(other, Column):
+            return NotImplemented
+        return self.name == other.name and self.props == other.props
+
+    def __repr__(self):
+        return f"Column({self.name!r}, {self.type!r}, nullable={self.nullable}, primary_key={self.primary_key}, unique={self.unique})"
+
+
+class Table(Mapping):
+    """
+    A parsed table: an ordered mapping of column name -> Column.
+    Carries a structural fingerprint (column names and properties, not column order)
+    that is computed when the table is built and recomputed whenever a column changes,
+    so reading it never hashes. Parsers pass all columns to the constructor, which
+    hashes once; add_column() is for the occasional column added afterwards.
+    """
+
+    __slots__ = ("name", "columns", "_fingerprint")
+
+    def __init__(self, name, columns=None):
+        self.name = sys.intern(name)
+        self.columns = {column.name: column for column in columns or ()} # {column_name: Column}, in declaration order
+        self._update_fingerprint()
+
+    def _update_fingerprint(self):
+        canonical = repr(sorted((col_name, column.props) for col_name, column in self.columns.items()))
+        self._fingerprint = hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+    def add_column(self, column):
+        self.columns[column.name] = column
+        self._update_fingerprint()
+
+    def mark_primary_key(self, column_names):
+        """Applies a PRIMARY KEY constraint: the columns become primary key and NOT NULL."""
+        for col_name in column_names:
+            column = self.columns.get(col_name)
+            if column is not None:
+                column.primary_key = True
+                column.nullable = False
+        self._update_fingerprint()
+
+    def mark_unique(self, column_names):
+        """Applies a UNIQUE constraint; a composite constraint does not make each column unique."""
+        if len(column_names) == 1 and column_names[0] in self.columns:
+            self.columns[column_names[0]].unique = True
+            self._update_fingerprint()
+
+    def copy(self):
+        """Returns an independent copy (new Column objects), e.g. before applying constraints to a shared Table."""
+        copied = Table(self.name)
+        copied.columns = {
+            col_name: Column(column.name, column.type, column.nullable, column.primary_key, column.unique)
+            for col_name, column in self.columns.items()
+        }
+        copied._fingerprint = self._fingerprint # Same structure, no need to hash again
+        return copied
+
+    @property
+    def fingerprint(self):
+        """Stable structural hash of the table, computed when the table was built or last changed."""
+        return self._fingerprint
+
+    def to_dict(self):
+        return {col_name: column.to_dict() for col_name, column in self.columns.items()}
+
+    def __getitem__(self, col_name):
+        return self.columns[col_name]
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __repr__(self):
+        return f"Table({self.name!r}, {len(self.columns)} columns)"
+
+
+class Schema(Mapping):
+    """
+    A parsed schema: a mapping of table name -> Table, produced by both the SQL and JSON parsers.
+    The schema fingerprint is cached after the first access and cleared by add_table(); the
+    Tables of a schema whose fingerprint has been read are treated as read-only.
+    """
+
+    __slots__ = ("tables", "_fingerprint")
+
+    def __init__(self, tables=None):
+        self.tables = {} # {table_name: Table}
+        self._fingerprint = None
+        for table in tables or ():
+            self.add_table(table)
+
+    def add_table(self, table):
+        self.tables[table.name] = table # A later definition of the same table replaces the earlier one
+        self._fingerprint = None
+
+    def table_fingerprints(self):
+        """Returns {table_name: fingerprint}."""
+        return {table_name: table.fingerprint for table_name, table in self.tables.items()}
+
+    @property
+    def fingerprint(self):
+        """Fingerprint of the whole schema, combined from the table fingerprints and cached until a table is added."""
+        if self._fingerprint is None:
+            hasher = hashlib.sha256()
+            for table_name in sorted(self.tables):
+                hasher.update(f"{table_name}\x1f{self.tables[table_name].fingerprint}\x1e".encode("utf-8"))
+            self._fingerprint = hasher.hexdigest()
+        return self._fingerprint
+
+    def to_dict(self):
+        """Returns {table_name: {column_name: {type, nullable, primary_key, unique}}}."""
+        return {table_name: table.to_dict() for table_name, table in self.tables.items()}
+
+    @classmethod
+    def from_dict(cls, schema_dict):
+        """
+        Builds a Schema from the nested dictionary form (e.g. a history file).
+        Accepts the legacy 'is_pk' key written by older JSON-input runs.
+        """
+        schema = cls()
+        for table_name, columns_info in schema_dict.items():
+            schema.add_table(Table(table_name, [
+                Column(
+                    col_name,
+                    type=props.get("type", "unknown"),
+                    nullable=props.get("nullable", True),
+                    primary_key=props.get("primary_key", props.get("is_pk", False)),
+                    unique=props.get("unique", False)
+                )
+                for col_name, props in columns_info.items()
+            ]))
+        return schema
+
+    def __getitem__(self, table_name):
+        return self.tables[table_name]
+
+    def __iter__(self):
+        return iter(self.tables)
+
+    def __len__(self):
+        return len(self.tables)
+
+    def __repr__(self):
+        return f"Schema({len(self.tables)} tables)"
+
+
+def as_schema(schema):
+    """Returns `schema` as a Schema, converting the nested dictionary form if needed."""
+    if isinstance(schema, Schema):
+        return schema
+    return Schema.from_dict(schema or {})
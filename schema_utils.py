@@ -1,7 +1,16 @@
 # schema_utils.py
+import os
 import re
 import json
+import codecs
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from Levenshtein import distance as levenshtein_distance # Using Levenshtein for string similarity
+from schema_model import COLUMN_PROPERTIES, Column, Table, Schema, as_schema
+from cache_utils import CACHE_DIR, DiskCache, make_cache_key
 
 # --- Helper Function for Input Cleaning ---
 def strip_sql_comments_and_normalize(sql_string):
@@ -17,51 +26,935 @@ def strip_sql_comments_and_normalize(sql_string):
     cleaned = re.sub(r"\s+", " ", cleaned).strip()
     return cleaned
 
+# --- DDL Tokenizer & Parser ---
+# A single left-to-right scan splits the input into statements at top-level semicolons
+# (see iter_sql_statements), then each CREATE TABLE / ALTER TABLE statement is tokenized
+# and parsed on its own. Work is linear in input size and only one statement's tokens
+# are held at a time. Backslash-escaped quotes are rewritten as doubled quotes by the
+# splitter, so the tokenizer only has to know the standard form.
+_TOKEN_RE = re.compile(r"""
+    \s*
+    (?:
+        (?P<comment>--[^\n]*|/\*[\s\S]*?(?:\*/|\Z))
+      | (?P<dollar>\$(?P<tag>(?:[A-Za-z_]\w*)?)\$[\s\S]*?(?:\$(?P=tag)\$|\Z))
+      | (?P<string>[EeNn]?'[^']*(?:''[^']*)*'?)
+      | (?P<quoted>"[^"]*(?:""[^"]*)*"?|`[^`]*`?|\[[^\W\d][^\]]*\]?)
+      | (?P<word>[^\W\d][\w$]*)
+      | (?P<number>\d+(?:\.\d*)?)
+      | (?P<punct>[(),;.\[\]])
+      | (?P<other>\S)
+    )
+""", re.VERBOSE)
+
+# Reserved words that always start a table-level element instead of a column definition
+_TABLE_CONSTRAINT_WORDS = frozenset({'constraint', 'primary', 'unique', 'foreign', 'check', 'exclude', 'like'})
+# MySQL index words, which are also legal column names ("key VARCHAR(10)" vs "KEY idx (col)")
+_INDEX_WORDS = frozenset({'key', 'index', 'fulltext', 'spatial'})
+# Words that end a column's data type and start its inline constraints
+_COLUMN_CONSTRAINT_WORDS = frozenset({
+    'constraint', 'not', 'null', 'primary', 'unique', 'default', 'references', 'check',
+    'collate', 'generated', 'auto_increment', 'autoincrement', 'identity', 'comment', 'as'
+})
+
+def _unquote_identifier(text):
+    """Strips identifier quotes ("x", `x`, [x]) and collapses doubled quote characters."""
+    if text[0] == '"':
+        return text[1:-1].replace('""', '"') if text.endswith('"') and len(text) > 1 else text[1:]
+    if text[0] == '`':
+        return text[1:-1] if text.endswith('`') and len(text) > 1 else text[1:]
+    return text[1:-1] if text.endswith(']') else text[1:]
+
+def _tokenize_statement(statement_text):
+    """
+    Tokenizes one SQL statement into a list of (kind, value) tokens.
+    Comments are dropped and identifiers are lower-cased (quoted ones are unquoted first).
+    """
+    tokens = []
+    pos = 0
+    length = len(statement_text)
+    match_token = _TOKEN_RE.match
+    while pos < length:
+        m = match_token(statement_text, pos)
+        if m is None or m.end() == pos:
+            break # Only trailing whitespace remains
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == 'comment':
+            continue
+        value = m.group(kind)
+        if kind == 'word':
+            value = value.lower()
+        elif kind == 'quoted':
+            kind, value = 'word', _unquote_identifier(value).lower()
+        elif kind == 'dollar':
+            kind = 'string'
+        tokens.append((kind, value))
+    return tokens
+
+def _read_qualified_name(tokens, i):
+    """Reads a possibly schema-qualified name (a.b.c) starting at tokens[i]. Returns (name, next_index)."""
+    parts = []
+    while i < len(tokens) and tokens[i][0] == 'word':
+        parts.append(tokens[i][1])
+        if i + 1 < len(tokens) and tokens[i + 1] == ('punct', '.'):
+            i += 2
+        else:
+            i += 1
+            break
+    return '.'.join(parts), i
+
+def _split_parenthesized(tokens, i):
+    """
+    Splits the parenthesized list opening at tokens[i] into its top-level comma-separated elements.
+    Returns (elements, index_after_closing_paren).
+    """
+    elements = []
+    current = []
+    depth = 0
+    while i < len(tokens):
+        token = tokens[i]
+        i += 1
+        if token == ('punct', '('):
+            depth += 1
+            if depth == 1:
+                continue
+        elif token == ('punct', ')'):
+            depth -= 1
+            if depth == 0:
+                break
+        elif token == ('punct', ',') and depth == 1:
+            elements.append(current)
+            current = []
+            continue
+        current.append(token)
+    if current:
+        elements.append(current)
+    return elements, i
+
+def _column_list(tokens, i):
+    """Reads a parenthesized column name list such as (a, b) starting at tokens[i]. Returns (names, next_index)."""
+    while i < len(tokens) and tokens[i] != ('punct', '('):
+        i += 1 # Skip an optional constraint/index name before the list
+    elements, i = _split_parenthesized(tokens, i)
+    return [element[0][1] for element in elements if element and element[0][0] == 'word'], i
+
+def _format_type(tokens):
+    """Renders data type tokens back into a compact string, e.g. 'decimal(10, 2)' or 'int[]'."""
+    parts = []
+    for kind, value in tokens:
+        if kind == 'punct' and value in '()[].':
+            if value == '(' and parts and parts[-1] == ' ':
+                parts.pop() # 'varchar (50)' -> 'varchar(50)'
+            parts.append(value)
+        elif kind == 'punct' and value == ',':
+            parts.append(', ')
+        else:
+            if parts and parts[-1] not in ('(', '[', '.', ', ', ' '):
+                parts.append(' ')
+            parts.append(value)
+    return ''.join(parts).strip()
+
+def _is_table_constraint(element):
+    """Tells a table-level element (constraint, index, LIKE) apart from a column definition."""
+    kind, value = element[0]
+    if kind != 'word' or len(element) < 2:
+        return False
+    if value in _TABLE_CONSTRAINT_WORDS:
+        return True
+    if value in _INDEX_WORDS:
+        # KEY (col) or KEY idx_name (col ...); a column type would be followed by a number: key VARCHAR(10)
+        if element[1] == ('punct', '('):
+            return True
+        return len(element) > 3 and element[2] == ('punct', '(') and element[3][0] == 'word'
+    return value == 'period' and element[1] == ('word', 'for')
+
+def _parse_table_constraint(element):
+    """Parses a table-level constraint element. Returns a ('primary_key' | 'unique', [columns]) pair or None."""
+    i = 0
+    if element[0] == ('word', 'constraint'):
+        i = 2 # Skip CONSTRAINT <name>
+    if i < len(element) and element[i] == ('word', 'primary'):
+        columns, _ = _column_list(element, i + 1)
+        return ('primary_key', columns)
+    if i < len(element) and element[i] == ('word', 'unique'):
+        columns, _ = _column_list(element, i + 1)
+        return ('unique', columns)
+    return None # FOREIGN KEY, CHECK, INDEX, ... do not change column properties
+
+def _parse_column_definition(element):
+    """Parses a column definition element into a Column."""
+    column_name = element[0][1]
+    i = 1
+    depth = 0
+    while i < len(element):
+        kind, value = element[i]
+        if kind == 'punct' and value in '([':
+            depth += 1
+        elif kind == 'punct' and value in ')]':
+            depth -= 1
+        elif depth == 0 and kind == 'word' and value in _COLUMN_CONSTRAINT_WORDS:
+            break
+        i += 1
+    column = Column(column_name, type=_format_type(element[1:i]))
+    depth = 0
+    previous = None
+    while i < len(element):
+        kind, value = element[i]
+        i += 1
+        if kind == 'punct' and value == '(':
+            depth += 1
+        elif kind == 'punct' and value == ')':
+            depth -= 1
+        elif depth == 0 and kind == 'word':
+            if value == 'null' and previous == 'not':
+                column.nullable = False
+            elif value == 'null' and previous != 'default':
+                column.nullable = True
+            elif value == 'primary':
+                column.primary_key = True
+                column.nullable = False # Primary keys are implicitly NOT NULL
+            elif value == 'unique':
+                column.unique = True
+        previous = value if depth == 0 else None
+    return column
+
+def _apply_table_constraint(table, constraint_kind, constraint_columns):
+    """Marks the columns covered by a PRIMARY KEY or single-column UNIQUE constraint."""
+    if constraint_kind == 'primary_key':
+        table.mark_primary_key(constraint_columns)
+    else:
+        table.mark_unique(constraint_columns)
+
+def _parse_statement(tokens):
+    """
+    Parses one tokenized statement.
+    Returns ('create', table_name, Table), ('alter', table_name, [constraints]) or None
+    for statements that do not affect table structure.
+    """
+    if not tokens or tokens[0][0] != 'word':
+        return None
+    keyword = tokens[0][1]
+    if keyword == 'create':
+        i = 1
+        while i < len(tokens) and tokens[i][1] in ('or', 'replace', 'global', 'local', 'temporary', 'temp', 'unlogged'):
+            i += 1
+        if i >= len(tokens) or tokens[i] != ('word', 'table'):
+            return None
+        i += 1
+        if tokens[i:i + 3] == [('word', 'if'), ('word', 'not'), ('word', 'exists')]:
+            i += 3
+        table_name, i = _read_qualified_name(tokens, i)
+        if not table_name or i >= len(tokens) or tokens[i] != ('punct', '('):
+            return None # CREATE TABLE ... AS SELECT / PARTITION OF carry no column list
+        elements, _ = _split_parenthesized(tokens, i)
+        columns = []
+        table_constraints = []
+        for element in elements:
+            if not element:
+                continue
+            if _is_table_constraint(element):
+                constraint = _parse_table_constraint(element)
+                if constraint:
+                    table_constraints.append(constraint)
+            elif element[0][0] == 'word':
+                columns.append(_parse_column_definition(element))
+        table = Table(table_name, columns) # Fingerprinted here, at parse time
+        for constraint_kind, constraint_columns in table_constraints:
+            _apply_table_constraint(table, constraint_kind, constraint_columns)
+        return ('create', table_name, table)
+    if keyword == 'alter' and len(tokens) > 1 and tokens[1] == ('word', 'table'):
+        # pg_dump emits keys separately: ALTER TABLE ONLY t ADD CONSTRAINT t_pkey PRIMARY KEY (id);
+        i = 2
+        while i < len(tokens) and tokens[i][1] in ('only', 'if', 'exists'):
+            i += 1
+        table_name, i = _read_qualified_name(tokens, i)
+        constraints = []
+        action = []
+        for token in tokens[i:] + [('punct', ',')]:
+            if token == ('punct', ',') and action.count(('punct', '(')) == action.count(('punct', ')')):
+                if len(action) > 1 and action[0] == ('word', 'add'):
+                    constraint = _parse_table_constraint(action[1:])
+                    if constraint:
+                        constraints.append(constraint)
+                action = []
+            else:
+                action.append(token)
+        return ('alter', table_name, constraints) if constraints else None
+    return None
+
 def parse_create_table_statement(sql_statement):
     """
-    Simple parser to extract table name and columns from a CREATE TABLE SQL statement.
-    This is a simplified parser and may not handle all edge cases or complex SQL syntax.
-    Returns a dictionary: {table_name: {column_name: {type: ..., nullable: ..., primary_key: ..., etc.}}}
-    """
-    schema = {}
-    
-    # Regex to find CREATE TABLE statements and their content
-    table_matches = re.findall(r"CREATE TABLE (\w+)\s*\((.*?)\);", sql_statement, re.IGNORECASE | re.DOTALL)
-
-    for table_name, columns_str in table_matches:
-        table_name = table_name.lower()
-        columns_info = {}
-        
-        # Split columns and process each
-        column_defs = re.findall(r"(\w+)\s+([\w\(\),\s]+)(?: PRIMARY KEY| NOT NULL| UNIQUE| REFERENCES \w+\(\w+\)| DEFAULT [^,]+)*", columns_str, re.IGNORECASE)
-        
-
-        for col_name, col_type_str in column_defs:
-            col_name = col_name.lower()
-            col_type = col_type_str.strip().lower()
-            
-            # Simple attribute detection (can be expanded)
-            is_pk = 'primary key' in columns_str.lower() and col_name in columns_str.lower()
-            nullable = 'not null' not in columns_str.lower() or col_name + ' not null' not in columns_str.lower() # basic, might be inaccurate
-            is_unique = 'unique' in columns_str.lower() and col_name in columns_str.lower()
-
-            columns_info[col_name] = {
-                'type': col_type,
-                'nullable': nullable,
-                'primary_key': is_pk,
-                'unique': is_unique,
-                # Add more attributes as needed (e.g., default value, foreign key references)
-            }
-        
-        schema[table_name] = columns_info
+    Parses SQL DDL (one or many statements) into a schema dictionary.
+    Handles CREATE [TEMP] TABLE [IF NOT EXISTS], schema-qualified and quoted identifiers,
+    inline and table-level PRIMARY KEY / UNIQUE / NOT NULL constraints, and primary/unique
+    keys added later with ALTER TABLE ... ADD CONSTRAINT (as emitted by pg_dump).
+    Statements other than CREATE TABLE / ALTER TABLE are ignored.
+    Returns a Schema (table name -> Table -> Column); Schema.to_dict() gives the
+    {table_name: {column_name: {type, nullable, primary_key, unique}}} form.
+    """
+    return Schema(iter_parsed_tables([sql_statement]))
+
+# --- Streaming Ingestion ---
+# Large dump files are read in chunks and split into statements on the fly, so peak memory
+# is bounded by the largest single statement rather than the whole file.
+INGEST_CHUNK_SIZE = 1024 * 1024 # Characters read per chunk from files and uploads
+
+_SPLIT_SPECIAL_RE = re.compile(r"[;'\"`$/-]") # Characters that may end a statement or open a quote/comment
+_DOLLAR_TAG_RE = re.compile(r"\$(?:[A-Za-z_]\w*)?\$")
+_PARTIAL_DOLLAR_TAG_RE = re.compile(r"\$(?:[A-Za-z_]\w*)?\Z")
+_COPY_FROM_STDIN_RE = re.compile(r"COPY\b[\s\S]*\bFROM\s+STDIN\b", re.IGNORECASE)
+# pg_dump declares standard strings, where a backslash is an ordinary character; MySQL dumps
+# (and PostgreSQL E'...' strings) escape quotes with a backslash, which is the default
+_STANDARD_STRINGS_RE = re.compile(r"SET\s+(?:SESSION\s+|LOCAL\s+)?standard_conforming_strings\s*(?:=|TO)\s*'?(on|off)\b", re.IGNORECASE)
+_ESCAPED_QUOTE_STOP_RES = {quote: re.compile(f"[{quote}\\\\]") for quote in "'\""} # Next closing quote or backslash
+_BACKSLASH_ESCAPE_RE = re.compile(r"\\([\s\S])")
+
+def iter_file_chunks(source, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Yields text chunks from a file path or an open file object (text or binary,
+    e.g. a Streamlit UploadedFile). Bytes are decoded incrementally as UTF-8.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+    if hasattr(source, "seek"):
+        source.seek(0) # Uploaded files survive reruns and may have been read before
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+
+def _quoted_end(buf, i, quote, at_eof, backslash_escapes=False):
+    """
+    Returns the index just past the quote opened at buf[i], or -1 if more input is needed.
+    With `backslash_escapes`, a backslash escapes the character after it.
+    """
+    stop_re = _ESCAPED_QUOTE_STOP_RES[quote] if backslash_escapes else None
+    j = i
+    while True:
+        if stop_re is not None:
+            m = stop_re.search(buf, j + 1)
+            j = m.start() if m else -1
+        else:
+            j = buf.find(quote, j + 1)
+        if j == -1:
+            return -1
+        if buf[j] == '\\':
+            if j + 1 == len(buf):
+                return -1 # The escaped character is in the next chunk
+            j += 1
+            continue
+        if j + 1 == len(buf) and not at_eof:
+            return -1 # A doubled quote may straddle the chunk boundary
+        if j + 1 < len(buf) and buf[j + 1] == quote and quote != '`':
+            j += 1
+            continue
+        return j + 1
+
+def _unescape_quotes(quoted_text, quote):
+    """Rewrites backslash-escaped quotes as doubled quotes (the form the tokenizer reads); other escapes are kept."""
+    return _BACKSLASH_ESCAPE_RE.sub(lambda m: quote * 2 if m.group(1) == quote else m.group(0), quoted_text)
+
+def _special_end(buf, i, at_eof, backslash_escapes=False):
+    """
+    Classifies the special character at buf[i].
+    Returns (end, kind): end is the index just past the quote/comment it opens, None if it
+    is an ordinary character, or -1 if more input is needed to decide; kind is 'comment',
+    'escaped' for a quote read with backslash escapes, or None.
+    """
+    c = buf[i]
+    if c in "'\"`":
+        if c == "'" and i > 0 and buf[i - 1] in "Ee" and (i < 2 or not (buf[i - 2].isalnum() or buf[i - 2] in '_$')):
+            backslash_escapes = True # E'...' strings always use backslash escapes
+        escaped = backslash_escapes and c != '`' # Backticks never do
+        return _quoted_end(buf, i, c, at_eof, escaped), ('escaped' if escaped else None)
+    if c in '-/':
+        if i + 1 >= len(buf):
+            return (None if at_eof else -1), False
+        if c == '-' and buf[i + 1] == '-':
+            j = buf.find('\n', i)
+            return (j if j != -1 else -1), 'comment'
+        if c == '/' and buf[i + 1] == '*':
+            j = buf.find('*/', i + 2)
+            return (j + 2 if j != -1 else -1), 'comment'
+        return None, None
+    # '$' opens a dollar-quoted body ($$ ... $$ or $tag$ ... $tag$) unless it is part of an identifier
+    if i > 0 and (buf[i - 1].isalnum() or buf[i - 1] in '_$'):
+        return None, None
+    m = _DOLLAR_TAG_RE.match(buf, i)
+    if m:
+        j = buf.find(m.group(0), m.end())
+        return (j + len(m.group(0)) if j != -1 else -1), None
+    if not at_eof and _PARTIAL_DOLLAR_TAG_RE.match(buf, i):
+        return -1, None
+    return None, None
+
+def iter_sql_statements(chunks):
+    """
+    Yields SQL statements (without the trailing semicolon and with comments removed)
+    from an iterable of text chunks. Quotes, comments and dollar-quoted bodies may span
+    chunk boundaries; semicolons inside them do not end a statement. pg_dump
+    `COPY ... FROM stdin;` data blocks are skipped.
+    Backslashes escape quotes (MySQL dumps) until the input declares
+    `SET standard_conforming_strings = on` (pg_dump); escaped quotes come out doubled.
+    """
+    chunk_iter = iter(chunks)
+    buf = ""
+    pos = 0
+    parts = [] # Pieces of the current statement, comments already removed
+    at_eof = False
+    skipping_copy_data = False
+    backslash_escapes = True
+
+    def read_more(keep_from):
+        nonlocal buf, pos, at_eof
+        buf = buf[keep_from:]
+        pos = 0
+        for chunk in chunk_iter:
+            if chunk:
+                buf += chunk
+                return
+        at_eof = True
+
+    while True:
+        if skipping_copy_data:
+            # Data rows run until a line holding only "\."
+            end = buf.find("\n\\.", pos)
+            if end == -1:
+                if at_eof:
+                    return
+                read_more(max(pos, len(buf) - 2))
+                continue
+            pos = end + 3
+            skipping_copy_data = False
+            continue
+
+        m = _SPLIT_SPECIAL_RE.search(buf, pos)
+        if m is None:
+            if at_eof:
+                parts.append(buf[pos:])
+                break
+            keep_from = max(pos, len(buf) - 2) # A quote at the start of the next chunk may be an E'...' string
+            parts.append(buf[pos:keep_from])
+            read_more(keep_from)
+            continue
+
+        i = m.start()
+        if buf[i] == ';':
+            parts.append(buf[pos:i])
+            statement = "".join(parts).strip()
+            parts = []
+            pos = i + 1
+            if statement:
+                skipping_copy_data = bool(_COPY_FROM_STDIN_RE.match(statement))
+                standard_strings = _STANDARD_STRINGS_RE.match(statement)
+                if standard_strings:
+                    backslash_escapes = standard_strings.group(1).lower() == "off"
+                yield statement
+            continue
+
+        end, kind = _special_end(buf, i, at_eof, backslash_escapes)
+        if end is None:
+            parts.append(buf[pos:i + 1])
+            pos = i + 1
+        elif end == -1 and not at_eof:
+            read_more(pos) # Quote or comment continues in the next chunk
+        else:
+            if end == -1:
+                end = len(buf) # Unterminated at end of input: take the rest
+            if kind == 'comment':
+                parts.append(buf[pos:i])
+                parts.append(" ")
+            elif kind == 'escaped' and '\\' in buf[i:end]:
+                parts.append(buf[pos:i])
+                parts.append(_unescape_quotes(buf[i:end], buf[i]))
+            else:
+                parts.append(buf[pos:end])
+            pos = end
+
+    statement = "".join(parts).strip()
+    if statement:
+        yield statement
+
+def iter_parsed_tables(chunks):
+    """
+    Yields Table objects one at a time from an iterable of DDL text chunks.
+    ALTER TABLE ... ADD CONSTRAINT statements that come after a table was yielded update
+    that Table in place, so collect the tables before relying on key flags.
+    """
+    tables = {} # Only references to already-yielded tables, needed for later ALTER TABLE statements
+    for statement in iter_sql_statements(chunks):
+        parsed = _parse_statement(_tokenize_statement(statement))
+        if parsed is None:
+            continue
+        action, table_name, payload = parsed
+        if action == 'create':
+            tables[table_name] = payload
+            yield payload
+        elif table_name in tables:
+            for constraint_kind, constraint_columns in payload:
+                _apply_table_constraint(tables[table_name], constraint_kind, constraint_columns)
+
+def parse_json_schema(parsed_json):
+    """
+    Converts the JSON schema array format ([{"table_name": ..., "columns": [...]}, ...])
+    into the same Schema model produced by parse_create_table_statement.
+    The JSON 'is_pk' flag maps to the canonical primary_key attribute.
+    """
+    schema = Schema()
+    for table_obj in parsed_json:
+        schema.add_table(Table(table_obj.get('table_name', 'untitled_table').lower(), [
+            Column(
+                col_obj.get('name', 'untitled_col').lower(),
+                type=col_obj.get('type', 'UNKNOWN').lower(),
+                nullable=not col_obj.get('not_null', False), # Infer nullable from not_null
+                primary_key=col_obj.get('is_pk', False),
+                unique=col_obj.get('unique', False)
+            )
+            for col_obj in table_obj.get('columns', [])
+        ]))
     return schema
 
+_LEADING_COMMENTS_RE = re.compile(r"(?:\s+|--[^\n]*|/\*[\s\S]*?\*/)*")
+
+def _looks_like_json(text):
+    """True if the first character after whitespace and SQL comments opens a JSON array."""
+    m = _LEADING_COMMENTS_RE.match(text)
+    return text[m.end():m.end() + 1] == '['
+
+def parse_schema_text(schema_text):
+    """
+    Parses a schema given as a string: a JSON schema array or SQL DDL.
+    Only JSON input goes through strip_sql_comments_and_normalize; SQL is parsed directly.
+    """
+    if _looks_like_json(schema_text):
+        try:
+            return parse_json_schema(json.loads(strip_sql_comments_and_normalize(schema_text)))
+        except json.JSONDecodeError:
+            pass # Not valid JSON after all, try SQL
+    return parse_create_table_statement(schema_text)
+
+def parse_schema_file(source, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Parses a schema from a file path or file object without holding the whole text in memory.
+    SQL dumps are streamed statement by statement; JSON schema arrays are loaded whole,
+    since the JSON format has to be read completely anyway.
+    """
+    chunks = iter_file_chunks(source, chunk_size)
+    first_chunk = next(chunks, "")
+    if _looks_like_json(first_chunk):
+        return parse_schema_text(first_chunk + "".join(chunks))
+    return Schema(iter_parsed_tables(itertools.chain([first_chunk], chunks)))
+
+# --- Parse Cache ---
+# Repeated comparisons usually keep one side (the baseline) unchanged; its parsed Schema is
+# reused instead of re-parsed. Bump PARSER_VERSION whenever parser output changes, so cached
+# results from an older parser are never served.
+PARSER_VERSION = 3
+PARSE_CACHE_MAX_ENTRIES = 8 # Parsed schemas kept in memory
+PARSE_DISK_CACHE_MIN_CHARS = 20000 # Smaller inputs parse faster than a disk cache read
+PARSE_DISK_CACHE_TTL_SECONDS = 30 * 24 * 3600
+STATEMENT_CACHE_MAX_ENTRIES = 100000 # Parsed DDL statements kept for incremental re-parsing
+
+_parse_cache = OrderedDict() # {cache_key: Schema}, kept in LRU order
+_parse_cache_lock = threading.Lock()
+parse_disk_cache = DiskCache(os.path.join(CACHE_DIR, "parsed_schemas.sqlite3"), default_ttl=PARSE_DISK_CACHE_TTL_SECONDS)
+_statement_cache = OrderedDict() # {statement hash: _parse_statement result (None for non-table statements)}, LRU order
+_statement_cache_lock = threading.Lock()
+
+def _parse_statement_cached(statement):
+    """_parse_statement() of one DDL statement, memoized by a hash of its text."""
+    cache_key = hashlib.blake2b(statement.encode("utf-8"), digest_size=16).digest()
+    with _statement_cache_lock:
+        if cache_key in _statement_cache:
+            _statement_cache.move_to_end(cache_key)
+            return _statement_cache[cache_key]
+
+    parsed = _parse_statement(_tokenize_statement(statement))
+    with _statement_cache_lock:
+        _statement_cache[cache_key] = parsed
+        while len(_statement_cache) > STATEMENT_CACHE_MAX_ENTRIES:
+            _statement_cache.popitem(last=False) # Evict the least recently used statement
+    return parsed
+
+def parse_sql_incremental(sql_text):
+    """
+    Same result as parse_create_table_statement(), but only statements whose text changed since
+    an earlier parse are tokenized and parsed; every other table is reused from the statement
+    cache. Editing one column of a large DDL re-parses a single CREATE TABLE. Cached Tables are
+    shared, so a table that a later ALTER TABLE modifies is copied before the constraint is applied.
+    """
+    tables = {}
+    copied = set() # Tables already copied away from their cached CREATE TABLE result
+    for statement in iter_sql_statements([sql_text]):
+        parsed = _parse_statement_cached(statement)
+        if parsed is None:
+            continue
+        action, table_name, payload = parsed
+        if action == 'create':
+            tables[table_name] = payload
+            copied.discard(table_name)
+        elif table_name in tables:
+            if table_name not in copied:
+                tables[table_name] = tables[table_name].copy()
+                copied.add(table_name)
+            for constraint_kind, constraint_columns in payload:
+                _apply_table_constraint(tables[table_name], constraint_kind, constraint_columns)
+    return Schema(tables.values())
+
+def get_parsed_schema(schema_text, use_disk_cache=True):
+    """
+    parse_schema_text() memoized by a hash of the raw text and PARSER_VERSION: an in-memory LRU,
+    backed for large inputs by a disk tier that survives restarts. On a miss, SQL is parsed
+    incrementally (see parse_sql_incremental), so an edited input only re-parses the changed
+    statements. Cached Schemas are shared between callers, so the result must be treated as read-only.
+    """
+    cache_key = make_cache_key("parsed_schema", PARSER_VERSION, schema_text)
+    with _parse_cache_lock:
+        if cache_key in _parse_cache:
+            _parse_cache.move_to_end(cache_key)
+            return _parse_cache[cache_key]
+
+    use_disk_cache = use_disk_cache and len(schema_text) >= PARSE_DISK_CACHE_MIN_CHARS
+    cached = parse_disk_cache.get(cache_key) if use_disk_cache else None
+    if cached is not None:
+        schema = Schema.from_dict(cached)
+    else:
+        schema = parse_schema_text(schema_text) if _looks_like_json(schema_text) else parse_sql_incremental(schema_text)
+        if use_disk_cache:
+            parse_disk_cache.set(cache_key, schema.to_dict())
+
+    with _parse_cache_lock:
+        _parse_cache[cache_key] = schema
+        _parse_cache.move_to_end(cache_key)
+        while len(_parse_cache) > PARSE_CACHE_MAX_ENTRIES:
+            _parse_cache.popitem(last=False) # Evict the least recently used schema
+    return schema
+
+# --- Versioned Schema Files ---
+SCHEMA_FILE_EXTENSIONS = (".sql", ".ddl", ".json", ".txt") # Files treated as schema versions in a directory
+_NATURAL_SORT_RE = re.compile(r"(\d+)")
+
+def natural_sort_key(path):
+    """Sorts version numbers numerically, so v2 comes before v10."""
+    name = os.path.basename(path).lower()
+    return [int(part) if part.isdigit() else part for part in _NATURAL_SORT_RE.split(name)]
+
+def list_schema_versions(directory):
+    """Returns the schema files in `directory`, in natural version order."""
+    paths = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(SCHEMA_FILE_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+    ]
+    return sorted(paths, key=natural_sort_key)
+
+
+# --- Rename Inference ---
+# Deleted/added column pairs are only compared when their types are compatible (same
+# type family) and their names are within RENAME_MAX_DISTANCE edits, found through a
+# BK-tree per family instead of comparing every deleted column with every added one.
+# The surviving candidates are then matched with a minimum-cost assignment.
+RENAME_MAX_DISTANCE = 2 # Max Levenshtein distance for a rename candidate
+_BK_TREE_MIN_SIZE = 16 # Smaller buckets are scanned directly with a length filter
+
+# (substring, family) checks in priority order; 'interval' must win over 'int'
+_TYPE_FAMILY_RULES = (
+    ('interval', 'temporal'),
+    ('int', 'integer'), ('serial', 'integer'),
+    ('decimal', 'decimal'), ('numeric', 'decimal'), ('money', 'decimal'),
+    ('float', 'float'), ('double', 'float'), ('real', 'float'),
+    ('char', 'string'), ('text', 'string'), ('string', 'string'), ('clob', 'string'),
+    ('date', 'temporal'), ('time', 'temporal'),
+    ('bool', 'boolean'), ('bit', 'boolean'),
+)
+
+def type_family(col_type):
+    """
+    Maps a column type to a compatibility family (e.g. 'int' and 'bigint' -> 'integer',
+    'text' and 'varchar(50)' -> 'string'). Unknown types only match themselves.
+    """
+    col_type = (col_type or '').lower()
+    for needle, family in _TYPE_FAMILY_RULES:
+        if needle in col_type:
+            return family
+    return 'exact:' + col_type
+
+class _BKTree:
+    """Burkhard-Keller tree over column names for Levenshtein radius queries."""
+
+    __slots__ = ("root",)
+
+    def __init__(self, words):
+        self.root = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if self.root is None:
+            self.root = (word, {})
+            return
+        node = self.root
+        while True:
+            dist = levenshtein_distance(word, node[0])
+            child = node[1].get(dist)
+            if child is None:
+                node[1][dist] = (word, {})
+                return
+            node = child
+
+    def search(self, word, max_distance):
+        """Returns [(distance, candidate)] for every stored name within max_distance of word."""
+        matches = []
+        stack = [self.root] if self.root else []
+        while stack:
+            candidate, children = stack.pop()
+            dist = levenshtein_distance(word, candidate)
+            if dist <= max_distance:
+                matches.append((dist, candidate))
+            for edge_dist, child in children.items():
+                if dist - max_distance <= edge_dist <= dist + max_distance:
+                    stack.append(child)
+        return matches
+
+def _rename_candidates(deleted_columns, added_columns, old_cols, new_cols, max_distance):
+    """Returns candidate (deleted, added, distance) triples for type-compatible, similarly named columns."""
+    buckets = {}
+    for col_name in added_columns:
+        buckets.setdefault(type_family(new_cols[col_name].type), []).append(col_name)
+    indexes = {}
+    candidates = []
+    for deleted_col_name in deleted_columns:
+        family = type_family(old_cols[deleted_col_name].type)
+        bucket = buckets.get(family)
+        if not bucket:
+            continue
+        if len(bucket) < _BK_TREE_MIN_SIZE:
+            name_length = len(deleted_col_name)
+            matches = [
+                (levenshtein_distance(deleted_col_name, added_col_name), added_col_name)
+                for added_col_name in bucket
+                if abs(len(added_col_name) - name_length) <= max_distance # Length bound on edit distance
+            ]
+        else:
+            if family not in indexes:
+                indexes[family] = _BKTree(bucket)
+            matches = indexes[family].search(deleted_col_name, max_distance)
+        candidates.extend(
+            (deleted_col_name, added_col_name, dist)
+            for dist, added_col_name in matches if dist <= max_distance
+        )
+    return candidates
+
+def _min_cost_assignment(cost):
+    """
+    Hungarian algorithm for a rectangular cost matrix with rows <= columns.
+    Returns {row_index: column_index} minimising the total cost.
+    """
+    n, m = len(cost), len(cost[0])
+    inf = float('inf')
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            delta = inf
+            j1 = 0
+            row = cost[i0 - 1]
+            for j in range(1, m + 1):
+                if not used[j]:
+                    cur = row[j - 1] - u[i0] - v[j]
+                    if cur < minv[j]:
+                        minv[j] = cur
+                        way[j] = j0
+                    if minv[j] < delta:
+                        delta = minv[j]
+                        j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+    return {p[j] - 1: j - 1 for j in range(1, m + 1) if p[j]}
+
+def infer_column_renames(deleted_columns, added_columns, old_cols, new_cols, max_distance=RENAME_MAX_DISTANCE):
+    """
+    Infers column renames between deleted and added columns of one table.
+    Maximises the number of renames, then minimises total edit distance, preferring
+    pairs whose type is unchanged. Deterministic for any column order.
+    Returns {old_name: new_name}.
+    """
+    candidates = _rename_candidates(deleted_columns, added_columns, old_cols, new_cols, max_distance)
+    if not candidates:
+        return {}
+
+    # Independent groups of competing candidates are solved separately (usually 1x1)
+    parent = {}
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+    for deleted_col_name, added_col_name, _ in candidates:
+        parent[find(('old', deleted_col_name))] = find(('new', added_col_name))
+    groups = {}
+    for candidate in candidates:
+        groups.setdefault(find(('old', candidate[0])), []).append(candidate)
+
+    # Each match costs 2 * distance (+1 if the type changed). Leaving a row unmatched costs more
+    # than all matches of a full assignment together, so the optimum always has the most renames.
+    max_match_cost = 2 * max_distance + 1
+    renames = {}
+    for group in groups.values():
+        if len(group) == 1:
+            renames[group[0][0]] = group[0][1]
+            continue
+        rows = sorted({c[0] for c in group})
+        cols = sorted({c[1] for c in group})
+        transposed = len(rows) > len(cols)
+        if transposed:
+            rows, cols = cols, rows
+        row_index = {name: i for i, name in enumerate(rows)}
+        col_index = {name: j for j, name in enumerate(cols)}
+        unmatched_cost = max_match_cost * len(rows) + 1
+        cost = [[unmatched_cost] * len(cols) for _ in rows]
+        for deleted_col_name, added_col_name, dist in group:
+            type_changed = old_cols[deleted_col_name].type != new_cols[added_col_name].type
+            r, c = (added_col_name, deleted_col_name) if transposed else (deleted_col_name, added_col_name)
+            cost[row_index[r]][col_index[c]] = 2 * dist + (1 if type_changed else 0)
+        for i, j in _min_cost_assignment(cost).items():
+            if cost[i][j] >= unmatched_cost:
+                continue
+            if transposed:
+                renames[cols[j]] = rows[i]
+            else:
+                renames[rows[i]] = cols[j]
+    return {old_name: renames[old_name] for old_name in deleted_columns if old_name in renames}
+
 # --- Schema Comparison (Diffing) Logic ---
-def compare_schemas(old_schema, new_schema):
+PARALLEL_DIFF_MIN_TABLES = 200 # Below this many common tables the process pool costs more than it saves
+PARALLEL_DIFF_BATCH_SIZE = 64 # Tables sent to a worker per task
+
+def _diff_table(old_table, new_table):
+    """
+    Compares the columns of one table present in both schemas.
+    Returns the table diff, or None if the table did not change.
     """
-    Compares two parsed schema dictionaries and returns a detailed diff,
-    including inferred column renames using Levenshtein distance.
+    if old_table.fingerprint == new_table.fingerprint:
+        return None # Identical tables need no name sets or rename search
+    old_cols = old_table.columns
+    new_cols = new_table.columns
+
+    table_diff = {
+        "added_columns": [],
+        "deleted_columns": [],
+        "modified_columns": {}, # {col_name: {old_props: {}, new_props: {}}}
+        "renamed_columns": {} # {old_name: new_name, old_type: ..., new_type: ...}
+    }
+
+    old_col_names = list(old_cols.keys()) # Convert to list for easier iteration
+    new_col_names = list(new_cols.keys()) # Convert to list
+
+    # Initialize lists for columns truly added/deleted after rename inference (declaration order)
+    temp_added_columns = [col for col in new_col_names if col not in old_cols]
+    temp_deleted_columns = [col for col in old_col_names if col not in new_cols]
+
+    # --- Inferred Column Renames Logic ---
+    # Candidates come from a type-family / BK-tree index and are matched with a
+    # globally optimal assignment, so results do not depend on column order.
+    if temp_deleted_columns and temp_added_columns:
+        inferred_renames = infer_column_renames(temp_deleted_columns, temp_added_columns, old_cols, new_cols)
+        for deleted_col_name, best_match in inferred_renames.items():
+            table_diff["renamed_columns"][deleted_col_name] = {
+                "new_name": best_match,
+                "old_type": old_cols[deleted_col_name].type,
+                "new_type": new_cols[best_match].type
+            }
+        if inferred_renames:
+            renamed_new_cols = set(inferred_renames.values())
+            temp_deleted_columns = [col for col in temp_deleted_columns if col not in inferred_renames]
+            temp_added_columns = [col for col in temp_added_columns if col not in renamed_new_cols]
+
+    table_diff["added_columns"] = temp_added_columns
+    table_diff["deleted_columns"] = temp_deleted_columns
+
+    # Check for modified columns (common names, *after* rename inference)
+    # Renamed columns are never common to both sides, so they are not checked as modified.
+    common_col_names_after_rename = [col for col in old_col_names if col in new_cols]
+
+    for col_name in common_col_names_after_rename:
+        old_props = old_cols[col_name].props
+        new_props = new_cols[col_name].props
+
+        if old_props != new_props: # Tuple equality over COLUMN_PROPERTIES
+            modified_props = {}
+            for prop_key, old_value, new_value in zip(COLUMN_PROPERTIES, old_props, new_props):
+                if old_value != new_value:
+                    modified_props[prop_key] = {
+                        "old_value": old_value,
+                        "new_value": new_value
+                    }
+            table_diff["modified_columns"][col_name] = modified_props
+
+    # Only report the table if there were actual changes within it
+    if any(table_diff[key] for key in ["added_columns", "deleted_columns", "modified_columns", "renamed_columns"]):
+        return table_diff
+    return None
+
+def _diff_table_batch(batch):
+    """Process pool task: diffs a list of (table_name, old_table, new_table) tuples."""
+    return [(table_name, _diff_table(old_table, new_table)) for table_name, old_table, new_table in batch]
+
+def _diff_tables_parallel(common_tables, old_schema, new_schema, max_workers=None):
+    """
+    Diffs common tables across a process pool in chunked batches.
+    Yields (table_name, table_diff) in the same order as common_tables.
+    """
+    batches = [
+        [(table_name, old_schema[table_name], new_schema[table_name])
+         for table_name in common_tables[i:i + PARALLEL_DIFF_BATCH_SIZE]]
+        for i in range(0, len(common_tables), PARALLEL_DIFF_BATCH_SIZE)
+    ]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for batch_result in executor.map(_diff_table_batch, batches): # map keeps submission order
+            yield from batch_result
+
+def compare_schemas(old_schema, new_schema, parallel=False, max_workers=None):
     """
+    Compares two parsed schemas (Schema objects, or the nested dictionary form) and
+    returns a detailed diff, including inferred column renames using Levenshtein distance.
+    Tables whose fingerprints match are skipped before any column work.
+    With parallel=True, schemas with many common tables are diffed across a process pool;
+    the result is identical to the serial path.
+    """
+    old_schema = as_schema(old_schema)
+    new_schema = as_schema(new_schema)
+
     diffs = {
         "added_tables": [],
         "deleted_tables": [],
@@ -72,115 +965,83 @@ def compare_schemas(old_schema, new_schema):
     old_tables = set(old_schema.keys())
     new_tables = set(new_schema.keys())
 
-    diffs["added_tables"] = list(new_tables - old_tables)
-    diffs["deleted_tables"] = list(old_tables - new_tables)
+    diffs["added_tables"] = sorted(new_tables - old_tables)
+    diffs["deleted_tables"] = sorted(old_tables - new_tables)
 
     # Compare common tables for column changes
-    for table_name in old_tables.intersection(new_tables):
-        old_cols = old_schema[table_name]
-        new_cols = new_schema[table_name]
-
-        table_diff = {
-            "added_columns": [],
-            "deleted_columns": [],
-            "modified_columns": {}, # {col_name: {old_props: {}, new_props: {}}}
-            "renamed_columns": {} # {old_name: new_name, old_type: ..., new_type: ...}
-        }
-
-        old_col_names = list(old_cols.keys()) # Convert to list for easier iteration
-        new_col_names = list(new_cols.keys()) # Convert to list
-
-        # Initialize lists for columns truly added/deleted after rename inference
-        temp_added_columns = list(set(new_col_names) - set(old_col_names))
-        temp_deleted_columns = list(set(old_col_names) - set(new_col_names))
-
-        # --- Inferred Column Renames Logic ---
-        # A simple approach: iterate through deleted and added columns
-        # and find the best match based on Levenshtein distance and similar type.
-        # This can be complex for many-to-many renames or very short names.
-        
-        rename_threshold = 2 # Max Levenshtein distance for a rename candidate
-        matched_new_cols = set() # To ensure an added column is only matched once
-
-        for deleted_col_name in list(temp_deleted_columns): # Iterate over a copy
-            best_match = None
-            min_distance = float('inf')
-            
-            for added_col_name in list(temp_added_columns): # Iterate over a copy
-                # Ensure it hasn't been matched yet
-                if added_col_name in matched_new_cols:
-                    continue
-
-                # Check if types are roughly compatible (e.g., both numerical, both string-like)
-                # This is a simple type compatibility check, can be made more robust.
-                old_type = old_cols.get(deleted_col_name, {}).get('type')
-                new_type = new_cols.get(added_col_name, {}).get('type')
-
-                # Basic type compatibility check
-                types_compatible = False
-                if old_type and new_type:
-                    if old_type == new_type: # Exact type match
-                        types_compatible = True
-                    elif 'int' in old_type and 'int' in new_type: # int vs integer
-                        types_compatible = True
-                    elif 'decimal' in old_type and 'decimal' in new_type: # float vs decimal
-                        types_compatible = True
-                    elif 'varchar' in old_type and 'varchar' in new_type: # varchar length changes
-                         types_compatible = True
-                    elif 'text' in old_type and 'varchar' in new_type:
-                         types_compatible = True
-                    elif 'date' in old_type and 'date' in new_type: # date vs timestamp
-                         types_compatible = True
-
-
-                # Calculate Levenshtein distance
-                dist = levenshtein_distance(deleted_col_name, added_col_name)
-                
-                # Consider a rename if distance is low and types are compatible
-                if dist <= rename_threshold and types_compatible and dist < min_distance:
-                    min_distance = dist
-                    best_match = added_col_name
-
-            if best_match:
-                table_diff["renamed_columns"][deleted_col_name] = {
-                    "new_name": best_match,
-                    "old_type": old_cols[deleted_col_name]['type'],
-                    "new_type": new_cols[best_match]['type']
-                }
-                temp_deleted_columns.remove(deleted_col_name)
-                temp_added_columns.remove(best_match)
-                matched_new_cols.add(best_match) # Mark this new column as matched
-
-        table_diff["added_columns"] = temp_added_columns
-        table_diff["deleted_columns"] = temp_deleted_columns
-
-        # Check for modified columns (common names, *after* rename inference)
-        # This now only considers columns that were NOT identified as renames.
-        common_col_names_after_rename = set(old_cols.keys()).intersection(set(new_cols.keys()))
-        for renamed_old_name, rename_info in table_diff["renamed_columns"].items():
-            if renamed_old_name in common_col_names_after_rename:
-                common_col_names_after_rename.remove(renamed_old_name) # Ensure renamed old name is not checked as modified
-            if rename_info["new_name"] in common_col_names_after_rename:
-                common_col_names_after_rename.remove(rename_info["new_name"]) # Ensure renamed new name is not checked as modified
-
-
-        for col_name in common_col_names_after_rename:
-            old_props = old_cols[col_name]
-            new_props = new_cols[col_name]
-            
-            if old_props != new_props:
-                modified_props = {}
-                for prop_key in set(old_props.keys()).union(new_props.keys()):
-                    if old_props.get(prop_key) != new_props.get(prop_key):
-                        modified_props[prop_key] = {
-                            "old_value": old_props.get(prop_key),
-                            "new_value": new_props.get(prop_key)
-                        }
-                table_diff["modified_columns"][col_name] = modified_props
-        
-        # Only add table_diff if there were actual changes within the table
-        if any(table_diff[key] for key in ["added_columns", "deleted_columns", "modified_columns", "renamed_columns"]):
+    common_tables = [
+        table_name for table_name in sorted(old_tables.intersection(new_tables))
+        if old_schema[table_name].fingerprint != new_schema[table_name].fingerprint
+    ]
+    table_results = None
+    if parallel and len(common_tables) >= PARALLEL_DIFF_MIN_TABLES:
+        try:
+            table_results = list(_diff_tables_parallel(common_tables, old_schema, new_schema, max_workers))
+        except Exception as e:
+            print(f"Parallel diff unavailable, falling back to serial diff: {e}") # For debugging purposes
+    if table_results is None:
+        table_results = ((table_name, _diff_table(old_schema[table_name], new_schema[table_name]))
+                         for table_name in common_tables)
+
+    for table_name, table_diff in table_results:
+        if table_diff:
             diffs["modified_tables"][table_name] = table_diff
 
     return diffs
 
+def summarize_diff(old_schema, new_schema, schema_diff):
+    """
+    Returns the summary counts of a diff: table totals of both versions and the number of
+    added/deleted/modified tables and added/deleted/modified/renamed columns.
+    """
+    modified_tables = schema_diff["modified_tables"].values()
+    return {
+        "total_tables_old": len(old_schema),
+        "total_tables_new": len(new_schema),
+        "added_table_count": len(schema_diff["added_tables"]),
+        "deleted_table_count": len(schema_diff["deleted_tables"]),
+        "modified_table_count": len(schema_diff["modified_tables"]),
+        "added_column_count": sum(len(td["added_columns"]) for td in modified_tables),
+        "deleted_column_count": sum(len(td["deleted_columns"]) for td in modified_tables),
+        "modified_column_count": sum(len(td["modified_columns"]) for td in modified_tables),
+        "renamed_column_count": sum(len(td["renamed_columns"]) for td in modified_tables),
+    }
+
+# --- Memoized Diff Computation ---
+# Every consumer of a diff (risk score, downloads, diff viewer) shares one result per
+# (old, new) schema pair instead of re-running compare_schemas on each Streamlit rerun.
+DIFF_CACHE_MAX_ENTRIES = 16 # Number of distinct schema pairs kept in memory
+_diff_cache = OrderedDict() # {(old_fingerprint, new_fingerprint): diff}, kept in LRU order
+_diff_cache_lock = threading.Lock()
+
+def schema_fingerprint(schema):
+    """
+    Returns a stable fingerprint of a whole parsed schema, combined from the cached
+    table fingerprints. Table and column order do not matter, so schemas that diff
+    as equal share a fingerprint.
+    """
+    return as_schema(schema).fingerprint
+
+def get_schema_diff(old_schema, new_schema, parallel=False):
+    """
+    Returns the compare_schemas result for the given pair, computing it at most once
+    per (old, new) fingerprint. Results live in a bounded LRU shared by all callers,
+    so the returned dictionary must be treated as read-only.
+    `parallel` is passed to compare_schemas; it does not change the result.
+    """
+    old_schema = as_schema(old_schema)
+    new_schema = as_schema(new_schema)
+    cache_key = (old_schema.fingerprint, new_schema.fingerprint)
+    with _diff_cache_lock:
+        if cache_key in _diff_cache:
+            _diff_cache.move_to_end(cache_key)
+            return _diff_cache[cache_key]
+
+    schema_diff = compare_schemas(old_schema, new_schema, parallel=parallel)
+
+    with _diff_cache_lock:
+        _diff_cache[cache_key] = schema_diff
+        _diff_cache.move_to_end(cache_key)
+        while len(_diff_cache) > DIFF_CACHE_MAX_ENTRIES:
+            _diff_cache.popitem(last=False) # Evict the least recently used pair
+    return schema_diff
@@ -0,0 +1,94 @@
+# speculative.py
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from schema_utils import get_parsed_schema, get_schema_diff, summarize_diff
+from risk_rules import score_schema_diff
+
+SPECULATIVE_MAX_WORKERS = 2 # Shared by all sessions; a newer job makes an older one stale anyway
+SPECULATIVE_RESULT_TIMEOUT_SECONDS = 2 # Longest a click on Compare waits for a background job before running it itself
+
+_executor = ThreadPoolExecutor(max_workers=SPECULATIVE_MAX_WORKERS, thread_name_prefix="speculative-analysis")
+
+
+class StaleAnalysis(Exception):
+    """Raised inside a background job when newer input has superseded it."""
+
+
+def analyze_schema_texts(old_text, new_text, is_stale=lambda: False):
+    """
+    The deterministic part of an analysis: parse both texts, diff them, summarize and score.
+    Checks `is_stale()` between stages and gives up early; the stages already finished are
+    not lost, since parsed schemas and diffs land in their shared caches. The diff is always
+    computed serially: this runs on a worker thread, where forking a process pool is unsafe.
+    """
+    stages = {}
+    stages["old_schema"] = get_parsed_schema(old_text)
+    if is_stale():
+        raise StaleAnalysis()
+    stages["new_schema"] = get_parsed_schema(new_text)
+    if is_stale():
+        raise StaleAnalysis()
+    stages["schema_diff"] = get_schema_diff(stages["old_schema"], stages["new_schema"], parallel=False)
+    if is_stale():
+        raise StaleAnalysis()
+    stages["summary_metrics"] = summarize_diff(stages["old_schema"], stages["new_schema"], stages["schema_diff"])
+    stages["rule_risk"] = score_schema_diff(stages["schema_diff"])
+    return stages
+
+
+class SpeculativeAnalyzer:
+    """
+    Runs analyze_schema_texts() in the background as soon as the inputs change, so a click on
+    Compare usually finds the result ready. Each schedule() bumps a generation counter: the
+    previous job is cancelled if it has not started yet, and stops at its next stage if it has.
+    One analyzer per session (kept in st.session_state); it never touches Streamlit itself.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._inputs = None # (old_text, new_text) of the latest job
+        self._future = None
+
+    def schedule(self, old_text, new_text):
+        """Starts a background analysis of these inputs, superseding any earlier one."""
+        inputs = (old_text, new_text)
+        with self._lock:
+            if inputs == self._inputs:
+                return # Already running or done for exactly these inputs
+            self._generation += 1
+            generation = self._generation
+            if self._future is not None:
+                self._future.cancel() # Only succeeds if the stale job has not started
+            self._inputs = inputs
+            self._future = _executor.submit(
+                analyze_schema_texts, old_text, new_text, lambda: self._generation != generation
+            )
+
+    def result(self, old_text, new_text, timeout=SPECULATIVE_RESULT_TIMEOUT_SECONDS):
+        """
+        Returns the background result for exactly these inputs, waiting up to `timeout` seconds
+        if it is still queued or running, or None if no job matches, the job failed or the wait
+        timed out; the caller then runs the analysis itself. The shared executor may be busy
+        with other sessions' jobs, so a job that is not ready in time is dropped, never awaited.
+        """
+        with self._lock:
+            future = self._future if self._inputs == (old_text, new_text) else None
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self.cancel() # The foreground run takes over; the job stops at its next stage
+            return None
+        except Exception:
+            return None # Cancelled or stale jobs, and parse errors, which the foreground run reports as usual
+
+    def cancel(self):
+        """Drops the current job: cancelled if it has not started, stale at its next stage if it has."""
+        with self._lock:
+            self._generation += 1
+            if self._future is not None:
+                self._future.cancel()
+            self._inputs = None
+            self._future = None